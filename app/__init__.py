@@ -4,6 +4,17 @@ from .models import db
 from .auth.routes import auth_bp
 from .main.routes import main_bp
 from .admin.routes import admin_bp
+from .internal.routes import internal_bp
+from .commands import register_commands
+from .jobs import job_queue
+from .notifications import init_notifications
+from .events import event_hub
+from .sms import sms_dispatcher
+from .db_pool import configure_pool
+from .metrics import init_metrics
+from .profiling import init_profiling
+from .templating import init_template_cache
+from .assets import init_assets
 from datetime import datetime
 import json
 from flask_wtf.csrf import CSRFProtect
@@ -16,9 +27,18 @@ def create_app():
     """
     app = Flask(__name__, static_folder='static')
     app.config.from_object(Config)
+    init_template_cache(app)
 
+    configure_pool(app)
     db.init_app(app)
+    init_metrics(app)
+    init_profiling(app)
     csrf.init_app(app)
+    job_queue.init_app(app)
+    init_notifications(app)
+    event_hub.init_app(app)
+    sms_dispatcher.init_app(app)
+    init_assets(app)
 
     def from_json(json_string):
         if json_string:
@@ -35,5 +55,13 @@ def create_app():
     app.register_blueprint(auth_bp, url_prefix='/')
     app.register_blueprint(main_bp, url_prefix='/')
     app.register_blueprint(admin_bp, url_prefix='/admin')  # NEW: Register admin blueprint
+    app.register_blueprint(internal_bp)
+
+    # The streaming upload view checks its CSRF token from a header so the
+    # request body is never parsed (and buffered) before it runs.
+    csrf.exempt('app.main.routes.upload_invoices_stream')
+    csrf.exempt('app.main.routes.upload_invoices_bulk')
+
+    register_commands(app)
 
     return app
\ No newline at end of file
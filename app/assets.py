@@ -0,0 +1,355 @@
+from flask import current_app, request, url_for
+from markupsafe import Markup
+import hashlib
+import json
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import tempfile
+
+
+# --- Static asset pipeline ---
+# `flask assets build` turns the sources in assets/ into files under
+# app/static/dist/ whose names carry a hash of their content:
+#   css/app.css      purged, minified Tailwind build of every template
+#   css/fonts.css    the @font-face rules alone (for the error pages)
+#   fonts/*.woff2    Inter, copied from the @fontsource/inter npm package
+#   images/*.webp    resized WebP/AVIF/JPEG variants of the hero images
+# and records logical name -> hashed name in dist/manifest.json. Templates
+# ask for `asset_url('css/app.css')`; since a changed file gets a new URL,
+# the hashed files are served with a one year immutable Cache-Control.
+# Only the built files exist (app/static has no css/app.css), so the app
+# refuses to start without a manifest, except in debug mode and for flask
+# CLI commands, which must work before the first build. There asset_url
+# falls back to the plain static URL and pages render unstyled.
+
+ASSET_SOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets')
+DIST_SUBFOLDER = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+FONT_FILES = tuple(f"inter-latin-{weight}-normal.woff2" for weight in (400, 500, 600, 700))
+HERO_IMAGES = ('images/construction1img.jpg', 'images/construction2img.jpg')
+IMAGE_WIDTHS = (640, 1280, 1920)
+IMAGE_FORMATS = {  # extension -> (Pillow format, save options)
+    'avif': ('AVIF', {'quality': 55}),
+    'webp': ('WEBP', {'quality': 78, 'method': 6}),
+    'jpg': ('JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+IMAGE_MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpg': 'image/jpeg'}
+
+_CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+class AssetBuildError(Exception):
+    """A build step failed; the message says which one."""
+
+
+class MissingAssetManifest(RuntimeError):
+    """The app was started without a built asset manifest."""
+
+
+def dist_dir(app):
+    return os.path.join(app.static_folder, DIST_SUBFOLDER)
+
+
+def manifest_path(app):
+    return app.config.get('ASSET_MANIFEST') or os.path.join(dist_dir(app), MANIFEST_NAME)
+
+
+class AssetManifest:
+    """Maps logical asset names to their fingerprinted static paths."""
+
+    def __init__(self, path, reload=False):
+        self.path = path
+        self.reload = reload
+        self._mtime = None
+        self._assets = {}
+        self._hashed = frozenset()
+        self._load()
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        assets = {}
+        if mtime is not None:
+            with open(self.path, encoding='utf-8') as f:
+                assets = json.load(f)['assets']
+        self._mtime = mtime
+        self._assets = assets
+        self._hashed = frozenset(assets.values())
+
+    def lookup(self, name):
+        if self.reload:
+            self._load()
+        return self._assets.get(name)
+
+    def is_fingerprinted(self, static_path):
+        return static_path in self._hashed
+
+    def __bool__(self):
+        return bool(self._assets)
+
+
+def _manifest():
+    return current_app.extensions['asset_manifest']
+
+
+def asset_url(filename, **values):
+    """
+    url_for('static', filename=...) for a built asset: returns the URL of
+    its fingerprinted copy, or of the plain static file if it has none.
+    """
+    hashed = _manifest().lookup(filename)
+    return url_for('static', filename=hashed or filename, **values)
+
+
+def image_srcset(filename, fmt):
+    """`srcset` value listing every built width of an image in one format."""
+    stem, _ = os.path.splitext(filename)
+    candidates = []
+    for width in IMAGE_WIDTHS:
+        hashed = _manifest().lookup(f"{stem}-{width}.{fmt}")
+        if hashed:
+            candidates.append(f"{url_for('static', filename=hashed)} {width}w")
+    return ', '.join(candidates)
+
+
+def image_set(filename, width=1280):
+    """
+    CSS image-set() offering the AVIF, WebP and JPEG variants of an image at
+    one width, for background images (single-quoted, so it can go in a
+    style attribute). Falls back to the original file when
+    no variants have been built.
+    """
+    stem, _ = os.path.splitext(filename)
+    candidates = []
+    for fmt in IMAGE_FORMATS:
+        hashed = _manifest().lookup(f"{stem}-{width}.{fmt}")
+        if hashed:
+            url = url_for('static', filename=hashed)
+            candidates.append(f"url('{url}') type('{IMAGE_MIME_TYPES[fmt]}')")
+    if not candidates:
+        return Markup(f"url('{url_for('static', filename=filename)}')")
+    return Markup(f"image-set({', '.join(candidates)})")
+
+
+def _immutable_static(response):
+    """Fingerprinted files never change, so clients may keep them for a year."""
+    if request.endpoint != 'static' or response.status_code not in (200, 206, 304):
+        return response
+    filename = (request.view_args or {}).get('filename')
+    if filename and _manifest().is_fingerprinted(filename):
+        response.cache_control.public = True
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = current_app.config.get('STATIC_ASSET_MAX_AGE', 365 * 24 * 3600)
+        response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app):
+    """Loads the asset manifest and exposes the asset helpers to templates."""
+    path = manifest_path(app)
+    manifest = AssetManifest(path, reload=app.debug)
+    if not manifest:
+        # Flask sets FLASK_RUN_FROM_CLI for every `flask ...` command,
+        # including the `flask assets build` that writes the manifest.
+        from_cli = os.environ.get('FLASK_RUN_FROM_CLI') == 'true'
+        if app.config.get('ASSET_MANIFEST_REQUIRED', True) and not app.debug and not from_cli:
+            raise MissingAssetManifest(
+                f"No asset manifest at {path}; run 'flask assets build' before starting the app "
+                f"(or set ASSET_MANIFEST_REQUIRED=false to serve unstyled pages).")
+        app.logger.warning(f"No asset manifest at {path}; run 'flask assets build' to build the stylesheets.")
+    app.extensions['asset_manifest'] = manifest
+    app.jinja_env.globals.update(asset_url=asset_url, image_srcset=image_srcset, image_set=image_set)
+    app.after_request(_immutable_static)
+
+
+# --- Build ---
+
+def _fingerprint(path):
+    """Renames path to <stem>.<hash><ext> and returns the new path."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    stem, ext = os.path.splitext(path)
+    hashed = f"{stem}.{digest.hexdigest()[:12]}{ext}"
+    os.replace(path, hashed)
+    return hashed
+
+
+def _minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};:,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def _rewrite_css_urls(css, css_name, assets):
+    """Points relative url()s in a built stylesheet at fingerprinted files."""
+    base = os.path.dirname(css_name)
+
+    def replace(match):
+        target = match.group(2)
+        if ':' in target or target.startswith('/'):
+            return match.group(0)
+        logical = os.path.normpath(os.path.join(base, target)).replace(os.sep, '/')
+        if logical not in assets:
+            return match.group(0)
+        hashed_name = assets[logical][len(DIST_SUBFOLDER) + 1:]
+        return f'url("{os.path.relpath(hashed_name, base or ".").replace(os.sep, "/")}")'
+
+    return _CSS_URL.sub(replace, css)
+
+
+def _copy_fonts(out_dir, node_modules):
+    source = os.path.join(node_modules, '@fontsource', 'inter', 'files')
+    copied = []
+    for name in FONT_FILES:
+        path = os.path.join(source, name)
+        if not os.path.isfile(path):
+            raise AssetBuildError(f"Font {path} not found; run 'npm install' in {ASSET_SOURCE_DIR}.")
+        target = os.path.join(out_dir, 'fonts', name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(path, target)
+        copied.append(f"fonts/{name}")
+    return copied
+
+
+def _build_tailwind(out_dir, tailwind_cmd):
+    target = os.path.join(out_dir, 'css', 'app.css')
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    command = shlex.split(tailwind_cmd) + [
+        '--config', os.path.join(ASSET_SOURCE_DIR, 'tailwind.config.js'),
+        '--input', os.path.join(ASSET_SOURCE_DIR, 'css', 'app.css'),
+        '--output', target,
+        '--minify',
+    ]
+    try:
+        result = subprocess.run(command, cwd=ASSET_SOURCE_DIR, capture_output=True, text=True)
+    except OSError as e:
+        raise AssetBuildError(f"Cannot run {command[0]}: {e}")
+    if result.returncode != 0:
+        raise AssetBuildError(f"Tailwind build failed:\n{result.stderr.strip()}")
+    return 'css/app.css'
+
+
+def _build_fonts_css(out_dir):
+    with open(os.path.join(ASSET_SOURCE_DIR, 'css', 'fonts.css'), encoding='utf-8') as f:
+        css = _minify_css(f.read())
+    target = os.path.join(out_dir, 'css', 'fonts.css')
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'w', encoding='utf-8') as f:
+        f.write(css)
+    return 'css/fonts.css'
+
+
+def _image_formats():
+    """The IMAGE_FORMATS this Pillow build can write; AVIF needs Pillow 11.3+ or pillow-avif-plugin."""
+    try:
+        from PIL import features
+    except ImportError:
+        raise AssetBuildError("Pillow is required to build image variants (pip install Pillow).")
+    formats = dict(IMAGE_FORMATS)
+    if not features.check('avif'):
+        try:
+            import pillow_avif  # noqa: F401 - registers the AVIF plugin
+        except ImportError:
+            del formats['avif']
+    return formats
+
+
+def _build_images(app, out_dir, formats):
+    from PIL import Image
+
+    built = []
+    for name in HERO_IMAGES:
+        stem, _ = os.path.splitext(name)
+        with Image.open(os.path.join(app.static_folder, name)) as original:
+            original = original.convert('RGB')
+            for width in IMAGE_WIDTHS:
+                if width > original.width and width != IMAGE_WIDTHS[0]:
+                    continue
+                height = round(original.height * min(width, original.width) / original.width)
+                resized = original.resize((min(width, original.width), height), Image.LANCZOS)
+                for ext, (pillow_format, options) in formats.items():
+                    variant = f"{stem}-{width}.{ext}"
+                    target = os.path.join(out_dir, variant)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    resized.save(target, pillow_format, **options)
+                    built.append(variant)
+    return built
+
+
+def _publish(out_dir, final_dir, assets, clean):
+    """
+    Moves the fingerprinted files into final_dir, then replaces the manifest.
+    Files from earlier builds stay (unless clean) so workers still holding
+    the old manifest keep serving the URLs they hand out.
+    """
+    for hashed in assets.values():
+        relative = hashed[len(DIST_SUBFOLDER) + 1:]
+        target = os.path.join(final_dir, relative)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(os.path.join(out_dir, relative), target)
+
+    manifest = os.path.join(final_dir, MANIFEST_NAME)
+    with tempfile.NamedTemporaryFile('w', dir=final_dir, suffix='.tmp', delete=False, encoding='utf-8') as f:
+        json.dump({'assets': dict(sorted(assets.items()))}, f, indent=2)
+    os.replace(f.name, manifest)
+
+    removed = 0
+    if clean:
+        keep = {os.path.join(final_dir, h[len(DIST_SUBFOLDER) + 1:]) for h in assets.values()} | {manifest}
+        for root, _, files in os.walk(final_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if path not in keep:
+                    os.remove(path)
+                    removed += 1
+    return removed
+
+
+def build_assets(app, tailwind_cmd=None, node_modules=None, images=True, clean=False):
+    """
+    Builds every asset in a scratch folder, fingerprints the results and
+    publishes them to the dist folder, writing the manifest last.
+    Returns ({logical name: static path}, number of old files removed).
+    """
+    tailwind_cmd = tailwind_cmd or app.config.get('TAILWIND_CMD', 'npx tailwindcss')
+    node_modules = node_modules or os.path.join(ASSET_SOURCE_DIR, 'node_modules')
+    formats = _image_formats() if images else {}
+    final_dir = dist_dir(app)
+    os.makedirs(final_dir, exist_ok=True)
+    out_dir = tempfile.mkdtemp(prefix='.build-', dir=final_dir)
+    try:
+        assets = {}
+
+        def fingerprint(name):
+            hashed = _fingerprint(os.path.join(out_dir, name))
+            assets[name] = f"{DIST_SUBFOLDER}/{os.path.relpath(hashed, out_dir).replace(os.sep, '/')}"
+
+        # Fonts first so the stylesheets can point at their hashed names.
+        for name in _copy_fonts(out_dir, node_modules):
+            fingerprint(name)
+        if images:
+            for name in _build_images(app, out_dir, formats):
+                fingerprint(name)
+        for name in (_build_tailwind(out_dir, tailwind_cmd), _build_fonts_css(out_dir)):
+            path = os.path.join(out_dir, name)
+            with open(path, encoding='utf-8') as f:
+                css = _rewrite_css_urls(f.read(), name, assets)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(css)
+            fingerprint(name)
+
+        removed = _publish(out_dir, final_dir, assets, clean)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return assets, removed
@@ -0,0 +1,182 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from .stats import find_stats_drift, rebuild_stats
+from .documents import backfill_vendor_documents
+from .search import install_search_index
+from .models import db
+from .main.blobstore import get_storage, blob_temp_dir
+from .main.storage import check_storage
+from .page_cache import get_page_cache, check_page_cache
+from .templating import precompile_templates, template_cache_dir
+from .assets import build_assets, AssetBuildError, dist_dir
+from .notifications import prune_notifications
+from .sms import send_sms, SmsQueueFull
+
+
+stats_cli = AppGroup('invoice-stats', help='Maintain the per-vendor invoice summary table.')
+
+
+@stats_cli.command('verify')
+def verify_stats():
+    """Reports rows where vendor_invoice_stats disagrees with the invoices table."""
+    drift = find_stats_drift()
+    if not drift:
+        click.echo('vendor_invoice_stats is in sync.')
+        return
+    for user_id, column, stored, actual in drift:
+        click.echo(f"user {user_id}: {column} stored={stored} actual={actual}")
+    click.echo(f"{len(drift)} drifted value(s) found. Run 'flask invoice-stats rebuild' to fix.")
+    raise SystemExit(1)
+
+
+@stats_cli.command('rebuild')
+def rebuild_stats_command():
+    """Recomputes vendor_invoice_stats from scratch and reports what drifted."""
+    drift = find_stats_drift()
+    rebuild_stats()
+    click.echo(f"Rebuilt vendor_invoice_stats ({len(drift)} drifted value(s) corrected).")
+
+
+documents_cli = AppGroup('vendor-documents', help='Maintain the vendor document ownership table.')
+
+
+@documents_cli.command('backfill')
+def backfill_documents_command():
+    """Rebuilds vendor_documents from the vendor forms' attachment columns."""
+    count = backfill_vendor_documents()
+    click.echo(f"Rebuilt vendor_documents ({count} document(s)).")
+
+
+search_cli = AppGroup('invoice-search', help='Maintain the invoice search index.')
+
+
+@search_cli.command('install')
+def install_search_command():
+    """Creates the search index on an existing database and indexes current invoices."""
+    with db.engine.begin() as connection:
+        dialect = install_search_index(connection)
+    if dialect in ('sqlite', 'postgresql'):
+        click.echo(f"Invoice search index installed for {dialect}.")
+    else:
+        click.echo(f"No search index for {db.engine.dialect.name}; searches will use ILIKE.")
+
+
+storage_cli = AppGroup('storage', help='Inspect the document storage backend.')
+
+
+@storage_cli.command('check')
+def check_storage_command():
+    """Runs the backend conformance checks against the configured storage."""
+    storage = get_storage()
+    problems = check_storage(storage, blob_temp_dir())
+    name = type(storage).__name__
+    if not problems:
+        click.echo(f"{name}: all checks passed.")
+        return
+    for problem in problems:
+        click.echo(f"{name}: {problem}")
+    raise SystemExit(1)
+
+
+page_cache_cli = AppGroup('page-cache', help='Inspect the rendered page cache.')
+
+
+@page_cache_cli.command('check')
+def check_page_cache_command():
+    """Runs the backend conformance checks against the configured page cache."""
+    cache = get_page_cache()
+    if cache is None:
+        click.echo("Page cache is disabled (set PAGE_CACHE_REDIS_URL or PAGE_CACHE_BACKEND to enable it).")
+        return
+    problems = check_page_cache(cache)
+    name = type(cache).__name__
+    if not problems:
+        click.echo(f"{name}: all checks passed.")
+        return
+    for problem in problems:
+        click.echo(f"{name}: {problem}")
+    raise SystemExit(1)
+
+
+templates_cli = AppGroup('templates', help='Manage the compiled template cache.')
+
+
+@templates_cli.command('compile')
+def compile_templates_command():
+    """Compiles all templates into the bytecode cache so new workers start warm."""
+    compiled, errors = precompile_templates(current_app)
+    for name, error in errors:
+        click.echo(f"{name}: {error}")
+    if current_app.jinja_env.bytecode_cache is None:
+        click.echo(f"Checked {len(compiled)} template(s); the bytecode cache is disabled (TEMPLATE_BYTECODE_CACHE).")
+    else:
+        click.echo(f"Compiled {len(compiled)} template(s) into {template_cache_dir(current_app)}.")
+    if errors:
+        raise SystemExit(1)
+
+
+assets_cli = AppGroup('assets', help='Build the fingerprinted static assets.')
+
+
+@assets_cli.command('build')
+@click.option('--tailwind', 'tailwind_cmd', help='Tailwind CLI command (default: TAILWIND_CMD).')
+@click.option('--no-images', is_flag=True, help='Skip the image variants (no Pillow needed).')
+@click.option('--clean', is_flag=True, help='Delete files left over from earlier builds.')
+def build_assets_command(tailwind_cmd, no_images, clean):
+    """Builds CSS, fonts and image variants into app/static/dist and writes the manifest."""
+    try:
+        assets, removed = build_assets(current_app, tailwind_cmd=tailwind_cmd, images=not no_images, clean=clean)
+    except AssetBuildError as e:
+        click.echo(str(e))
+        raise SystemExit(1)
+    for name, path in assets.items():
+        click.echo(f"{name} -> {path}")
+    click.echo(f"Built {len(assets)} asset(s) into {dist_dir(current_app)}"
+               + (f", removed {removed} stale file(s)." if clean else "."))
+    click.echo("Restart the web workers to pick up the new manifest.")
+
+
+notifications_cli = AppGroup('notifications', help='Maintain the vendor notifications table.')
+
+
+@notifications_cli.command('prune')
+@click.option('--days', default=90, show_default=True, help='Delete read notifications older than this.')
+def prune_notifications_command(days):
+    """Deletes old read notifications; unread ones are always kept."""
+    deleted = prune_notifications(days)
+    click.echo(f"Deleted {deleted} read notification(s) older than {days} day(s).")
+
+
+sms_cli = AppGroup('sms', help='Check outbound SMS delivery.')
+
+
+@sms_cli.command('send')
+@click.option('--to', 'to', required=True, help='Destination number in E.164 format, e.g. +919800000000.')
+@click.option('--body', default='Test message from the vendor portal.', show_default=True)
+@click.option('--wait', 'timeout', default=60.0, show_default=True, help='Seconds to wait for delivery.')
+def send_sms_command(to, body, timeout):
+    """Sends one text through the SMS queue and reports what happened to it."""
+    try:
+        message = send_sms(to, body)
+    except SmsQueueFull as e:
+        click.echo(f"Not queued: {e}")
+        raise SystemExit(1)
+    status = message.wait(timeout)
+    click.echo(f"{status} after {message.attempts} attempt(s)"
+               + (f": {message.sid}" if message.sid else f": {message.error}" if message.error else ''))
+    if status != 'sent':
+        raise SystemExit(1)
+
+
+def register_commands(app):
+    """Attaches the maintenance CLI commands to the app."""
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(documents_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(storage_cli)
+    app.cli.add_command(page_cache_cli)
+    app.cli.add_command(templates_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(notifications_cli)
+    app.cli.add_command(sms_cli)
@@ -6,6 +6,33 @@ load_dotenv() # This line reads your .env file and loads the variables
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+
+def _engine_options(database_uri):
+    """
+    SQLAlchemy engine/pool options from DB_* environment variables.
+    Anything left unset keeps the SQLAlchemy default.
+    """
+    options = {}
+    for env_name, option, cast in (
+        ('DB_POOL_SIZE', 'pool_size', int),
+        ('DB_MAX_OVERFLOW', 'max_overflow', int),
+        ('DB_POOL_TIMEOUT', 'pool_timeout', float),
+        ('DB_POOL_RECYCLE', 'pool_recycle', int),
+    ):
+        if os.environ.get(env_name):
+            options[option] = cast(os.environ[env_name])
+
+    # Drop connections the server (or a proxy) closed instead of failing a request with them
+    options['pool_pre_ping'] = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+    statement_timeout_ms = os.environ.get('DB_STATEMENT_TIMEOUT_MS')
+    if statement_timeout_ms and database_uri.startswith('postgresql'):
+        options['connect_args'] = {'options': f"-c statement_timeout={int(statement_timeout_ms)}"}
+    elif statement_timeout_ms and database_uri.startswith('mysql'):
+        options['connect_args'] = {'init_command': f"SET SESSION max_execution_time={int(statement_timeout_ms)}"}
+    return options
+
+
 class Config:
     """
     Configuration class that loads settings from the environment.
@@ -20,6 +47,20 @@ class Config:
         raise ValueError("No DATABASE_URI set for Flask application.")
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
+
+    # Bearer token for /metrics and /internal/* (admins can always view them)
+    INTERNAL_METRICS_TOKEN = os.environ.get('INTERNAL_METRICS_TOKEN')
+    # Requests running more SQL statements than this are logged as likely N+1s
+    QUERY_BUDGET_PER_REQUEST = int(os.environ.get('QUERY_BUDGET_PER_REQUEST', 25))
+
+    # Slow request profiler (see app/profiling.py), listed at /internal/profiles
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.0))
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    PROFILE_MIN_DURATION_MS = float(os.environ.get('PROFILE_MIN_DURATION_MS', 0))
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') # default: <instance>/profiles
     PERMANENT_SESSION_LIFETIME = timedelta(hours=12)
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
@@ -32,6 +73,24 @@ class Config:
     
     TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
     TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER')
+    TWILIO_API_URL = os.environ.get('TWILIO_API_URL', 'https://api.twilio.com')
+
+    # Outbound SMS queue (see app/sms.py). SMS_RATE_PER_SECOND and SMS_BURST
+    # are per process: each web worker paces its own sends, so set the rate
+    # to the sending number's throughput (1/s for a long code) divided by
+    # the number of worker processes, e.g. 0.25 for 4 gunicorn workers.
+    SMS_WORKERS = int(os.environ.get('SMS_WORKERS', 4))
+    SMS_QUEUE_SIZE = int(os.environ.get('SMS_QUEUE_SIZE', 1000))
+    SMS_RATE_PER_SECOND = float(os.environ.get('SMS_RATE_PER_SECOND', 1.0))
+    SMS_BURST = int(os.environ.get('SMS_BURST', 5))
+    SMS_MAX_ATTEMPTS = int(os.environ.get('SMS_MAX_ATTEMPTS', 5))
+    SMS_RETRY_BASE_SECONDS = float(os.environ.get('SMS_RETRY_BASE_SECONDS', 1.0))
+    SMS_RETRY_MAX_SECONDS = float(os.environ.get('SMS_RETRY_MAX_SECONDS', 30.0))
+    SMS_MAX_AGE_SECONDS = float(os.environ.get('SMS_MAX_AGE_SECONDS', 300)) # OTPs are useless once expired
+    SMS_CIRCUIT_FAILURES = int(os.environ.get('SMS_CIRCUIT_FAILURES', 5))
+    SMS_CIRCUIT_RESET_SECONDS = float(os.environ.get('SMS_CIRCUIT_RESET_SECONDS', 30))
+    SMS_CONNECT_TIMEOUT = float(os.environ.get('SMS_CONNECT_TIMEOUT', 3.05))
+    SMS_READ_TIMEOUT = float(os.environ.get('SMS_READ_TIMEOUT', 10))
 
     UPLOAD_FOLDER = os.path.join(basedir, 'uploads')
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
@@ -45,4 +104,84 @@ class Config:
         'application/vnd.openxmlformats-officedocument.wordprocessingml.document' # .docx
     ]
 
-    MAX_CONTENT_LENGTH = 18 * 1024 * 1024
\ No newline at end of file
+    MAX_CONTENT_LENGTH = 18 * 1024 * 1024
+
+    # Invoice exports: rows fetched per round trip from the server-side cursor,
+    # and where XLSX files are assembled (default: the system temp dir)
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 2000))
+    EXPORT_TEMP_DIR = os.environ.get('EXPORT_TEMP_DIR')
+
+    # Bulk invoice import (POST /upload-invoices/bulk); each file inside
+    # still has to fit MAX_FILE_SIZE_MB.
+    BULK_IMPORT_MAX_ROWS = int(os.environ.get('BULK_IMPORT_MAX_ROWS', 500))
+    BULK_IMPORT_MAX_CONTENT_LENGTH = int(os.environ.get('BULK_IMPORT_MAX_CONTENT_LENGTH', 200 * 1024 * 1024))
+    BULK_IMPORT_MAX_MANIFEST_BYTES = int(os.environ.get('BULK_IMPORT_MAX_MANIFEST_BYTES', 1024 * 1024))
+
+    # Vendor notifications (see app/notifications.py): queued as background
+    # jobs of up to NOTIFICATION_BATCH_SIZE rows each. The sidebar's unread
+    # count is cached per worker for NOTIFICATION_COUNT_TTL seconds.
+    NOTIFICATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE', 500))
+    NOTIFICATION_COUNT_TTL = int(os.environ.get('NOTIFICATION_COUNT_TTL', 60))
+    NOTIFICATIONS_PER_PAGE = int(os.environ.get('NOTIFICATIONS_PER_PAGE', 50))
+
+    # Live updates over Server-Sent Events (see app/events.py): 'redis' (all
+    # workers), 'none', or 'memory' (streams in the same worker; debug mode or
+    # EVENTS_SINGLE_WORKER only). Default: 'redis' if EVENTS_REDIS_URL is set,
+    # else 'none'. /events is only served by gevent workers unless
+    # EVENTS_REQUIRE_GEVENT is off.
+    EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND')
+    EVENTS_REDIS_URL = os.environ.get('EVENTS_REDIS_URL') # e.g. redis://localhost:6379/2
+    EVENTS_SINGLE_WORKER = os.environ.get('EVENTS_SINGLE_WORKER', 'false').lower() in ('1', 'true', 'yes')
+    EVENTS_REQUIRE_GEVENT = os.environ.get('EVENTS_REQUIRE_GEVENT', 'true').lower() in ('1', 'true', 'yes')
+    EVENTS_MAX_CONNECTIONS = int(os.environ.get('EVENTS_MAX_CONNECTIONS', 10000)) # per worker process
+    EVENTS_MAX_PENDING = int(os.environ.get('EVENTS_MAX_PENDING', 64)) # queued events per stream
+    EVENTS_HEARTBEAT_SECONDS = float(os.environ.get('EVENTS_HEARTBEAT_SECONDS', 20))
+    EVENTS_MAX_STREAM_SECONDS = float(os.environ.get('EVENTS_MAX_STREAM_SECONDS', 3600))
+
+    # Document downloads
+    # Stored files never change, so browsers may cache them for a year.
+    # SENDFILE_MODE='x-accel-redirect' lets nginx stream the bytes from an
+    # internal location that maps X_ACCEL_REDIRECT_PREFIX to UPLOAD_FOLDER;
+    # 'x-sendfile' does the same for Apache/lighttpd. A BLOB_FOLDER outside
+    # UPLOAD_FOLDER needs a location of its own, X_ACCEL_REDIRECT_BLOB_PREFIX.
+    DOCUMENT_CACHE_MAX_AGE = int(os.environ.get('DOCUMENT_CACHE_MAX_AGE', 365 * 24 * 3600))
+    SENDFILE_MODE = os.environ.get('SENDFILE_MODE')
+    X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX', '/protected-uploads')
+    X_ACCEL_REDIRECT_BLOB_PREFIX = os.environ.get('X_ACCEL_REDIRECT_BLOB_PREFIX') # e.g. /protected-blobs
+    USE_X_SENDFILE = SENDFILE_MODE == 'x-sendfile'
+
+    # Document storage backend: 'local' (BLOB_FOLDER, default uploads/blobs)
+    # or 's3' for any S3-compatible service. S3 credentials are read by boto3
+    # from the usual AWS_* environment variables.
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    BLOB_FOLDER = os.environ.get('BLOB_FOLDER') # default: <UPLOAD_FOLDER>/blobs
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    S3_PREFIX = os.environ.get('S3_PREFIX', 'blobs')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL') # e.g. http://localhost:9000 for MinIO
+    S3_REGION = os.environ.get('S3_REGION')
+    S3_PRESIGNED_URL_EXPIRES = int(os.environ.get('S3_PRESIGNED_URL_EXPIRES', 300))
+
+    # Rendered dashboard/profile pages (see app/page_cache.py): 'redis'
+    # (shared by all workers), 'none', or 'memory' (per worker, LRU capped at
+    # PAGE_CACHE_MAX_BYTES; only for a single worker, since other workers'
+    # commits don't reach it). Default: 'redis' if PAGE_CACHE_REDIS_URL is
+    # set, else 'none'.
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND')
+    PAGE_CACHE_MAX_BYTES = int(os.environ.get('PAGE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 300))
+    PAGE_CACHE_REDIS_URL = os.environ.get('PAGE_CACHE_REDIS_URL') # e.g. redis://localhost:6379/1
+
+    # Compiled Jinja templates are cached on disk (see app/templating.py);
+    # run 'flask templates compile' at deploy time to fill the cache.
+    TEMPLATE_BYTECODE_CACHE = os.environ.get('TEMPLATE_BYTECODE_CACHE', 'true').lower() in ('1', 'true', 'yes')
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR') # default: <instance>/jinja-cache
+
+    # Static assets (see app/assets.py): 'flask assets build' writes
+    # fingerprinted CSS, fonts and images to app/static/dist, which are then
+    # served with an immutable Cache-Control of STATIC_ASSET_MAX_AGE.
+    ASSET_MANIFEST = os.environ.get('ASSET_MANIFEST') # default: app/static/dist/manifest.json
+    # Refuse to start without a manifest (pages would link a stylesheet that
+    # doesn't exist); not enforced in debug mode or for flask CLI commands.
+    ASSET_MANIFEST_REQUIRED = os.environ.get('ASSET_MANIFEST_REQUIRED', 'true').lower() in ('1', 'true', 'yes')
+    STATIC_ASSET_MAX_AGE = int(os.environ.get('STATIC_ASSET_MAX_AGE', 365 * 24 * 3600))
+    TAILWIND_CMD = os.environ.get('TAILWIND_CMD', 'npx tailwindcss')
@@ -0,0 +1,123 @@
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from collections import deque
+import threading
+import time
+
+
+# --- Connection pool instrumentation ---
+# The app's engine uses InstrumentedQueuePool, which times how long each
+# checkout waits for a free connection. Together with the pool's own
+# counters this is exposed on /internal/metrics/db.
+
+RECENT_WAITS = 1000
+
+
+class PoolStats:
+    """Counters for one pool. Updated from many threads, so guarded by a lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.peak_in_use = 0
+        self._recent_waits = deque(maxlen=RECENT_WAITS)
+
+    def record_checkout(self, waited, in_use):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            self.peak_in_use = max(self.peak_in_use, in_use)
+            self._recent_waits.append(waited)
+
+    def record_timeout(self, waited):
+        with self._lock:
+            self.timeouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def record_invalidation(self):
+        with self._lock:
+            self.invalidations += 1
+
+    def wait_percentiles(self):
+        """p50/p95/p99 checkout wait (seconds) over the most recent checkouts."""
+        with self._lock:
+            waits = sorted(self._recent_waits)
+        if not waits:
+            return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+        pick = lambda q: waits[min(len(waits) - 1, int(q * len(waits)))]
+        return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99)}
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        stats = self.stats = PoolStats()
+        event.listen(self, 'connect', lambda dbapi_connection, record: stats.record_connect())
+        event.listen(self, 'invalidate', lambda dbapi_connection, record, exception: stats.record_invalidation())
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_timeout(time.perf_counter() - started)
+            raise
+        self.stats.record_checkout(time.perf_counter() - started, self.checkedout())
+        return connection
+
+
+def _uses_queue_pool(database_uri):
+    url = make_url(database_uri)
+    # In-memory SQLite needs its single shared connection, not a QueuePool.
+    return not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'))
+
+
+def configure_pool(app):
+    """Switches the engine to InstrumentedQueuePool. Must run before db.init_app()."""
+    if not _uses_queue_pool(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    options.setdefault('poolclass', InstrumentedQueuePool)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def pool_snapshot(engine):
+    """Current pool state and counters as a JSON-friendly dict."""
+    pool = engine.pool
+    snapshot = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        snapshot.update(
+            size=pool.size(),
+            in_use=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+            timeout_seconds=pool.timeout(),
+        )
+    stats = getattr(pool, 'stats', None)
+    if stats is not None:
+        snapshot.update(
+            checkouts=stats.checkouts,
+            checkout_timeouts=stats.timeouts,
+            connects=stats.connects,
+            invalidations=stats.invalidations,
+            peak_in_use=stats.peak_in_use,
+            checkout_wait_seconds_total=round(stats.wait_seconds_total, 6),
+            checkout_wait_seconds_max=round(stats.wait_seconds_max, 6),
+            checkout_wait_seconds={k: round(v, 6) for k, v in stats.wait_percentiles().items()},
+        )
+    return snapshot
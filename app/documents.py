@@ -0,0 +1,105 @@
+from .models import db, VendorMaterial, VendorWork, VendorDocument
+from sqlalchemy import event, select, insert, delete
+from sqlalchemy.orm import attributes
+
+
+# form_type -> (model, attachment kinds). Each kind is stored in the
+# '<kind>_path' column of the form.
+FORM_DOCUMENTS = {
+    'material': (VendorMaterial, (
+        'pan_card_copy', 'gst_certificate_copy', 'cancelled_cheque_copy',
+        'address_proof_copy', 'auth_letter_copy',
+    )),
+    'work': (VendorWork, (
+        'pan_card_copy', 'proprietor_id_copy', 'cancelled_cheque_copy', 'address_proof_copy',
+        'gst_certificate_copy', 'pf_esic_copy', 'work_orders_copy',
+    )),
+}
+
+
+def _filenames(form, kind):
+    if kind == 'work_orders_copy':
+        return form.work_orders_copy_paths
+    value = getattr(form, f"{kind}_path")
+    return [value] if value else []
+
+
+def document_rows(form_type, form):
+    """The vendor_documents rows describing a form's attachments."""
+    _, kinds = FORM_DOCUMENTS[form_type]
+    return [
+        dict(user_id=form.user_id, form_type=form_type, doc_kind=kind, filename=filename)
+        for kind in kinds
+        for filename in _filenames(form, kind)
+    ]
+
+
+def owns_vendor_document(user_id, filename):
+    """True if `filename` is one of the user's vendor form attachments (one index lookup)."""
+    return db.session.execute(
+        select(VendorDocument.id)
+        .where(VendorDocument.filename == filename, VendorDocument.user_id == user_id)
+        .limit(1)
+    ).first() is not None
+
+
+def backfill_vendor_documents():
+    """Rebuilds vendor_documents from the forms' *_copy_path columns. Returns the row count."""
+    rows = []
+    for form_type, (model, _) in FORM_DOCUMENTS.items():
+        for form in db.session.execute(select(model)).scalars():
+            rows.extend(document_rows(form_type, form))
+
+    db.session.execute(delete(VendorDocument))
+    if rows:
+        db.session.execute(insert(VendorDocument), rows)
+    db.session.commit()
+    return len(rows)
+
+
+# --- Keeping vendor_documents in sync ---
+# Mapper events write through the flush's own connection, so the document
+# rows are committed or rolled back together with the form itself.
+
+def _replace_rows(connection, form_type, target):
+    connection.execute(
+        delete(VendorDocument).where(VendorDocument.user_id == target.user_id,
+                                     VendorDocument.form_type == form_type)
+    )
+    rows = document_rows(form_type, target)
+    if rows:
+        connection.execute(insert(VendorDocument), rows)
+
+
+def _listen(form_type, model, kinds):
+    columns = [f"{kind}_path" for kind in kinds] + ['user_id']
+
+    @event.listens_for(model, 'after_insert')
+    def _after_insert(mapper, connection, target):
+        rows = document_rows(form_type, target)
+        if rows:
+            connection.execute(insert(VendorDocument), rows)
+
+    @event.listens_for(model, 'after_update')
+    def _after_update(mapper, connection, target):
+        state = attributes.instance_state(target)
+        if not any(state.attrs[column].history.has_changes() for column in columns):
+            return
+        previous_owner = state.attrs['user_id'].history.deleted
+        if previous_owner and previous_owner[0] is not None:
+            connection.execute(
+                delete(VendorDocument).where(VendorDocument.user_id == previous_owner[0],
+                                             VendorDocument.form_type == form_type)
+            )
+        _replace_rows(connection, form_type, target)
+
+    @event.listens_for(model, 'after_delete')
+    def _after_delete(mapper, connection, target):
+        connection.execute(
+            delete(VendorDocument).where(VendorDocument.user_id == target.user_id,
+                                         VendorDocument.form_type == form_type)
+        )
+
+
+for _form_type, (_model, _kinds) in FORM_DOCUMENTS.items():
+    _listen(_form_type, _model, _kinds)
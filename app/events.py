@@ -0,0 +1,321 @@
+from flask import current_app, has_app_context
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+from .models import Invoice, SupportTicket
+import json
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # redis is only needed for EVENTS_BACKEND='redis'
+    redis = None
+
+
+# --- Live events (Server-Sent Events) ---
+# GET /events keeps a text/event-stream open per browser tab and pushes the
+# vendor's updates as they are committed:
+#   invoice       an invoice's status or payment date changed
+#   ticket        a support ticket's status changed
+#   notification  new notifications were written by a deliver_notifications job
+#   resync        events were dropped; reload state from the server
+# Commits publish through EventHub to a backend that delivers them to the
+# open streams: 'redis' reaches every worker; 'memory' reaches streams in
+# the same process only, so a vendor whose stream is held by another worker
+# would never hear of the change. 'memory' is therefore refused unless the
+# app runs in debug mode or EVENTS_SINGLE_WORKER promises one worker
+# process. Without EVENTS_BACKEND the default is 'redis' when
+# EVENTS_REDIS_URL is set and 'none' (no live updates) otherwise.
+#
+# An open stream is mostly idle, so it must not hold a thread or a database
+# connection. Serve /events from a gevent worker, where each connection is
+# a greenlet:
+#   gunicorn -k gevent --worker-connections 10000 run:app
+# and turn proxy buffering off for it. Under a thread-per-request worker the
+# endpoint answers 204, which tells EventSource not to reconnect, unless
+# EVENTS_REQUIRE_GEVENT is off (the threaded dev server).
+
+_PENDING_KEY = 'pending_live_events'
+
+
+class TooManySubscribers(Exception):
+    """This process already serves EVENTS_MAX_CONNECTIONS streams."""
+
+
+def format_event(name, data):
+    """One SSE message, encoded once and shared by every stream it goes to."""
+    return f"event: {name}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+
+class Subscription:
+    """
+    One open stream. Pending messages are kept in a bounded deque; when a
+    slow client lets it fill up, the oldest are dropped and the stream
+    sends a resync event instead.
+    """
+    __slots__ = ('user_id', 'pending', 'overflowed', '_ready')
+
+    def __init__(self, user_id, max_pending):
+        self.user_id = user_id
+        self.pending = deque(maxlen=max_pending)
+        self.overflowed = False
+        self._ready = threading.Event()
+
+    def put(self, message):
+        if len(self.pending) == self.pending.maxlen:
+            self.overflowed = True
+        self.pending.append(message)
+        self._ready.set()
+
+    def wait(self, timeout):
+        """Returns the pending messages, waiting up to `timeout` seconds for the first."""
+        if not self.pending:
+            self._ready.wait(timeout)
+        self._ready.clear()
+        messages = []
+        while self.pending:
+            messages.append(self.pending.popleft())
+        return messages
+
+
+class MemoryEventBackend:
+    """Delivers events to streams in this process only."""
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+
+    def publish_many(self, messages):
+        for user_id, message in messages:
+            self.deliver(user_id, message)
+
+
+class RedisEventBackend:
+    """
+    Delivers events to every worker through Redis pub/sub. Each worker
+    listens on one pattern subscription, started with the first stream.
+    `client` is a redis-py client or anything with the same publish,
+    pipeline and pubsub (e.g. fakeredis).
+    """
+
+    def __init__(self, client, deliver, prefix='vendorportal:events:'):
+        self.client = client
+        self.deliver = deliver
+        self.prefix = prefix
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def publish_many(self, messages):
+        pipeline = self.client.pipeline(transaction=False)
+        for user_id, message in messages:
+            pipeline.publish(f"{self.prefix}{user_id}", message)
+        pipeline.execute()
+
+    def listen(self):
+        with self._lock:
+            if self._listener is not None:
+                return
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(**{f"{self.prefix}*": self._on_message})
+            self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def _on_message(self, item):
+        channel, data = item['channel'], item['data']
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        self.deliver(int(channel[len(self.prefix):]), data)
+
+
+def event_backend_name(config):
+    return config.get('EVENTS_BACKEND') or ('redis' if config.get('EVENTS_REDIS_URL') else 'none')
+
+
+def check_event_config(app):
+    """Raises RuntimeError at startup for an EVENTS_BACKEND that would lose events."""
+    backend = event_backend_name(app.config)
+    if backend not in ('none', 'memory', 'redis'):
+        raise RuntimeError(f"Unknown EVENTS_BACKEND '{backend}'.")
+    if backend == 'memory' and not (app.debug or app.config.get('EVENTS_SINGLE_WORKER')):
+        raise RuntimeError(
+            "EVENTS_BACKEND='memory' only reaches streams held by the same worker process. "
+            "Use EVENTS_BACKEND='redis', or set EVENTS_SINGLE_WORKER=true if this app runs a single worker.")
+    if backend == 'redis' and redis is None:
+        raise RuntimeError("EVENTS_BACKEND='redis' requires the redis package.")
+    if backend == 'redis' and not app.config.get('EVENTS_REDIS_URL'):
+        raise RuntimeError("EVENTS_BACKEND='redis' requires EVENTS_REDIS_URL.")
+
+
+def create_event_backend(config, deliver):
+    backend = event_backend_name(config)
+    if backend == 'none':
+        return None
+    if backend == 'memory':
+        return MemoryEventBackend(deliver)
+    if backend == 'redis':
+        if redis is None:
+            raise RuntimeError("EVENTS_BACKEND='redis' requires the redis package.")
+        if not config.get('EVENTS_REDIS_URL'):
+            raise RuntimeError("EVENTS_BACKEND='redis' requires EVENTS_REDIS_URL.")
+        return RedisEventBackend(redis.Redis.from_url(config['EVENTS_REDIS_URL']), deliver)
+    raise RuntimeError(f"Unknown EVENTS_BACKEND '{backend}'.")
+
+
+def running_under_gevent():
+    """True if gevent has patched the standard library (e.g. gunicorn -k gevent)."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+
+class EventHub:
+    """In-process pub/sub between committed writes and the open /events streams."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._backend = None
+        self._subscribers = {}  # user_id -> set of Subscription
+        self._count = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        check_event_config(app)
+        self.app = app
+        app.extensions['event_hub'] = self
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = create_event_backend(self.app.config, self._deliver)
+        return self._backend
+
+    @property
+    def connections(self):
+        return self._count
+
+    def available(self):
+        """Whether this worker can serve /events at all."""
+        if self.backend is None:
+            return False
+        return running_under_gevent() or not self.app.config.get('EVENTS_REQUIRE_GEVENT', True)
+
+    def publish(self, user_id, name, data):
+        self.publish_many([(user_id, name, data)])
+
+    def publish_many(self, events):
+        """Publishes (user_id, event name, data) tuples. Never raises: live events are best effort."""
+        if not events or self.app is None:
+            return
+        try:
+            if self.backend is not None:
+                self.backend.publish_many([(user_id, format_event(name, data)) for user_id, name, data in events])
+        except Exception as e:
+            self.app.logger.warning(f"Could not publish {len(events)} live event(s): {e}")
+
+    def subscribe(self, user_id):
+        if isinstance(self.backend, RedisEventBackend):
+            self.backend.listen()
+        subscription = Subscription(user_id, self.app.config.get('EVENTS_MAX_PENDING', 64))
+        with self._lock:
+            if self._count >= self.app.config.get('EVENTS_MAX_CONNECTIONS', 10000):
+                raise TooManySubscribers()
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions and subscription in subscriptions:
+                subscriptions.discard(subscription)
+                self._count -= 1
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+
+    def _deliver(self, user_id, message):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+    def stream(self, subscription, first=()):
+        """
+        The body of an /events response. Sends a comment every
+        EVENTS_HEARTBEAT_SECONDS so proxies keep the connection open and
+        dead clients are noticed, and ends after EVENTS_MAX_STREAM_SECONDS
+        (the browser reconnects), so workers can be restarted gracefully.
+        """
+        heartbeat = self.app.config.get('EVENTS_HEARTBEAT_SECONDS', 20)
+        deadline = time.monotonic() + self.app.config.get('EVENTS_MAX_STREAM_SECONDS', 3600)
+        try:
+            yield f"retry: {self.app.config.get('EVENTS_RETRY_MS', 5000)}\n\n"
+            yield from first
+            while time.monotonic() < deadline:
+                messages = subscription.wait(heartbeat)
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    messages.append(format_event('resync', {}))
+                yield ''.join(messages) if messages else ': keep-alive\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+
+event_hub = EventHub()
+
+
+# --- Publishing committed changes ---
+# Collected at flush time (while old values are known) and published after
+# commit, like the notifications in app/notifications.py. That module also
+# registers active_history on these attributes, so the old values are loaded.
+
+def _transition(obj, key):
+    """(old, new) if the attribute changed in this flush, else None."""
+    history = attributes.get_history(obj, key)
+    if not history.added:
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0]
+    return None if old == new else (old, new)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_live_events(session, flush_context, instances):
+    events = []
+    for obj in session.dirty:
+        if isinstance(obj, Invoice):
+            status, payment_date = _transition(obj, 'status'), _transition(obj, 'payment_date')
+            if status or payment_date:
+                events.append((obj.user_id, 'invoice', {
+                    'id': obj.id, 'invoice_number': obj.invoice_number,
+                    'status': obj.status, 'previous_status': status[0] if status else obj.status,
+                    'payment_date': obj.payment_date.isoformat() if obj.payment_date else None,
+                }))
+        elif isinstance(obj, SupportTicket):
+            status = _transition(obj, 'status')
+            if status and status[1] is not None:
+                events.append((obj.user_id, 'ticket', {
+                    'id': obj.id, 'subject': obj.subject, 'status': status[1].value,
+                    'previous_status': status[0].value if status[0] is not None else None,
+                }))
+    if events:
+        session.info.setdefault(_PENDING_KEY, []).extend(events)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_live_events(session):
+    events = session.info.pop(_PENDING_KEY, None)
+    if not events or not has_app_context():
+        return
+    hub = current_app.extensions.get('event_hub')
+    if hub is not None:
+        hub.publish_many(events)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_live_events(session):
+    session.info.pop(_PENDING_KEY, None)
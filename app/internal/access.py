@@ -0,0 +1,11 @@
+from flask import session, request, current_app
+import secrets
+
+
+def has_internal_access():
+    """True for a logged-in admin or a caller presenting INTERNAL_METRICS_TOKEN as a bearer token."""
+    if 'admin_id' in session:
+        return True
+    token = current_app.config.get('INTERNAL_METRICS_TOKEN')
+    auth_header = request.headers.get('Authorization', '')
+    return bool(token) and auth_header.startswith('Bearer ') and secrets.compare_digest(auth_header[7:], token)
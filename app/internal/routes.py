@@ -0,0 +1,63 @@
+from flask import Blueprint, render_template, session, current_app, jsonify, Response
+from app.models import db
+from app.db_pool import pool_snapshot
+from app.metrics import render_metrics
+from app.profiling import list_profiles, load_profile, collapsed_stacks
+from functools import wraps
+from .access import has_internal_access
+
+
+internal_bp = Blueprint('internal', __name__)
+
+
+def internal_access_required(f):
+    """Lets in admins and metrics scrapers (see has_internal_access); everyone else gets a plain 404."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not has_internal_access():
+            return render_template('error/404.html'), 404
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def admin_required(f):
+    """Admin session only; everyone else gets a plain 404."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'admin_id' not in session:
+            return render_template('error/404.html'), 404
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+## Connection pool metrics
+@internal_bp.route('/internal/metrics/db')
+@internal_access_required
+def db_metrics():
+    return jsonify(pool_snapshot(db.engine))
+
+
+## Prometheus scrape endpoint
+@internal_bp.route('/metrics')
+@internal_access_required
+def prometheus_metrics():
+    return Response(render_metrics(pool_snapshot(db.engine)), mimetype='text/plain; version=0.0.4')
+
+
+## Slow request profiles
+@internal_bp.route('/internal/profiles')
+@admin_required
+def profiles():
+    return render_template('internal/profiles.html', profiles=list_profiles(),
+                           enabled=current_app.config.get('PROFILING_ENABLED', False))
+
+
+@internal_bp.route('/internal/profiles/<profile_id>.collapsed')
+@admin_required
+def profile_collapsed(profile_id):
+    profile = load_profile(profile_id)
+    if profile is None:
+        return render_template('error/404.html'), 404
+    response = Response(collapsed_stacks(profile), mimetype='text/plain')
+    response.headers.set('Content-Disposition', 'attachment', filename=f"{profile_id}.collapsed.txt")
+    return response
@@ -0,0 +1,238 @@
+from .models import db, Job
+from sqlalchemy import select, update, insert
+from sqlalchemy.engine import Connection
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import json
+import random
+import threading
+import traceback
+
+
+# kind -> handler function, filled in by @job_handler
+HANDLERS = {}
+
+
+class PermanentJobError(Exception):
+    """
+    Raised by a handler when retrying cannot help; the job fails at once.
+    `on_failure`, if given, runs after the handler's work is rolled back and
+    is committed together with the failed status; what it returns becomes
+    the job's result.
+    """
+
+    def __init__(self, message, on_failure=None):
+        super().__init__(message)
+        self.on_failure = on_failure
+
+
+def job_handler(kind):
+    """Registers a function as the handler for jobs of the given kind."""
+    def decorator(f):
+        HANDLERS[kind] = f
+        return f
+    return decorator
+
+
+def enqueue(kind, user_id=None, max_attempts=None, **payload):
+    """
+    Adds a job to the current session. It is only picked up once the
+    caller commits, so jobs are recorded atomically with the rows they
+    belong to.
+    """
+    job = Job(kind=kind, payload=json.dumps(payload), user_id=user_id, status='queued',
+              run_after=datetime.utcnow())
+    if max_attempts is not None:
+        job.max_attempts = max_attempts
+    db.session.add(job)
+    job_queue.wake()
+    return job
+
+
+def enqueue_many(kind, payloads, user_id=None, session=None):
+    """
+    enqueue() for a batch of jobs of one kind, written with a single
+    executemany INSERT in the current transaction (of `session`, by default
+    db.session; a Connection works too). Returns the new job ids, so pages
+    can poll their status.
+    """
+    now = datetime.utcnow()
+    rows = [dict(kind=kind, payload=json.dumps(payload), user_id=user_id, status='queued', run_after=now)
+            for payload in payloads]
+    if not rows:
+        return []
+    executor = session or db.session
+    connection = executor if isinstance(executor, Connection) else executor.connection()
+    if connection.dialect.insert_executemany_returning:
+        ids = executor.execute(insert(Job).returning(Job.id, sort_by_parameter_order=True), rows).scalars().all()
+    else:
+        # No RETURNING with executemany (MySQL): one INSERT per job instead
+        ids = [executor.execute(insert(Job).values(row)).inserted_primary_key[0] for row in rows]
+    job_queue.wake()
+    return ids
+
+
+class JobQueue:
+    """
+    In-process job runner backed by the jobs table.
+
+    A dispatcher thread claims due jobs with a conditional UPDATE (so several
+    workers or processes never run the same job) and hands them to a bounded
+    thread pool. Failed jobs are retried with exponential backoff and jitter.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._dispatcher = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['job_queue'] = self
+
+        @app.before_request
+        def _start_job_queue():
+            self.ensure_started()
+
+    def ensure_started(self):
+        """Starts the dispatcher on first use; cheap to call on every request."""
+        if self._dispatcher is not None or not self.app.config.get('JOBS_ENABLED', True):
+            return
+        with self._lock:
+            if self._dispatcher is not None:
+                return
+            workers = self.app.config.get('JOB_WORKERS', 2)
+            self._slots = threading.BoundedSemaphore(workers)
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job-worker')
+            self._requeue_stale_jobs()
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name='job-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def shutdown(self, wait=True):
+        self._stop.set()
+        self._wake.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+    def _requeue_stale_jobs(self):
+        """Jobs left 'running' by a crashed process go back to the queue."""
+        timeout = timedelta(seconds=self.app.config.get('JOB_STALE_AFTER_SECONDS', 600))
+        with self.app.app_context():
+            db.session.execute(
+                update(Job)
+                .where(Job.status == 'running', Job.updated_at < datetime.utcnow() - timeout)
+                .values(status='queued', run_after=datetime.utcnow())
+            )
+            db.session.commit()
+
+    def _dispatch_loop(self):
+        poll_interval = self.app.config.get('JOB_POLL_INTERVAL', 2.0)
+        while not self._stop.is_set():
+            try:
+                self._dispatch_due_jobs()
+            except Exception as e:
+                self.app.logger.error(f"Job dispatcher error: {e}\n{traceback.format_exc()}")
+            self._wake.wait(poll_interval)
+            self._wake.clear()
+
+    def _dispatch_due_jobs(self):
+        with self.app.app_context():
+            try:
+                while self._slots.acquire(blocking=False):
+                    job_id = self._claim_next_job()
+                    if job_id is None:
+                        self._slots.release()
+                        break
+                    self._executor.submit(self._run, job_id)
+            finally:
+                db.session.remove()
+
+    def _claim_next_job(self):
+        candidates = db.session.execute(
+            select(Job.id)
+            .where(Job.status == 'queued', Job.run_after <= datetime.utcnow())
+            .order_by(Job.run_after).limit(5)
+        ).scalars().all()
+
+        for job_id in candidates:
+            claimed = db.session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == 'queued')
+                .values(status='running', attempts=Job.attempts + 1, updated_at=datetime.utcnow())
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return job_id
+        return None
+
+    def _run(self, job_id):
+        try:
+            with self.app.app_context():
+                try:
+                    self._run_in_context(job_id)
+                finally:
+                    db.session.remove()
+        finally:
+            self._slots.release()
+            self._wake.set()
+
+    def _run_in_context(self, job_id):
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return
+        handler = HANDLERS.get(job.kind)
+        try:
+            if handler is None:
+                raise PermanentJobError(f"No handler registered for job kind '{job.kind}'")
+            result = handler(**json.loads(job.payload or '{}'))
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.last_error = f"{type(e).__name__}: {e}"
+            if isinstance(e, PermanentJobError) or job.attempts >= job.max_attempts:
+                job.status = 'failed'
+                self.app.logger.error(f"Job {job_id} ({job.kind}) failed: {e}\n{traceback.format_exc()}")
+                if getattr(e, 'on_failure', None) is not None:
+                    self._run_failure_hook(job, e.on_failure)
+            else:
+                job.status = 'queued'
+                job.run_after = datetime.utcnow() + self._backoff(job.attempts)
+                self.app.logger.warning(f"Job {job_id} ({job.kind}) attempt {job.attempts} failed, retrying: {e}")
+            db.session.commit()
+            return
+
+        job.status = 'done'
+        job.result = json.dumps(result) if result is not None else None
+        job.last_error = None
+        db.session.commit()
+
+    def _run_failure_hook(self, job, on_failure):
+        error = job.last_error
+        try:
+            result = on_failure()
+            job.result = json.dumps(result) if result is not None else None
+            db.session.flush()
+        except Exception as e:
+            # The job still fails; only the hook's changes are dropped.
+            db.session.rollback()
+            self.app.logger.error(f"Failure handler of job {job.id} ({job.kind}) failed: {e}\n{traceback.format_exc()}")
+            job.status = 'failed'
+            job.last_error = f"{error}; failure handler: {type(e).__name__}: {e}"
+
+    def _backoff(self, attempts):
+        base = self.app.config.get('JOB_RETRY_BASE_SECONDS', 5)
+        cap = self.app.config.get('JOB_RETRY_MAX_SECONDS', 600)
+        delay = min(cap, base * (2 ** (attempts - 1)))
+        return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+job_queue = JobQueue()
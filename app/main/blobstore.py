@@ -0,0 +1,252 @@
+from flask import current_app, has_app_context
+from app.models import db, StoredBlob, StoredFile
+from app.jobs import job_handler, enqueue_many
+from sqlalchemy import event, select, insert, update, delete, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from werkzeug.utils import secure_filename
+from collections import Counter
+from contextlib import contextmanager
+from .storage import create_storage
+import os
+import uuid
+
+
+# --- Content-addressed document store ---
+# Uploaded files are stored once per unique content under the key
+#   <sha[0:2]>/<sha[2:4]>/<sha256>
+# in the configured storage backend (see storage.py; by default a directory
+# at BLOB_FOLDER), and every stored filename handed out to the app (Invoice.file_path,
+# *_copy_path) is a row in stored_files pointing at its blob. Blobs are
+# reference counted and removed when the last filename is released.
+# The helpers here never commit: the references they write belong to the
+# caller's transaction, together with the rows that use the filenames.
+
+_WRITTEN_KEY = 'blobstore_written'    # digests whose content this transaction wrote
+_ORPHANED_KEY = 'blobstore_orphaned'  # digests whose last reference it dropped
+
+
+def blob_root():
+    return current_app.config.get('BLOB_FOLDER') or os.path.join(current_app.config['UPLOAD_FOLDER'], 'blobs')
+
+
+def blob_temp_dir():
+    """Scratch directory for in-flight uploads, on the same disk as the blobs."""
+    path = os.path.join(blob_root(), 'tmp')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def blob_key(sha256):
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def thumbnail_key(sha256):
+    return f"{blob_key(sha256)}.thumb.jpg"
+
+
+def get_storage():
+    """The configured storage backend for this app, created on first use."""
+    storage = current_app.extensions.get('blob_storage')
+    if storage is None:
+        storage = create_storage(current_app.config, blob_root(), blob_temp_dir())
+        current_app.extensions['blob_storage'] = storage
+    return storage
+
+
+def _take_references(counts, sizes):
+    """
+    Adds counts[sha256] references to each blob row, inserting the rows
+    that don't exist yet, and returns the set of digests whose rows this
+    transaction inserted. The UPDATE comes first so that existing rows are
+    locked before anything else happens: a concurrent release_file() can't
+    drop them (and delete their content) until this transaction ends. A
+    fixed number of statements however many blobs: an executemany UPDATE,
+    one IN query and an executemany INSERT.
+    """
+    blobs = StoredBlob.__table__
+    for attempt in range(3):
+        db.session.execute(
+            update(blobs).where(blobs.c.sha256 == bindparam('blob_sha256'))
+            .values(ref_count=blobs.c.ref_count + bindparam('added')),
+            [{'blob_sha256': sha256, 'added': count} for sha256, count in counts.items()]
+        )
+        existing = set(db.session.execute(select(blobs.c.sha256).where(blobs.c.sha256.in_(counts))).scalars())
+        counts = {sha256: count for sha256, count in counts.items() if sha256 not in existing}
+        if not counts:
+            return set()
+        # As in app/stats.py: a concurrent upload of the same content may win
+        # the insert, in which case the reference is added to its row.
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(StoredBlob), [dict(sha256=sha256, size=sizes[sha256], ref_count=count)
+                                                        for sha256, count in counts.items()])
+        except IntegrityError:
+            if attempt == 2:
+                raise
+            continue
+        return set(counts)
+
+
+def store_uploads(writers, subfolder):
+    """
+    Moves finished StreamingFileWriters into the store and records a new
+    stored filename for each. Content that is already stored is not
+    written again; its blob just gains a reference.
+
+    The blob rows are secured before any content is written or discarded,
+    and nothing is committed: the caller's commit makes the files part of
+    the record, and a rollback drops the references and queues the deletion
+    of any content this transaction wrote that nothing else refers to.
+    Returns the stored filenames in the same order as `writers`.
+    """
+    entries = []
+    for writer in writers:
+        writer.finish()
+        entries.append((writer, f"{uuid.uuid4().hex}_{secure_filename(writer.filename)}"))
+
+    counts = Counter(writer.sha256 for writer, _ in entries)
+    inserted = _take_references(counts, {writer.sha256: writer.size for writer, _ in entries})
+    db.session.execute(insert(StoredFile), [
+        dict(filename=filename, subfolder=subfolder, sha256=writer.sha256) for writer, filename in entries
+    ])
+
+    # Each blob's row is now held by this transaction, so its content can't
+    # be deleted under us; write it unless it is already there.
+    storage = get_storage()
+    written = db.session.info.setdefault(_WRITTEN_KEY, set())
+    for writer, _ in entries:
+        sha256 = writer.sha256
+        if sha256 in written or (sha256 not in inserted and storage.exists(blob_key(sha256))):
+            writer.discard()
+        else:
+            storage.put_file(blob_key(sha256), writer.temp_path)
+            written.add(sha256)
+    return [filename for _, filename in entries]
+
+
+def store_upload(writer, subfolder):
+    """Single-file form of store_uploads(). Returns the stored filename."""
+    return store_uploads([writer], subfolder)[0]
+
+
+def _legacy_path(filename, subfolder):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], subfolder, filename)
+
+
+def locate_file(filename, subfolder):
+    """
+    Returns (path, sha256) for a stored filename. The path is None when the
+    blob lives in a remote backend. Files saved before the store existed are
+    still found at their old location in the subfolder, with a sha256 of None.
+    """
+    stored = db.session.get(StoredFile, filename)
+    if stored is not None and stored.subfolder == subfolder:
+        return get_storage().local_path(blob_key(stored.sha256)), stored.sha256
+    return _legacy_path(filename, subfolder), None
+
+
+@contextmanager
+def open_stored_file(filename, subfolder):
+    """Yields a local path to a stored file's content, downloading it first if needed."""
+    stored = db.session.get(StoredFile, filename)
+    if stored is not None and stored.subfolder == subfolder:
+        with get_storage().fetch(blob_key(stored.sha256)) as path:
+            yield path
+    else:
+        yield _legacy_path(filename, subfolder)
+
+
+def release_file(filename, subfolder):
+    """
+    Drops a stored filename; the caller commits. If nothing references the
+    blob any more, the commit also queues a job that deletes its content.
+    Legacy (pre-store) files are deleted directly.
+    """
+    stored = db.session.get(StoredFile, filename)
+    if stored is None or stored.subfolder != subfolder:
+        legacy_path = _legacy_path(filename, subfolder)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+        return
+
+    sha256 = stored.sha256
+    db.session.delete(stored)
+    db.session.execute(
+        update(StoredBlob).where(StoredBlob.sha256 == sha256).values(ref_count=StoredBlob.ref_count - 1)
+    )
+    orphaned = db.session.execute(
+        delete(StoredBlob).where(StoredBlob.sha256 == sha256, StoredBlob.ref_count <= 0)
+    ).rowcount
+    if orphaned:
+        db.session.info.setdefault(_ORPHANED_KEY, set()).add(sha256)
+
+
+# --- Deleting unreferenced content ---
+# Blob content is only deleted once no row refers to it: after the commit
+# of a release_file() that dropped the last reference, or after the
+# rollback of a store_uploads() that wrote new content. The deletions run
+# as a 'delete_blobs' background job, so the request that released or
+# failed to store the files doesn't wait on the storage backend. The job
+# for released blobs is queued in the releasing transaction itself; the
+# one for a rolled-back upload in a short transaction after the rollback.
+#
+# By the time the job runs a concurrent upload of the same content may
+# have claimed the blob, so each deletion first inserts a placeholder row
+# for the blob in a transaction of its own. If that fails the blob is in
+# use again and is kept; if it succeeds, uploads of that content wait on
+# the placeholder until the content is gone, then store it afresh.
+
+@job_handler('delete_blobs')
+def delete_blobs(sha256s):
+    """Deletes the content of blobs nothing refers to; failures retry the job."""
+    storage = get_storage()
+    blobs = StoredBlob.__table__
+    deleted, failed = 0, []
+    for sha256 in sha256s:
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(insert(blobs).values(sha256=sha256, size=0, ref_count=0))
+                storage.delete(blob_key(sha256))
+                storage.delete(thumbnail_key(sha256))
+                connection.execute(delete(blobs).where(blobs.c.sha256 == sha256))
+            deleted += 1
+        except IntegrityError:
+            pass  # referenced again
+        except Exception as e:
+            current_app.logger.error(f"Could not delete unreferenced blob {sha256}: {e}")
+            failed.append(sha256)
+    if failed:
+        # Deleting is idempotent, so the retry may safely go over the whole list.
+        raise RuntimeError(f"{len(failed)} of {len(sha256s)} blob(s) could not be deleted")
+    return {'deleted': deleted, 'kept': len(sha256s) - deleted}
+
+
+@event.listens_for(Session, 'before_commit')
+def _queue_orphaned_blobs(session):
+    if session.in_nested_transaction() or not has_app_context():
+        return  # only a savepoint is being released
+    orphaned = session.info.pop(_ORPHANED_KEY, None)
+    if orphaned:
+        enqueue_many('delete_blobs', [dict(sha256s=sorted(orphaned))], session=session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_written_blobs(session):
+    if session.in_nested_transaction():
+        return  # a savepoint was released, not the transaction committed
+    session.info.pop(_WRITTEN_KEY, None)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _queue_written_blobs(session):
+    if session.in_nested_transaction():
+        return  # only a savepoint was rolled back (see _take_references)
+    session.info.pop(_ORPHANED_KEY, None)
+    written = session.info.pop(_WRITTEN_KEY, None)
+    if written and has_app_context():
+        try:
+            with db.engine.begin() as connection:
+                enqueue_many('delete_blobs', [dict(sha256s=sorted(written))], session=connection)
+        except Exception as e:
+            current_app.logger.error(f"Could not queue deletion of {len(written)} unreferenced blob(s): {e}")
@@ -0,0 +1,306 @@
+from flask import current_app
+from app.models import db, Invoice
+from app.stats import apply_bulk_inserts
+from app.page_cache import invalidate_on_commit
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+from .uploads import UploadRejected, spool_stream, validate_streamed_file
+from .blobstore import blob_temp_dir, store_uploads, release_file
+from .tasks import enqueue_document_checks
+from decimal import Decimal, InvalidOperation
+from datetime import datetime
+import csv
+import io
+import itertools
+import json
+import os
+import zipfile
+
+
+# --- Bulk invoice import ---
+# A vendor sends a manifest (CSV or JSON) with one row per invoice:
+#   invoice_number, po_number, amount, description, file
+# plus the files it names, either as a ZIP archive holding the manifest and
+# the files, or as one multipart request with a `manifest` part and any
+# number of `files` parts. Rows are validated and checked for duplicates
+# (one IN query) before any file is read, the accepted files are stored in
+# one pass and all invoices are inserted with a single executemany in one
+# transaction. Every row gets an entry in the returned report.
+# The manifest is read before anything else, so it is capped in bytes
+# (BULK_IMPORT_MAX_MANIFEST_BYTES) and in rows: reading stops one row past
+# BULK_IMPORT_MAX_ROWS, which is enough to tell the manifest is too long.
+
+MANIFEST_NAMES = ('manifest.csv', 'manifest.json')
+
+# The same limits as InvoiceForm
+_FIELD_LIMITS = {'invoice_number': 20, 'po_number': 20, 'description': 70}
+
+
+class ManifestError(Exception):
+    """The manifest or archive cannot be read at all; the message is shown to the user."""
+
+
+class BulkInsertFailed(Exception):
+    """The invoice rows could not be committed; the rollback dropped the `stored` files too."""
+
+    def __init__(self, stored):
+        super().__init__(f"Bulk insert of {len(stored)} invoice(s) failed")
+        self.stored = stored
+
+
+def _result(row_number, invoice_number, status, message=None, file=None):
+    return {'row': row_number, 'invoice_number': invoice_number, 'status': status,
+            'message': message, 'file': file}
+
+
+def read_manifest(stream, name, size):
+    """
+    Parses a CSV or JSON manifest of `size` bytes into a list of dicts with
+    string values, reading at most BULK_IMPORT_MAX_ROWS + 1 rows.
+    """
+    max_bytes = current_app.config.get('BULK_IMPORT_MAX_MANIFEST_BYTES', 1024 * 1024)
+    if size > max_bytes:
+        raise ManifestError(f"The manifest must be at most {max_bytes // 1024}KB.")
+    max_rows = current_app.config.get('BULK_IMPORT_MAX_ROWS', 500)
+    try:
+        if name.lower().endswith('.json'):
+            data = json.loads(stream.read(max_bytes + 1).decode('utf-8-sig'))
+            if isinstance(data, dict):
+                data = data.get('invoices')
+            if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+                raise ManifestError('The JSON manifest must be a list of invoice objects.')
+            return [{key: '' if value is None else str(value) for key, value in row.items()}
+                    for row in data[:max_rows + 1]]
+        if name.lower().endswith('.csv'):
+            reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+            return [{(key or '').strip().lower(): (value or '') for key, value in row.items()}
+                    for row in itertools.islice(reader, max_rows + 1)]
+    except (UnicodeDecodeError, ValueError, csv.Error) as e:
+        raise ManifestError(f"The manifest could not be read: {e}")
+    raise ManifestError('The manifest must be a .csv or .json file.')
+
+
+def _clean_row(row):
+    """Returns (values for the Invoice row, error message or None)."""
+    values = {key: (row.get(key) or '').strip() for key in ('invoice_number', 'po_number', 'description', 'file')}
+    if not values['invoice_number']:
+        return values, 'Invoice number is required.'
+    if not values['po_number']:
+        return values, 'PO number is required.'
+    if not values['file']:
+        return values, 'No file given for this invoice.'
+    for key, limit in _FIELD_LIMITS.items():
+        if len(values[key]) > limit:
+            return values, f"{key.replace('_', ' ').capitalize()} must be at most {limit} characters."
+    try:
+        amount = Decimal((row.get('amount') or row.get('invoice_amount') or '').replace(',', '').strip())
+    except InvalidOperation:
+        return values, 'Amount must be a number.'
+    if not amount.is_finite() or amount <= 0:
+        return values, 'Amount must be greater than zero.'
+    values['invoice_amount'] = float(amount)
+    return values, None
+
+
+def plan_import(user_id, rows):
+    """
+    Validates manifest rows and drops duplicates, both within the manifest
+    and against the vendor's existing invoices (one IN query).
+    Returns (accepted [(row number, values)], report entries for rejected rows).
+    """
+    max_rows = current_app.config.get('BULK_IMPORT_MAX_ROWS', 500)
+    if not rows:
+        raise ManifestError('The manifest has no invoices.')
+    if len(rows) > max_rows:
+        raise ManifestError(f"A bulk import can contain at most {max_rows} invoices; this one has more.")
+
+    accepted, rejected, seen = [], [], set()
+    for row_number, row in enumerate(rows, start=1):
+        values, error = _clean_row(row)
+        if error:
+            rejected.append(_result(row_number, values['invoice_number'], 'invalid', error, values['file']))
+        elif values['invoice_number'] in seen:
+            rejected.append(_result(row_number, values['invoice_number'], 'duplicate',
+                                    'This invoice number appears more than once in the manifest.', values['file']))
+        else:
+            seen.add(values['invoice_number'])
+            accepted.append((row_number, values))
+
+    existing = _existing_numbers(user_id, seen)
+    if existing:
+        for row_number, values in accepted:
+            if values['invoice_number'] in existing:
+                rejected.append(_already_uploaded(row_number, values))
+        accepted = [(row_number, values) for row_number, values in accepted if values['invoice_number'] not in existing]
+    return accepted, rejected
+
+
+def _existing_numbers(user_id, invoice_numbers):
+    """Which of `invoice_numbers` the vendor already has (one IN query)."""
+    if not invoice_numbers:
+        return set()
+    return set(db.session.execute(
+        select(Invoice.invoice_number).where(Invoice.user_id == user_id, Invoice.invoice_number.in_(invoice_numbers))
+    ).scalars())
+
+
+def _already_uploaded(row_number, values):
+    return _result(row_number, values['invoice_number'], 'duplicate',
+                   f'You have already uploaded an invoice with the number "{values["invoice_number"]}".',
+                   values['file'])
+
+
+class ArchiveSource:
+    """Invoice files read from a ZIP archive holding the manifest."""
+
+    def __init__(self, path):
+        try:
+            self.archive = zipfile.ZipFile(path)
+        except (zipfile.BadZipFile, OSError):
+            raise ManifestError('The archive is not a valid ZIP file.')
+        self.members = {}
+        for info in self.archive.infolist():
+            if not info.is_dir():
+                # Matched on the bare file name, so folders inside the archive don't matter.
+                self.members.setdefault(os.path.basename(info.filename).lower(), info)
+
+    def read_manifest(self):
+        for name in MANIFEST_NAMES:
+            info = self.members.get(name)
+            if info is not None:
+                # file_size is what the archive claims; zipfile stops
+                # decompressing there, so the check also bounds a zip bomb.
+                with self.archive.open(info) as stream:
+                    return read_manifest(stream, name, info.file_size)
+        raise ManifestError(f"The archive must contain {' or '.join(MANIFEST_NAMES)}.")
+
+    def spool(self, name, temp_dir):
+        info = self.members.get(os.path.basename(name).lower())
+        if info is None:
+            raise UploadRejected(f"{name} is not in the archive.")
+        max_size = current_app.config.get('MAX_FILE_SIZE_MB', 5) * 1024 * 1024
+        if info.file_size > max_size:
+            raise UploadRejected(f"File '{name}' exceeds the maximum size limit of {max_size / (1024*1024)}MB.")
+        with self.archive.open(info) as stream:
+            return spool_stream(stream, os.path.basename(info.filename), temp_dir)
+
+    def close(self):
+        self.archive.close()
+
+
+class MultipartSource:
+    """Invoice files already streamed to disk from the `files` parts of the request."""
+
+    def __init__(self, writers):
+        self.writers = {}
+        for writer in writers:
+            self.writers.setdefault(secure_filename(writer.filename).lower(), writer)
+        self.used = set()
+
+    def spool(self, name, temp_dir):
+        key = secure_filename(name).lower()
+        writer = self.writers.get(key)
+        if writer is None:
+            raise UploadRejected(f"{name} was not uploaded.")
+        if key in self.used:
+            raise UploadRejected(f"{name} is already used by another invoice in this import.")
+        max_size = current_app.config.get('MAX_FILE_SIZE_MB', 5) * 1024 * 1024
+        if writer.size > max_size:
+            raise UploadRejected(f"File '{name}' exceeds the maximum size limit of {max_size / (1024*1024)}MB.")
+        error = validate_streamed_file(writer)
+        if error:
+            raise UploadRejected(error)
+        self.used.add(key)
+        return writer
+
+    def close(self):
+        pass
+
+
+def import_invoices(user_id, rows, source):
+    """
+    Imports the manifest `rows` for a vendor, reading files from `source`.
+    Commits, and returns the report: one entry per row, in manifest order.
+    Raises BulkInsertFailed (after rolling back) if the rows can't be written.
+    """
+    accepted, report = plan_import(user_id, rows)
+
+    temp_dir = blob_temp_dir()
+    writers, ready = [], []
+    try:
+        for row_number, values in accepted:
+            try:
+                writers.append(source.spool(values['file'], temp_dir))
+            except UploadRejected as e:
+                report.append(_result(row_number, values['invoice_number'], 'invalid', str(e), values['file']))
+            else:
+                ready.append((row_number, values))
+        stored = store_uploads(writers, 'invoices') if writers else []
+    except Exception:
+        for writer in writers:
+            writer.discard()
+        raise
+
+    now = datetime.utcnow()
+    pending = [(row_number, values, filename) for (row_number, values), filename in zip(ready, stored)]
+    job_ids = []
+    if pending:
+        try:
+            pending = _insert_invoices(user_id, pending, now, report)
+            mappings = [_invoice_mapping(user_id, values, filename, now) for _, values, filename in pending]
+            if mappings:
+                apply_bulk_inserts(db.session, mappings)
+                invalidate_on_commit(db.session, {user_id})
+                job_ids = enqueue_document_checks([filename for _, _, filename in pending], 'invoices', user_id)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise BulkInsertFailed(stored) from e
+
+    # The content check job of each created invoice, for the client to poll
+    for (row_number, values, _), job_id in zip(pending, job_ids):
+        entry = _result(row_number, values['invoice_number'], 'created', None, values['file'])
+        entry['job_id'] = job_id
+        report.append(entry)
+    report.sort(key=lambda entry: entry['row'])
+    return report
+
+
+def _invoice_mapping(user_id, values, filename, now):
+    return dict(
+        invoice_number=values['invoice_number'],
+        po_number=values['po_number'],
+        invoice_amount=values['invoice_amount'],
+        description=values['description'],
+        file_path=filename,
+        user_id=user_id,
+        submission_date=now,
+    )
+
+
+def _insert_invoices(user_id, pending, now, report, attempts=3):
+    """
+    Inserts the `pending` (row number, values, stored filename) invoices in a
+    savepoint. Another request can commit one of the same invoice numbers
+    after plan_import() checked them; the unique constraint then fails the
+    insert, so those rows are reported as duplicates, their files released,
+    and the rest inserted again. Returns the entries that were inserted.
+    """
+    for attempt in range(attempts):
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Invoice), [_invoice_mapping(user_id, values, filename, now)
+                                                     for _, values, filename in pending])
+            return pending
+        except IntegrityError:
+            taken = _existing_numbers(user_id, {values['invoice_number'] for _, values, _ in pending})
+            if not taken or attempt == attempts - 1:
+                raise
+            for row_number, values, filename in pending:
+                if values['invoice_number'] in taken:
+                    report.append(_already_uploaded(row_number, values))
+                    release_file(filename, 'invoices')
+            pending = [entry for entry in pending if entry[1]['invoice_number'] not in taken]
+            if not pending:
+                return pending
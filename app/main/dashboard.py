@@ -0,0 +1,115 @@
+from app.models import db, Invoice, VendorMaterial, VendorWork, VendorInvoiceStats
+from app.stats import STAT_COLUMNS, aggregate_columns
+from sqlalchemy import select, literal, union_all
+from functools import lru_cache
+
+
+LOCAL_TIMEZONE = 'Asia/Kolkata'
+
+
+@lru_cache(maxsize=None)
+def _timezones():
+    # pytz loads its zone database on import; defer that to the first
+    # dashboard render instead of paying for it at worker startup.
+    import pytz
+    return pytz.utc, pytz.timezone(LOCAL_TIMEZONE)
+
+
+def _to_local(utc_timestamp):
+    """Tags a naive UTC timestamp as UTC and converts it to local time."""
+    if not utc_timestamp:
+        return utc_timestamp
+    utc, local_tz = _timezones()
+    return utc_timestamp.replace(tzinfo=utc).astimezone(local_tz)
+
+
+def _build_activity(row):
+    activity_type = 'upload'
+    if row.status == 'Approved': activity_type = 'approved'
+    elif row.status == 'Paid': activity_type = 'paid'
+    elif row.status == 'Rejected': activity_type = 'rejected'
+
+    utc_timestamp = row.payment_date if row.status == 'Paid' and row.payment_date else row.submission_date
+
+    return {
+        'type': activity_type,
+        'invoice_id': row.id,
+        'invoice_number': row.invoice_number,
+        'timestamp': _to_local(utc_timestamp)
+    }
+
+
+def get_dashboard_summary(user_id, recent_limit=2):
+    """
+    Collects everything the dashboard shows for a vendor in two SQL statements.
+
+    The first statement reads the status counts and paid total from
+    vendor_invoice_stats, with the vendor form statuses as scalar subqueries.
+    The second one fetches recent payments and recent uploads with a UNION ALL.
+    """
+    material_status = select(VendorMaterial.status)\
+        .where(VendorMaterial.user_id == user_id).limit(1).scalar_subquery()
+    work_status = select(VendorWork.status)\
+        .where(VendorWork.user_id == user_id).limit(1).scalar_subquery()
+
+    # O(1) read from the summary table maintained by app/stats.py
+    stats = db.session.execute(
+        select(
+            *[VendorInvoiceStats.__table__.c[column] for column in STAT_COLUMNS],
+            material_status.label('material_status'),
+            work_status.label('work_status'),
+        ).where(VendorInvoiceStats.user_id == user_id)
+    ).first()
+
+    if stats is None:
+        # No summary row yet (no invoices, or stats not rebuilt since the
+        # table was added), so aggregate the invoices directly.
+        stats = db.session.execute(
+            select(
+                *aggregate_columns(),
+                material_status.label('material_status'),
+                work_status.label('work_status'),
+            ).where(Invoice.user_id == user_id)
+        ).one()
+
+    columns = (Invoice.id, Invoice.invoice_number, Invoice.invoice_amount,
+               Invoice.status, Invoice.submission_date, Invoice.payment_date)
+
+    # NULLS LAST matches ix_invoices_user_status_payment on PostgreSQL,
+    # even though the filter leaves no NULLs to place.
+    payments = select(literal('payment').label('kind'), *columns)\
+        .where(Invoice.user_id == user_id, Invoice.status == 'Paid', Invoice.payment_date != None)\
+        .order_by(Invoice.payment_date.desc().nullslast())\
+        .limit(recent_limit).subquery()
+
+    uploads = select(literal('upload').label('kind'), *columns)\
+        .where(Invoice.user_id == user_id)\
+        .order_by(Invoice.submission_date.desc())\
+        .limit(recent_limit).subquery()
+
+    recent_rows = db.session.execute(
+        union_all(select(payments), select(uploads))
+    ).all()
+
+    # UNION ALL does not keep the per-branch ORDER BY, so re-sort here.
+    recent_payments = sorted((row for row in recent_rows if row.kind == 'payment'),
+                             key=lambda row: row.payment_date, reverse=True)
+    recent_activities = [_build_activity(row) for row in recent_rows if row.kind == 'upload']
+
+    profile_status = 'Incomplete'
+    if stats.material_status: profile_status = stats.material_status
+    elif stats.work_status: profile_status = stats.work_status
+
+    return {
+        'total_invoices_count': stats.invoice_count,
+        'in_review_invoices_count': stats.in_review_count,
+        'approved_invoices_count': stats.approved_count,
+        'paid_invoices_count': stats.paid_count,
+        'rejected_invoices_count': stats.rejected_count,
+        'total_business_value': float(stats.paid_total or 0.0),
+        'recent_payments': recent_payments,
+        'recent_activities': sorted(recent_activities, key=lambda x: x['timestamp'], reverse=True)[:5],
+        'profile_status': profile_status,
+        'material_form_filled': stats.material_status is not None,
+        'work_form_filled': stats.work_status is not None,
+    }
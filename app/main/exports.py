@@ -0,0 +1,114 @@
+from flask import current_app
+from app.models import db, Invoice
+from app.search import parse_search, search_statement
+from sqlalchemy import select
+import csv
+import io
+import tempfile
+
+
+# --- Invoice exports ---
+# Exports read the vendor's invoices through a server-side cursor
+# (yield_per), so rows are fetched from the database in batches as the
+# response is written instead of being loaded all at once, and memory use
+# stays flat whatever the number of rows. CSV is produced while streaming;
+# XLSX is written with openpyxl's write-only workbook to a temp file (a zip
+# archive has to be finished before it can be sent) and then streamed.
+
+EXPORT_COLUMNS = (
+    ('Invoice Number', Invoice.invoice_number),
+    ('PO Number', Invoice.po_number),
+    ('Amount (INR)', Invoice.invoice_amount),
+    ('Description', Invoice.description),
+    ('Status', Invoice.status),
+    ('Submitted', Invoice.submission_date),
+    ('Payment Date', Invoice.payment_date),
+)
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+XLSX_MAX_ROWS = 1048576  # per worksheet, including the header row
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def export_statement(user_id, q, paid_only=False):
+    """
+    The rows to export for a vendor, filtered by the same search box syntax
+    as all_invoices (free text and amount filters). Paid-only exports are
+    ordered like payment_history, everything else like all_invoices.
+    """
+    search = parse_search(q)
+    stmt = select(*(column for _, column in EXPORT_COLUMNS)).where(Invoice.user_id == user_id, *search.amount_filters)
+    if paid_only:
+        stmt = stmt.where(Invoice.status == 'Paid')
+    if search.terms:
+        stmt = stmt.where(Invoice.id.in_(search_statement(user_id, search).order_by(None)))
+    if paid_only:
+        return stmt.order_by(Invoice.payment_date.desc().nullslast(), Invoice.id.desc())
+    return stmt.order_by(Invoice.submission_date.desc(), Invoice.id.desc())
+
+
+def iter_export_rows(stmt):
+    """Yields result rows batch by batch from a server-side cursor."""
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 2000)
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+def _safe_text(value):
+    """Stops spreadsheet apps from running vendor-entered text as a formula."""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(rows):
+    """Yields the CSV export as text chunks of a few hundred rows each."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel opens the file as UTF-8
+    buffer.write('\ufeff')
+    writer.writerow([title for title, _ in EXPORT_COLUMNS])
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([
+            value.isoformat(sep=' ', timespec='seconds') if hasattr(value, 'isoformat') else _safe_text(value)
+            for value in row
+        ])
+        if count % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def xlsx_chunks(rows, sheet_title='Invoices', chunk_size=64 * 1024):
+    """
+    Yields the XLSX export in chunks. openpyxl's write-only mode streams
+    rows to disk, so memory stays flat; a new worksheet is started when
+    one is full.
+    """
+    from openpyxl import Workbook  # Deferred: only exports need openpyxl
+
+    header = [title for title, _ in EXPORT_COLUMNS]
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows, sheet_number = None, XLSX_MAX_ROWS, 0
+    for row in rows:
+        if sheet_rows >= XLSX_MAX_ROWS:
+            sheet_number += 1
+            sheet = workbook.create_sheet(sheet_title if sheet_number == 1 else f"{sheet_title} ({sheet_number})")
+            sheet.append(header)
+            sheet_rows = 1
+        sheet.append([_safe_text(value) for value in row])
+        sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet(sheet_title).append(header)
+
+    with tempfile.TemporaryFile(dir=current_app.config.get('EXPORT_TEMP_DIR')) as f:
+        workbook.save(f)
+        f.seek(0)
+        yield from iter(lambda: f.read(chunk_size), b'')
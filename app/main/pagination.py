@@ -0,0 +1,203 @@
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import and_, or_
+from datetime import datetime
+import time
+
+
+_COUNT_CACHE = {}
+_COUNT_CACHE_MAX_ENTRIES = 1024
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='keyset-cursor')
+
+
+def encode_cursor(direction, value, row_id):
+    """Builds the opaque, signed token used in ?cursor= links."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return _serializer().dumps([direction, value, row_id])
+
+
+def decode_cursor(token):
+    """
+    Returns (direction, value, id) for a cursor token, or None if it is
+    missing or has been tampered with (callers fall back to the first page).
+    """
+    if not token:
+        return None
+    try:
+        direction, value, row_id = _serializer().loads(token)
+    except (BadSignature, ValueError, TypeError):
+        return None
+    if direction not in ('next', 'prev') or not isinstance(row_id, int):
+        return None
+    if value is not None:
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return None
+    return direction, value, row_id
+
+
+def cached_count(key, count_fn, ttl=None):
+    """
+    Runs count_fn() at most once per `ttl` seconds for a given key so the
+    "N results" label doesn't cost a COUNT(*) on every page click.
+    """
+    ttl = ttl if ttl is not None else current_app.config.get('PAGINATION_COUNT_TTL', 60)
+    now = time.monotonic()
+    cached = _COUNT_CACHE.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    value = count_fn()
+    if len(_COUNT_CACHE) >= _COUNT_CACHE_MAX_ENTRIES:
+        _COUNT_CACHE.clear()
+    _COUNT_CACHE[key] = (now + ttl, value)
+    return value
+
+
+def _after(column, id_column, value, row_id, nullable):
+    """Rows that come after (value, id) in `column DESC NULLS LAST, id DESC` order."""
+    if value is None:
+        return and_(column.is_(None), id_column < row_id)
+    condition = or_(column < value, and_(column == value, id_column < row_id))
+    if nullable:
+        condition = or_(condition, column.is_(None))
+    return condition
+
+
+def _before(column, id_column, value, row_id, nullable):
+    """Rows that come before (value, id) in `column DESC NULLS LAST, id DESC` order."""
+    if value is None:
+        return or_(column.isnot(None), and_(column.is_(None), id_column > row_id))
+    return or_(column > value, and_(column == value, id_column > row_id))
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated query. Exposes the same basics as
+    Flask-SQLAlchemy's Pagination (items, per_page, has_next, has_prev,
+    total) plus the next/prev cursor tokens.
+    """
+
+    def __init__(self, items, per_page, has_next, has_prev, key, count_fn=None):
+        self.items = items
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self._key = key
+        self._count_fn = count_fn
+        self._total = None
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.items:
+            return None
+        last = self.items[-1]
+        return encode_cursor('next', self._key(last), last.id)
+
+    @property
+    def prev_cursor(self):
+        if not self.has_prev or not self.items:
+            return None
+        first = self.items[0]
+        return encode_cursor('prev', self._key(first), first.id)
+
+    @property
+    def total(self):
+        """Total row count, only computed if the template asks for it."""
+        if self._total is None and self._count_fn is not None:
+            self._total = self._count_fn()
+        return self._total
+
+
+def keyset_paginate(query, column, id_column, cursor, per_page, nullable=False, count_fn=None):
+    """
+    Paginates `query` on (column DESC, id DESC) without OFFSET.
+
+    Each page is a single indexed range scan that starts right after the
+    cursor row, so page 1000 costs the same as page 1. `nullable` keeps
+    rows with a NULL `column` at the end, matching NULLS LAST.
+    """
+    decoded = decode_cursor(cursor)
+    direction = decoded[0] if decoded else 'next'
+
+    if decoded and direction == 'next':
+        query = query.filter(_after(column, id_column, decoded[1], decoded[2], nullable))
+    elif decoded:
+        query = query.filter(_before(column, id_column, decoded[1], decoded[2], nullable))
+
+    if direction == 'next':
+        order = (column.desc().nullslast() if nullable else column.desc(), id_column.desc())
+    else:
+        order = (column.asc().nullsfirst() if nullable else column.asc(), id_column.asc())
+
+    rows = query.order_by(*order).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if direction == 'next':
+        has_next, has_prev = has_more, decoded is not None
+    else:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+
+    key_name = column.key
+    return KeysetPage(rows, per_page, has_next, has_prev,
+                      key=lambda row: getattr(row, key_name), count_fn=count_fn)
+
+
+class RankedPage:
+    """
+    One page of ranked results, such as search hits, whose order is computed
+    rather than stored, so it can't be resumed from a key. `fetch_ids(offset,
+    limit)` returns ids best first; each page fetches only its own ids, and
+    its cursors carry the offset. Offers the same interface as KeysetPage.
+    """
+
+    def __init__(self, fetch_ids, load, offset, per_page, count_fn=None):
+        self.per_page = per_page
+        self.offset = offset
+        ids = fetch_ids(offset, per_page + 1)
+        page_ids = ids[:per_page]
+        by_id = {row.id: row for row in load(page_ids)} if page_ids else {}
+        self.items = [by_id[row_id] for row_id in page_ids if row_id in by_id]
+        self.has_next = len(ids) > per_page
+        self.has_prev = offset > 0
+        self._count_fn = count_fn
+        self._total = None
+
+    @property
+    def next_cursor(self):
+        return encode_offset(self.offset + self.per_page) if self.has_next else None
+
+    @property
+    def prev_cursor(self):
+        return encode_offset(max(self.offset - self.per_page, 0)) if self.has_prev else None
+
+    @property
+    def total(self):
+        """Total match count, only computed if the template asks for it."""
+        if self._total is None and self._count_fn is not None:
+            self._total = self._count_fn()
+        return self._total
+
+
+def encode_offset(offset):
+    return _serializer().dumps(['at', offset])
+
+
+def decode_offset(token):
+    """Returns the offset in a RankedPage cursor, or 0 if it is missing or invalid."""
+    if not token:
+        return 0
+    try:
+        tag, offset = _serializer().loads(token)
+    except (BadSignature, ValueError, TypeError):
+        return 0
+    if tag != 'at' or not isinstance(offset, int) or offset < 0:
+        return 0
+    return offset
@@ -1,20 +1,35 @@
 from flask import (
     Blueprint, render_template, session, redirect, url_for,
-    request, flash, current_app, send_from_directory, g
+    request, flash, current_app, g, jsonify, stream_with_context, Response
 )
-from app.models import db, Invoice, User, VendorMaterial, VendorWork, SupportTicket, TicketStatus
-import os
-from sqlalchemy import or_, func
+from app.models import db, Invoice, VendorMaterial, VendorWork, VendorInvoiceStats, SupportTicket, TicketStatus, Job, Notification
 from functools import wraps
 import traceback
 import json
-import uuid
 from .forms import InvoiceForm, VendorMaterialForm, VendorWorkForm, SupportTicketForm
+from .dashboard import get_dashboard_summary
+from .pagination import keyset_paginate, cached_count, RankedPage, decode_offset
+from app.search import parse_search, ranked_invoice_ids, count_matches
+from .vendor_status import load_vendor, get_vendor_status
+from .uploads import UploadRejected, spool_upload, parse_streaming_upload, validate_streamed_file
+from .blobstore import blob_temp_dir, store_upload, store_uploads
+from .serving import serve_stored_file
+from .exports import EXPORT_FORMATS, export_statement, iter_export_rows, csv_chunks, xlsx_chunks
+from .bulk_import import ManifestError, BulkInsertFailed, ArchiveSource, MultipartSource, read_manifest, import_invoices
+from app.documents import owns_vendor_document
+from app.page_cache import cached_page
+from app.notifications import INVOICE_ENDPOINTS, unread_counter, unread_count
+from app.events import event_hub, format_event, TooManySubscribers
+from concurrent.futures import ThreadPoolExecutor
+from .tasks import enqueue_document_checks
+from flask_wtf.csrf import validate_csrf
+from wtforms.validators import ValidationError
+from werkzeug.datastructures import CombinedMultiDict
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
+from sqlalchemy import update
 from datetime import datetime
 import secrets
-import magic
-import pytz
 from datetime import datetime
 
 
@@ -28,51 +43,81 @@ def save_file(file, subfolder):
     if not file or not file.filename:
         return None
 
-    filename = secure_filename(file.filename)
-
-    # --- File Extension Validation ---
-    allowed_extensions = current_app.config.get('ALLOWED_EXTENSIONS', {'pdf', 'png', 'jpg', 'jpeg', 'docx'})
-    if '.' not in filename or filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
-        flash(f"Invalid file type for {filename}. Allowed types: {', '.join(allowed_extensions)}", 'error')
+    try:
+        writer = spool_upload(file, blob_temp_dir())
+    except UploadRejected as e:
+        flash(str(e), 'error')
+        return None
+    except Exception as e:
+        current_app.logger.error(f"Failed to read upload {file.filename} for {subfolder}: {e}")
+        flash(f"An error occurred while saving the file: {secure_filename(file.filename)}", 'error')
         return None
-    
-    allowed_mime_types = current_app.config.get('ALLOWED_MIME_TYPES')
 
-    # Read the first 2KB to check the "magic bytes"
-    file_head = file.stream.read(2048)
-    file.stream.seek(0)
     try:
-        mime_type = magic.from_buffer(file_head, mime=True)
+        return store_upload(writer, subfolder)
     except Exception as e:
-        current_app.logger.warning(f"Could not determine MIME type for {filename}: {e}")
-        mime_type = None
-
-    if mime_type not in allowed_mime_types:
-        flash(f"Invalid file content for {filename}. File appears to be a '{mime_type}' but only {', '.join(allowed_mime_types)} are allowed.", 'error')
+        db.session.rollback()
+        writer.discard()
+        current_app.logger.error(f"Failed to store file {writer.filename} for {subfolder}: {e}")
+        flash(f"An error occurred while saving the file: {writer.filename}", 'error')
         return None
 
-    # --- File Size Validation ---
-    max_size = current_app.config.get('MAX_FILE_SIZE_MB', 5) * 1024 * 1024
-    file.seek(0, os.SEEK_END)
-    file_length = file.tell()
-    file.seek(0, os.SEEK_SET)
-    if file_length > max_size:
-         flash(f"File '{filename}' exceeds the maximum size limit of {max_size / (1024*1024)}MB.", 'error')
-         return None
 
-    # --- Unique Filename and Saving ---
-    unique_filename = f"{uuid.uuid4().hex}_{filename}"
-    target_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], subfolder)
-    os.makedirs(target_dir, exist_ok=True)
-    file_path = os.path.join(target_dir, unique_filename)
+def save_files(mapping, subfolder):
+    """
+    Batch version of save_file for forms with several attachments.
+
+    Every file in `mapping` ({field name: FileStorage or None}) is validated
+    and written to a temp file concurrently on a bounded thread pool, then
+    all of them are stored in the session's transaction, which the caller
+    commits together with the form row. If any file fails, none are kept:
+    the rollback drops their references and queues the deletion of any
+    content written for them. Returns (saved, errors): {field name: stored filename or
+    None} and {field name: error message}.
+    """
+    app = current_app._get_current_object()
+    temp_dir = blob_temp_dir()
+    present = {name: file for name, file in mapping.items() if file and file.filename}
+
+    def spool(file):
+        with app.app_context():
+            return spool_upload(file, temp_dir)
+
+    writers, errors = {}, {}
+    if present:
+        max_workers = min(len(present), current_app.config.get('UPLOAD_WORKERS', 4))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload') as pool:
+            futures = {name: pool.submit(spool, file) for name, file in present.items()}
+        for name, future in futures.items():
+            try:
+                writers[name] = future.result()
+            except UploadRejected as e:
+                errors[name] = str(e)
+            except Exception as e:
+                current_app.logger.error(f"Failed to read upload {present[name].filename} for {subfolder}: {e}")
+                errors[name] = f"An error occurred while saving the file: {secure_filename(present[name].filename)}"
+
+    if not errors and writers:
+        try:
+            stored = store_uploads(list(writers.values()), subfolder)
+        except Exception as e:
+            db.session.rollback()  # also queues deletion of content already written for this batch
+            current_app.logger.error(f"Failed to store {len(writers)} files for {subfolder}: {e}\n{traceback.format_exc()}")
+            errors = {name: f"An error occurred while saving the file: {writer.filename}" for name, writer in writers.items()}
+        else:
+            saved = {name: None for name in mapping}
+            saved.update(zip(writers.keys(), stored))
+            return saved, {}
+
+    for writer in writers.values():
+        writer.discard()
+    return {name: None for name in mapping}, errors
 
-    try:
-        file.save(file_path)
-        return unique_filename
-    except Exception as e:
-        current_app.logger.error(f"Failed to save file {unique_filename} to {target_dir}: {e}")
-        flash(f"An error occurred while saving the file: {filename}", 'error')
-        return None
+
+def _flash_file_errors(form, errors):
+    """Reports every failed attachment in a single flash message."""
+    details = '; '.join(f"{form[name].label.text}: {message}" for name, message in errors.items())
+    flash(f'Some files could not be saved. {details}', 'error')
 
 
 def login_required(f):
@@ -98,13 +143,14 @@ def user_required(f):
              flash('Session error. Please log in again.', 'error')
              return redirect(url_for('auth.login'))
 
-        user = db.session.get(User, session['user_id'])
+        # One joined query for the user and their vendor forms; also caches
+        # the registration status on g for the routes and templates.
+        user = load_vendor(session['user_id'])
         if not user:
             flash("Your user account was not found. Please log in again.", "error")
             session.clear()
             return redirect(url_for('auth.logout'))
 
-        g.user = user 
         return f(*args, **kwargs)
     return decorated_function
 
@@ -124,10 +170,8 @@ def user_or_admin_required(f):
 def inject_form_status():
     """Injects vendor form submission status into templates."""
     if 'user_id' in session:
-        user_id = session['user_id']
-        material_form_filled = VendorMaterial.query.filter_by(user_id=user_id).first() is not None
-        work_form_filled = VendorWork.query.filter_by(user_id=user_id).first() is not None
-        return dict(material_form_filled=material_form_filled, work_form_filled=work_form_filled)
+        status = get_vendor_status(session['user_id'])
+        return dict(material_form_filled=status.material_form_filled, work_form_filled=status.work_form_filled)
     return dict(material_form_filled=False, work_form_filled=False)
 
 
@@ -137,74 +181,10 @@ def inject_form_status():
 @login_required
 @user_required
 def dashboard():
-    user = g.user
-    user_id = user.id
-
-    status_counts_results = db.session.query(
-            Invoice.status,
-            func.count(Invoice.status)
-        ).filter_by(user_id=user_id).group_by(Invoice.status).all()
-
-    counts = dict(status_counts_results)
-
-    total_invoices_count = sum(counts.values())
-    in_review_invoices_count = counts.get('In Review', 0)
-    approved_invoices_count = counts.get('Approved', 0)
-    paid_invoices_count = counts.get('Paid', 0)
-    rejected_invoices_count = counts.get('Rejected', 0)
-
-    total_business_value = db.session.query(func.sum(Invoice.invoice_amount))\
-        .filter(Invoice.user_id == user_id, Invoice.status == 'Paid')\
-        .scalar() or 0.0
-
-    recent_payments = Invoice.query.filter(Invoice.user_id == user_id, Invoice.status == 'Paid', Invoice.payment_date != None)\
-        .order_by(Invoice.payment_date.desc())\
-        .limit(2).all()
-
-    recent_invoices = Invoice.query.filter_by(user_id=user_id).order_by(Invoice.submission_date.desc()).limit(2).all()
-
-    local_tz = pytz.timezone('Asia/Kolkata')
-
-    recent_activities = []
-    for inv in recent_invoices:
-        activity_type = 'upload'
-        if inv.status == 'Approved': activity_type = 'approved'
-        elif inv.status == 'Paid': activity_type = 'paid'
-        elif inv.status == 'Rejected': activity_type = 'rejected'
-
-        utc_timestamp = inv.payment_date if inv.status == 'Paid' and inv.payment_date else inv.submission_date
-
-        # Convert it to Localtime
-        local_timestamp = utc_timestamp
-        if utc_timestamp:
-            # Telling Python the time is UTC, then convert to your local timezone
-            local_timestamp = utc_timestamp.replace(tzinfo=pytz.utc).astimezone(local_tz)
-
-        recent_activities.append({
-            'type': activity_type,
-            'invoice_id': inv.id,
-            'invoice_number': inv.invoice_number,
-            'timestamp': local_timestamp
-        })
-
-    material_form = VendorMaterial.query.filter_by(user_id=user_id).first()
-    work_form = VendorWork.query.filter_by(user_id=user_id).first()
-    profile_status = 'Incomplete'
-    if material_form: profile_status = material_form.status
-    elif work_form: profile_status = work_form.status
-
-    return render_template('dashboard.html',
-                           user=user,
-                           total_invoices_count=total_invoices_count,
-                           in_review_invoices_count=in_review_invoices_count,
-                           approved_invoices_count=approved_invoices_count,
-                           paid_invoices_count=paid_invoices_count,
-                           rejected_invoices_count=rejected_invoices_count,
-                           total_business_value=total_business_value,
-                           recent_payments=recent_payments,
-                           recent_activities=sorted(recent_activities, key=lambda x: x['timestamp'], reverse=True)[:5],
-                           profile_status=profile_status
-                           )
+    def render():
+        summary = get_dashboard_summary(g.user.id)
+        return render_template('dashboard.html', user=g.user, **summary)
+    return cached_page('dashboard', g.user.id, render)
 
 
 ##
@@ -213,18 +193,12 @@ def dashboard():
 @user_required
 def your_profile():
     user = g.user
-    material_form = VendorMaterial.query.filter_by(user_id=user.id).first()
-    work_form = VendorWork.query.filter_by(user_id=user.id).first()
-
-    profile_status = 'Incomplete'
-    if material_form: profile_status = material_form.status
-    elif work_form: profile_status = work_form.status
-
-    return render_template('your-profile.html',
-                           user=user,
-                           material_form=material_form,
-                           work_form=work_form,
-                           profile_status=profile_status)
+    return cached_page('profile', user.id, lambda: render_template(
+        'your-profile.html',
+        user=user,
+        material_form=user.vendor_material_form,
+        work_form=user.vendor_work_form,
+        profile_status=g.vendor_status.profile_status))
 
 
 ##
@@ -235,8 +209,7 @@ def upload_invoices():
     form = InvoiceForm()
     user = g.user
 
-    is_registered = VendorMaterial.query.filter_by(user_id=user.id).first() or \
-                    VendorWork.query.filter_by(user_id=user.id).first()
+    is_registered = g.vendor_status.material_form_filled or g.vendor_status.work_form_filled
     
     if not is_registered:
         flash('Please complete your vendor registration form before uploading invoices.', 'warning')
@@ -270,85 +243,257 @@ def upload_invoices():
                             submission_date=datetime.utcnow()
                         )
                         db.session.add(new_invoice)
+                        job_ids = enqueue_document_checks([saved_filename], 'invoices', user.id)
                         db.session.commit()
                         flash(f'Invoice "{invoice_num_from_form}" uploaded successfully!', 'success')
-                        return redirect(url_for('main.upload_invoices'))
+                        # ?jobs= lets the page poll the content check (see base.html)
+                        return redirect(url_for('main.upload_invoices', jobs=job_ids))
                     
                     except Exception as e:
                         db.session.rollback()
                         current_app.logger.error(f"Error saving invoice for user {user.id}: {e}\n{traceback.format_exc()}")
                         flash('An error occurred while saving the invoice. Please try again.', 'error')
-
-                        # Attempting to delete the orphaned file if DB save fails
-                        file_to_delete = os.path.join(current_app.config['UPLOAD_FOLDER'], 'invoices', saved_filename)
-                        if os.path.exists(file_to_delete):
-                            try:
-                                os.remove(file_to_delete)
-                            except OSError as os_err:
-                                current_app.logger.error(f"Error deleting invoice file {file_to_delete} after DB error: {os_err}")
+                        # The rollback also queued deletion of the stored file (see blobstore.py).
 
     # Fetching recent invoices for history
     recent_invoices = Invoice.query.filter_by(user_id=user.id).order_by(Invoice.submission_date.desc()).limit(5).all()
     return render_template('upload-invoices.html', form=form, invoices=recent_invoices, is_registered=is_registered)
 
 
+##
+@main_bp.route('/upload-invoices/stream', methods=['POST'])
+@login_required
+@user_required
+def upload_invoices_stream():
+    """
+    Streaming variant of upload_invoices used by the upload page's XHR uploader.
+    The invoice file is hashed, sniffed and written to disk chunk by chunk as it
+    arrives, so memory use doesn't grow with the file size. Returns JSON.
+    """
+    user = g.user
+
+    if not (g.vendor_status.material_form_filled or g.vendor_status.work_form_filled):
+        return jsonify(ok=False, message='Please complete your vendor registration form before uploading invoices.'), 403
+
+    # CSRFProtect is skipped for this view (see create_app) because reading
+    # request.form would make Werkzeug buffer the whole body; check the header instead.
+    try:
+        validate_csrf(request.headers.get('X-CSRFToken'))
+    except ValidationError:
+        return jsonify(ok=False, message='Your session has expired. Please reload the page and try again.'), 400
+
+    try:
+        form_data, files, writers = parse_streaming_upload(request.environ)
+    except RequestEntityTooLarge:
+        max_size_mb = current_app.config.get('MAX_FILE_SIZE_MB', 5)
+        return jsonify(ok=False, message=f"File exceeds the maximum size limit of {max_size_mb}MB."), 413
+    except ValueError:
+        return jsonify(ok=False, message='The upload could not be read. Please try again.'), 400
+
+    try:
+        form = InvoiceForm(formdata=CombinedMultiDict([files, form_data]), meta={'csrf': False})
+        if not form.validate():
+            errors = [error for field_errors in form.errors.values() for error in field_errors]
+            return jsonify(ok=False, message=' '.join(errors)), 400
+
+        writer = form.invoice_file.data.stream
+        error = validate_streamed_file(writer)
+        if error:
+            return jsonify(ok=False, message=error), 400
+
+        invoice_num_from_form = form.invoice_number.data
+        if Invoice.query.filter_by(invoice_number=invoice_num_from_form, user_id=user.id).first():
+            return jsonify(ok=False, message=f'Error: You have already uploaded an invoice with the number "{invoice_num_from_form}".'), 409
+
+        saved_filename = store_upload(writer, 'invoices')
+        try:
+            new_invoice = Invoice(
+                invoice_number=form.invoice_number.data,
+                po_number=form.po_number.data,
+                invoice_amount=float(form.invoice_amount.data),
+                description=form.description.data,
+                file_path=saved_filename,
+                user_id=user.id,
+                submission_date=datetime.utcnow()
+            )
+            db.session.add(new_invoice)
+            job_ids = enqueue_document_checks([saved_filename], 'invoices', user.id)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error saving streamed invoice for user {user.id}: {e}\n{traceback.format_exc()}")
+            return jsonify(ok=False, message='An error occurred while saving the invoice. Please try again.'), 500
+
+        flash(f'Invoice "{invoice_num_from_form}" uploaded successfully!', 'success')
+        return jsonify(ok=True, jobs=job_ids, redirect=url_for('main.upload_invoices', jobs=job_ids))
+    finally:
+        # No-op for the stored file; removes anything left half-written.
+        for writer in writers:
+            writer.discard()
+
+
+##
+@main_bp.route('/upload-invoices/bulk', methods=['POST'])
+@login_required
+@user_required
+def upload_invoices_bulk():
+    """
+    Imports many invoices in one request: either an `archive` ZIP holding a
+    manifest.csv/manifest.json and the invoice files, or a `manifest` part
+    plus one `files` part per invoice. The body is streamed to disk like
+    upload_invoices_stream. Returns JSON with a per-row report.
+    """
+    user = g.user
+
+    if not (g.vendor_status.material_form_filled or g.vendor_status.work_form_filled):
+        return jsonify(ok=False, message='Please complete your vendor registration form before uploading invoices.'), 403
+
+    # Exempt from CSRFProtect for the same reason as upload_invoices_stream.
+    try:
+        validate_csrf(request.headers.get('X-CSRFToken'))
+    except ValidationError:
+        return jsonify(ok=False, message='Your session has expired. Please reload the page and try again.'), 400
+
+    max_content_length = current_app.config.get('BULK_IMPORT_MAX_CONTENT_LENGTH', 200 * 1024 * 1024)
+    try:
+        _, files, writers = parse_streaming_upload(request.environ, max_content_length=max_content_length,
+                                                   max_file_size=max_content_length)
+    except RequestEntityTooLarge:
+        return jsonify(ok=False, message=f"The upload exceeds the maximum size of {max_content_length // (1024 * 1024)}MB."), 413
+    except ValueError:
+        return jsonify(ok=False, message='The upload could not be read. Please try again.'), 400
+
+    source = None
+    try:
+        archive, manifest = files.get('archive'), files.get('manifest')
+        if archive:
+            archive.stream.finish()
+            source = ArchiveSource(archive.stream.temp_path)
+            rows = source.read_manifest()
+        elif manifest:
+            manifest.stream.finish()
+            with open(manifest.stream.temp_path, 'rb') as f:
+                rows = read_manifest(f, manifest.filename or '', manifest.stream.size)
+            source = MultipartSource([file.stream for file in files.getlist('files')])
+        else:
+            return jsonify(ok=False, message='Upload a ZIP archive, or a manifest together with the invoice files.'), 400
+
+        report = import_invoices(user.id, rows, source)
+    except ManifestError as e:
+        return jsonify(ok=False, message=str(e)), 400
+    except BulkInsertFailed as e:
+        current_app.logger.error(f"Error saving bulk invoice import for user {user.id}: {e.__cause__}\n{traceback.format_exc()}")
+        return jsonify(ok=False, message='An error occurred while saving the invoices. Please try again.'), 500
+    finally:
+        if source is not None:
+            source.close()
+        for writer in writers:
+            writer.discard()
+
+    created = sum(1 for entry in report if entry['status'] == 'created')
+    return jsonify(ok=created == len(report), created=created, failed=len(report) - created, results=report)
+
+
 ##
 @main_bp.route('/all-invoices')
 @login_required
 @user_required
 def all_invoices():
-    page = request.args.get('page', 1, type=int)
     query = request.args.get('q', '').strip()
+    per_page = current_app.config.get('ITEMS_PER_PAGE', 10)
+    search = parse_search(query)
     invoices_query = Invoice.query.filter_by(user_id=g.user.id)
 
-    if query:
-        safe_query = query.replace('%', '\\%').replace('_', '\\_')
-        search_term = f"%{safe_query}%"
-        invoices_query = invoices_query.filter(
-            or_(
-                Invoice.invoice_number.ilike(search_term, escape='\\'),
-                Invoice.po_number.ilike(search_term, escape='\\')
-            )
+    if search.terms:
+        invoices_page = RankedPage(
+            lambda offset, limit: ranked_invoice_ids(g.user.id, search, offset, limit),
+            load=lambda ids: Invoice.query.filter(Invoice.id.in_(ids)).all(),
+            offset=decode_offset(request.args.get('cursor')),
+            per_page=per_page,
+            count_fn=lambda: cached_count(('all_invoices', g.user.id, query), lambda: count_matches(g.user.id, search))
         )
+        return render_template('all_invoices.html', invoices=invoices_page, q=query)
 
-    invoices_pagination = invoices_query.order_by(Invoice.submission_date.desc()).paginate(
-        page=page,
-        per_page=current_app.config.get('ITEMS_PER_PAGE', 10),
-        error_out=False
+    if search.amount_filters:
+        invoices_query = invoices_query.filter(*search.amount_filters)
+        count_fn = lambda: cached_count(('all_invoices', g.user.id, query), invoices_query.count)
+    else:
+        count_fn = lambda: _count_from_stats(g.user.id, 'invoice_count', invoices_query)
+
+    invoices_page = keyset_paginate(
+        invoices_query,
+        Invoice.submission_date, Invoice.id,
+        cursor=request.args.get('cursor'),
+        per_page=per_page,
+        count_fn=count_fn
     )
-    return render_template('all_invoices.html', invoices=invoices_pagination, q=query)
+    return render_template('all_invoices.html', invoices=invoices_page, q=query)
 
 
-def _clean_up_files(filenames, subfolder):
-    """Helper to delete files on DB error."""
-    for filename in filenames:
-        if filename:
-            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], subfolder, filename)
-            if os.path.exists(filepath):
-                try:
-                    os.remove(filepath)
-                except OSError as os_err:
-                    current_app.logger.error(f"Error deleting vendor doc {filepath} after DB error: {os_err}")
+def _export_response(user_id, name, paid_only=False):
+    """
+    Streams the vendor's invoices matching ?q= as ?format=csv (default) or
+    xlsx. Rows are read from a server-side cursor while the response is sent.
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify(ok=False, message=f"Unsupported export format '{export_format}'. Use csv or xlsx."), 400
+
+    rows = iter_export_rows(export_statement(user_id, request.args.get('q', '').strip(), paid_only=paid_only))
+    chunks = csv_chunks(rows) if export_format == 'csv' else xlsx_chunks(rows)
+    response = current_app.response_class(stream_with_context(chunks), mimetype=EXPORT_FORMATS[export_format])
+    response.headers.set('Content-Disposition', 'attachment',
+                         filename=f"{name}-{datetime.utcnow():%Y%m%d}.{export_format}")
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
+
+
+@main_bp.route('/all-invoices/export')
+@login_required
+@user_required
+def export_invoices():
+    return _export_response(g.user.id, 'invoices')
+
+
+def _count_from_stats(user_id, column, fallback_query):
+    """Reads a row count from vendor_invoice_stats instead of running COUNT(*)."""
+    stats = db.session.get(VendorInvoiceStats, user_id)
+    if stats is not None:
+        return getattr(stats, column)
+    return fallback_query.count()
 
 
 ##
 def _save_material_form(form, user_id):
     """
     [HELPER] Processes file saving and DB creation for Material Vendor.
-    Returns True on success, False on failure.
+    Returns the ids of the queued document checks on success, None on failure.
     """
-    pan_card_filename = save_file(form.pan_card_copy.data, 'vendor_docs')
-    gst_cert_filename = save_file(form.gst_certificate_copy.data, 'vendor_docs')
-    cheque_filename = save_file(form.cancelled_cheque_copy.data, 'vendor_docs')
-    address_proof_filename = save_file(form.address_proof_copy.data, 'vendor_docs')
-    auth_letter_filename = save_file(form.auth_letter_copy.data, 'vendor_docs')
+    saved, errors = save_files({
+        'pan_card_copy': form.pan_card_copy.data,
+        'gst_certificate_copy': form.gst_certificate_copy.data,
+        'cancelled_cheque_copy': form.cancelled_cheque_copy.data,
+        'address_proof_copy': form.address_proof_copy.data,
+        'auth_letter_copy': form.auth_letter_copy.data,
+    }, 'vendor_docs')
+
+    if errors:
+        _flash_file_errors(form, errors)
+        return None
+
+    pan_card_filename = saved['pan_card_copy']
+    gst_cert_filename = saved['gst_certificate_copy']
+    cheque_filename = saved['cancelled_cheque_copy']
+    address_proof_filename = saved['address_proof_copy']
+    auth_letter_filename = saved['auth_letter_copy']
 
     all_filenames = [pan_card_filename, gst_cert_filename, cheque_filename, address_proof_filename, auth_letter_filename]
 
     if not all([pan_card_filename, gst_cert_filename, cheque_filename, address_proof_filename]):
          flash('Mandatory file upload failed. Please check errors and retry.', 'error')
-         _clean_up_files(all_filenames, 'vendor_docs')
-         return False
+         db.session.rollback()  # drops the files that were stored
+         return None
 
     try:
         new_vendor_form = VendorMaterial(
@@ -403,36 +548,50 @@ def _save_material_form(form, user_id):
             status='Under Review'
         )
         db.session.add(new_vendor_form)
+        job_ids = enqueue_document_checks(all_filenames, 'vendor_docs', user_id)
         db.session.commit()
-        return True
+        return job_ids
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error saving Material Vendor form for user {user_id}: {e}\n{traceback.format_exc()}")
         flash('An error occurred while submitting the form. Please check your inputs and try again.', 'error')
-        _clean_up_files(all_filenames, 'vendor_docs')
-        return False
+        return None
 
 
 ##
 def _save_work_form(form, user_id):
     """
     [HELPER] Processes file saving and DB creation for Work Vendor.
-    Returns True on success, False on failure.
+    Returns the ids of the queued document checks on success, None on failure.
     """
-    pan_filename = save_file(form.pan_card_copy.data, 'vendor_docs')
-    prop_id_filename = save_file(form.proprietor_id_copy.data, 'vendor_docs')
-    cheque_filename = save_file(form.cancelled_cheque_copy.data, 'vendor_docs')
-    addr_proof_filename = save_file(form.address_proof_copy.data, 'vendor_docs')
-    gst_filename = save_file(form.gst_certificate_copy.data, 'vendor_docs')
-    pf_esic_filename = save_file(form.pf_esic_copy.data, 'vendor_docs')
-    work_orders_filename = save_file(form.work_orders_copy.data, 'vendor_docs')
+    saved, errors = save_files({
+        'pan_card_copy': form.pan_card_copy.data,
+        'proprietor_id_copy': form.proprietor_id_copy.data,
+        'cancelled_cheque_copy': form.cancelled_cheque_copy.data,
+        'address_proof_copy': form.address_proof_copy.data,
+        'gst_certificate_copy': form.gst_certificate_copy.data,
+        'pf_esic_copy': form.pf_esic_copy.data,
+        'work_orders_copy': form.work_orders_copy.data,
+    }, 'vendor_docs')
+
+    if errors:
+        _flash_file_errors(form, errors)
+        return None
+
+    pan_filename = saved['pan_card_copy']
+    prop_id_filename = saved['proprietor_id_copy']
+    cheque_filename = saved['cancelled_cheque_copy']
+    addr_proof_filename = saved['address_proof_copy']
+    gst_filename = saved['gst_certificate_copy']
+    pf_esic_filename = saved['pf_esic_copy']
+    work_orders_filename = saved['work_orders_copy']
 
     all_filenames = [pan_filename, prop_id_filename, cheque_filename, addr_proof_filename, gst_filename, pf_esic_filename, work_orders_filename]
 
     if not all([pan_filename, prop_id_filename, cheque_filename, addr_proof_filename]):
         flash('Mandatory file upload failed. Please check errors and retry.', 'error')
-        _clean_up_files(all_filenames, 'vendor_docs')
-        return False
+        db.session.rollback()  # drops the files that were stored
+        return None
 
     try:
         new_vendor_form = VendorWork(
@@ -493,14 +652,14 @@ def _save_work_form(form, user_id):
             status='Under Review'
         )
         db.session.add(new_vendor_form)
+        job_ids = enqueue_document_checks(all_filenames, 'vendor_docs', user_id)
         db.session.commit()
-        return True
+        return job_ids
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error saving Work Vendor form for user {user_id}: {e}\n{traceback.format_exc()}")
         flash('An error occurred while submitting the form. Please check your inputs and try again.', 'error')
-        _clean_up_files(all_filenames, 'vendor_docs')
-        return False
+        return None
 
 
 ##
@@ -509,18 +668,19 @@ def _save_work_form(form, user_id):
 @user_required
 def vendor_form_material():
     user_id = g.user.id
-    if VendorWork.query.filter_by(user_id=user_id).first():
+    if g.user.vendor_work_form:
         flash('You have already submitted the Work Vendor form. You can only submit one type of form.', 'warning')
         return redirect(url_for('main.dashboard'))
 
-    existing_form = VendorMaterial.query.filter_by(user_id=user_id).first()
+    existing_form = g.user.vendor_material_form
     form_kwargs = {'obj': existing_form} if existing_form else {}
     form = VendorMaterialForm(**form_kwargs)
 
     if not existing_form and form.validate_on_submit():
-        if _save_material_form(form, user_id):
+        job_ids = _save_material_form(form, user_id)
+        if job_ids is not None:
             flash('Material Vendor form submitted successfully! Your application is under review.', 'success')
-            return redirect(url_for('main.dashboard'))
+            return redirect(url_for('main.dashboard', jobs=job_ids))
 
     if existing_form and existing_form.work_category:
         try:
@@ -537,18 +697,19 @@ def vendor_form_material():
 @user_required
 def vendor_form_work():
     user_id = g.user.id
-    if VendorMaterial.query.filter_by(user_id=user_id).first():
+    if g.user.vendor_material_form:
         flash('You have already submitted the Material Vendor form. You can only submit one type of form.', 'warning')
         return redirect(url_for('main.dashboard'))
 
-    existing_form = VendorWork.query.filter_by(user_id=user_id).first()
+    existing_form = g.user.vendor_work_form
     form_kwargs = {'obj': existing_form} if existing_form else {}
     form = VendorWorkForm(**form_kwargs)
 
     if not existing_form and form.validate_on_submit():
-        if _save_work_form(form, user_id):
+        job_ids = _save_work_form(form, user_id)
+        if job_ids is not None:
             flash('Work Vendor form submitted successfully! Your application is under review.', 'success')
-            return redirect(url_for('main.dashboard'))
+            return redirect(url_for('main.dashboard', jobs=job_ids))
 
     if existing_form and existing_form.work_category:
         try:
@@ -602,6 +763,25 @@ def help_support():
     return render_template('help-support.html', form=form, tickets=tickets, TicketStatus=TicketStatus)
 
 
+## Background job status
+@main_bp.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    """Lets the page poll the progress of a background job it started."""
+    job = Job.query.filter_by(id=job_id, user_id=session['user_id']).first()
+    if not job:
+        return jsonify(ok=False, message='Job not found.'), 404
+    return jsonify(
+        ok=True,
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        attempts=job.attempts,
+        last_error=job.last_error,
+        result=json.loads(job.result) if job.result else None
+    )
+
+
 # --- File Download Routes ---
 # The logic to check if the file exists AND belongs to the logged-in user
 # (or an admin) is the correct way to prevent Insecure Direct Object Reference (IDOR).
@@ -623,46 +803,22 @@ def download_vendor_doc(filename):
     if not filename:
         return render_template('error/404.html'), 404
 
-    directory = os.path.join(current_app.config['UPLOAD_FOLDER'], 'vendor_docs')
-    
-    if not is_admin:
-        owns_material_file = VendorMaterial.query.filter_by(user_id=user_id).filter(
-            or_(
-                VendorMaterial.pan_card_copy_path == filename,
-                VendorMaterial.gst_certificate_copy_path == filename,
-                VendorMaterial.cancelled_cheque_copy_path == filename,
-                VendorMaterial.address_proof_copy_path == filename,
-                VendorMaterial.auth_letter_copy_path == filename
-            )
-        ).first()
-        owns_work_file = VendorWork.query.filter_by(user_id=user_id).filter(
-            or_(
-                VendorWork.pan_card_copy_path == filename,
-                VendorWork.proprietor_id_copy_path == filename,
-                VendorWork.cancelled_cheque_copy_path == filename,
-                VendorWork.address_proof_copy_path == filename,
-                VendorWork.gst_certificate_copy_path == filename,
-                VendorWork.pf_esic_copy_path == filename,
-                VendorWork.work_orders_copy_path == filename
-            )
-        ).first()
-
-        if not owns_material_file and not owns_work_file:
-            return render_template('error/404.html'), 404
+    if not is_admin and not owns_vendor_document(user_id, filename):
+        return render_template('error/404.html'), 404
     
-    file_path = os.path.join(directory, filename)
+    try:
+        response = serve_stored_file(filename, 'vendor_docs')
+    except Exception as e:
+        current_app.logger.error(f"Error serving vendor doc {filename}: {e}")
+        return render_template('error/500.html'), 500
 
-    if not os.path.isfile(file_path):
-        current_app.logger.warning(f"User tried to download missing vendor doc: {file_path}")
+    if response is None:
+        current_app.logger.warning(f"User tried to download missing vendor doc: vendor_docs/{filename}")
         return render_template('error/404.html', 
                                custom_title="Document Not Found",
                                custom_message="This vendor document is missing from our storage."), 404
 
-    try:
-        return send_from_directory(directory, filename, as_attachment=False)
-    except Exception as e:
-        current_app.logger.error(f"Error serving vendor doc {filename}: {e}")
-        return render_template('error/500.html'), 500
+    return response
 
 
 ## Download invoice file
@@ -680,26 +836,24 @@ def download_invoice(filename):
     if not filename:
         return render_template('error/404.html'), 404
 
-    directory = os.path.join(current_app.config['UPLOAD_FOLDER'], 'invoices') #
-
     if not is_admin:
         invoice = Invoice.query.filter_by(user_id=user_id, file_path=filename).first() #
         if not invoice:
             return render_template('error/404.html'), 404
     
-    file_path = os.path.join(directory, filename)
+    try:
+        response = serve_stored_file(filename, 'invoices')
+    except Exception as e:
+         current_app.logger.error(f"Error serving invoice file {filename}: {e}")
+         return render_template('error/500.html'), 500
 
-    if not os.path.isfile(file_path):
-        current_app.logger.warning(f"User tried to download missing invoice: {file_path}")
+    if response is None:
+        current_app.logger.warning(f"User tried to download missing invoice: invoices/{filename}")
         return render_template('error/404.html', 
                                custom_title="Invoice Not Found",
                                custom_message="The invoice file you are trying to download has been deleted from the server."), 404
 
-    try:
-        return send_from_directory(directory, filename, as_attachment=False)
-    except Exception as e:
-         current_app.logger.error(f"Error serving invoice file {filename}: {e}")
-         return render_template('error/500.html'), 500
+    return response
 
 
 ## --- Error handlers ---
@@ -747,18 +901,78 @@ def messages():
     return render_template('messages.html')
 
 
-# --- Notifications Route ---
+# --- Notifications ---
 @main_bp.route('/notifications')
 @login_required
 def notifications():
-    # This is fine as a placeholder. In real app, fetch from DB.
-    dummy_notifications = [
-         {'id': 1, 'message': 'Invoice INV-2025-071 has been Approved.', 'timestamp': datetime(2025, 10, 29, 10, 30), 'is_read': False, 'category': 'success', 'link_url': url_for('main.all_invoices')},
-         {'id': 2, 'message': 'Payment for INV-2025-065 has been processed.', 'timestamp': datetime(2025, 10, 28, 15, 0), 'is_read': False, 'category': 'success', 'link_url': '#'},
-         {'id': 3, 'message': 'Invoice INV-2025-070 was Rejected. Reason: Incorrect PO number.', 'timestamp': datetime(2025, 10, 27, 9, 15), 'is_read': True, 'category': 'error', 'link_url': url_for('main.all_invoices')},
-         {'id': 4, 'message': 'Reminder: Please update your bank details if they have changed.', 'timestamp': datetime(2025, 10, 25, 11, 0), 'is_read': True, 'category': 'info', 'link_url': url_for('main.your_profile')},
-    ]
-    return render_template('notifications.html', notifications=dummy_notifications)
+    rows = (Notification.query
+            .filter_by(user_id=session['user_id'])
+            .order_by(Notification.created_at.desc(), Notification.id.desc())
+            .limit(current_app.config.get('NOTIFICATIONS_PER_PAGE', 50))
+            .all())
+    items = [{
+        'id': n.id,
+        'message': n.message,
+        'timestamp': n.created_at,
+        'is_read': n.is_read,
+        'category': n.category,
+        'tab': 'invoices' if n.link_endpoint in INVOICE_ENDPOINTS else 'info',
+        'link_url': url_for(n.link_endpoint) if n.link_endpoint else None,
+    } for n in rows]
+    return render_template('notifications.html', notifications=items)
+
+
+@main_bp.route('/notifications/unread-count')
+@login_required
+def unread_notification_count():
+    """Fills the sidebar badge; cached pages don't carry the count themselves."""
+    return jsonify(ok=True, unread=unread_count(session['user_id']))
+
+
+@main_bp.route('/notifications/read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    """Marks the given notification ids (or all of them, if `ids` is left out) as read."""
+    user_id = session['user_id']
+    payload = request.get_json(silent=True)
+    ids = payload.get('ids') if isinstance(payload, dict) else None
+    if (payload is not None and not isinstance(payload, dict)) or (ids is not None and not (
+            isinstance(ids, list) and all(isinstance(i, int) and not isinstance(i, bool) for i in ids))):
+        return jsonify(ok=False, message='ids must be a list of notification ids.'), 400
+    stmt = update(Notification).where(Notification.user_id == user_id, Notification.is_read.is_(False))
+    if ids is not None:
+        stmt = stmt.where(Notification.id.in_(ids))
+    updated = db.session.execute(stmt.values(is_read=True)).rowcount
+    db.session.commit()
+    if ids is not None:
+        unread_counter.add(user_id, -updated)
+    else:
+        unread_counter.reset(user_id)
+    return jsonify(ok=True, updated=updated, unread=unread_count(user_id))
+
+
+@main_bp.route('/events')
+@login_required
+def live_events():
+    """
+    Server-Sent Events stream of the vendor's invoice, ticket and
+    notification updates (see app/events.py). The stream does not use the
+    request context, so the database session is released before it starts.
+    """
+    if not event_hub.available():
+        return '', 204
+    user_id = session['user_id']
+    try:
+        subscription = event_hub.subscribe(user_id)
+    except TooManySubscribers:
+        return '', 503, {'Retry-After': '60'}
+    try:
+        first = [format_event('unread', {'unread': unread_count(user_id)})]
+    except Exception:
+        event_hub.unsubscribe(subscription)
+        raise
+    return Response(event_hub.stream(subscription, first), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 # --- Payment History Route ---
@@ -766,19 +980,25 @@ def notifications():
 @login_required
 @user_required
 def payment_history():
-    page = request.args.get('page', 1, type=int)
     paid_invoices_query = Invoice.query.filter_by(user_id=g.user.id, status='Paid')
 
-    paid_invoices_pagination = paid_invoices_query.order_by(
-        Invoice.payment_date.desc().nullslast(),
-        Invoice.submission_date.desc()
-        ).paginate(
-            page=page,
-            per_page=current_app.config.get('ITEMS_PER_PAGE', 15),
-            error_out=False
-        )
+    paid_invoices_page = keyset_paginate(
+        paid_invoices_query,
+        Invoice.payment_date, Invoice.id,
+        cursor=request.args.get('cursor'),
+        per_page=current_app.config.get('ITEMS_PER_PAGE', 15),
+        nullable=True,
+        count_fn=lambda: _count_from_stats(g.user.id, 'paid_count', paid_invoices_query)
+    )
 
     return render_template('all_invoices.html',
-                           invoices=paid_invoices_pagination,
+                           invoices=paid_invoices_page,
                            page_title="Payment History",
                            q=request.args.get('q', ''))
+
+
+@main_bp.route('/payment-history/export')
+@login_required
+@user_required
+def export_payment_history():
+    return _export_response(g.user.id, 'payment-history', paid_only=True)
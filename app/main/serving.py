@@ -0,0 +1,86 @@
+from flask import current_app, request, send_file, redirect
+from .blobstore import locate_file, get_storage, blob_key, blob_root
+import mimetypes
+import os
+
+
+def _cache_headers(response, sha256):
+    """
+    Stored files are immutable and named by content, so they can be cached
+    for a long time - but only by the browser, since access is per user.
+    """
+    response.cache_control.public = False
+    response.cache_control.private = True
+    if sha256:
+        response.set_etag(sha256)
+        response.cache_control.max_age = current_app.config.get('DOCUMENT_CACHE_MAX_AGE', 365 * 24 * 3600)
+        response.cache_control.immutable = True
+    return response
+
+
+def _accel_uri(file_path):
+    """
+    The nginx internal URI of a local file: X_ACCEL_REDIRECT_BLOB_PREFIX maps
+    the blob folder and X_ACCEL_REDIRECT_PREFIX maps UPLOAD_FOLDER (which
+    holds the blob folder by default). None if neither location covers it.
+    """
+    config = current_app.config
+    for root, prefix in ((blob_root(), config.get('X_ACCEL_REDIRECT_BLOB_PREFIX')),
+                         (config['UPLOAD_FOLDER'], config.get('X_ACCEL_REDIRECT_PREFIX', '/protected-uploads'))):
+        relative_path = os.path.relpath(file_path, root)
+        if prefix and relative_path != os.pardir and not relative_path.startswith(os.pardir + os.sep):
+            return f"{prefix.rstrip('/')}/{relative_path.replace(os.sep, '/')}"
+    return None
+
+
+def _accel_redirect(uri, filename):
+    """Lets nginx stream the file with sendfile(); Flask only sends headers."""
+    response = current_app.response_class(
+        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    )
+    response.headers['X-Accel-Redirect'] = uri
+    response.headers.set('Content-Disposition', 'inline', filename=filename)
+    return response
+
+
+def serve_stored_file(filename, subfolder):
+    """
+    Builds the download response for a stored file, after the caller has
+    checked access. Supports If-None-Match (304) and Range (206) requests
+    with a strong ETag taken from the content hash, or redirects to a
+    presigned URL when the storage backend is remote. Returns None if the
+    file is missing.
+    """
+    file_path, sha256 = locate_file(filename, subfolder)
+
+    # Revalidation needs no disk access at all when the hash is known.
+    if sha256 and sha256 in request.if_none_match:
+        response = current_app.response_class(status=304)
+        return _cache_headers(response, sha256)
+
+    if file_path is None:
+        # Remote backend: the client downloads straight from object storage.
+        response = redirect(get_storage().download_url(blob_key(sha256), filename))
+        response.cache_control.private = True
+        response.cache_control.no_store = True
+        return response
+
+    if not os.path.isfile(file_path):
+        return None
+
+    if current_app.config.get('SENDFILE_MODE') == 'x-accel-redirect':
+        uri = _accel_uri(file_path)
+        if uri:
+            return _cache_headers(_accel_redirect(uri, filename), sha256)
+        current_app.logger.error(f"No X-Accel-Redirect location covers {file_path} "
+                                 f"(set X_ACCEL_REDIRECT_BLOB_PREFIX); sending it from Flask")
+
+    response = send_file(
+        file_path,
+        download_name=filename,
+        as_attachment=False,
+        conditional=True,
+        etag=sha256 or True,
+        max_age=current_app.config.get('DOCUMENT_CACHE_MAX_AGE') if sha256 else None
+    )
+    return _cache_headers(response, sha256)
@@ -0,0 +1,195 @@
+from contextlib import contextmanager
+import mimetypes
+import os
+import tempfile
+import uuid
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # boto3 is only needed for STORAGE_BACKEND='s3'
+    boto3 = None
+
+
+# --- Blob storage backends ---
+# The document store (blobstore.py) decides *what* is stored under which
+# key; a backend decides *where*. Both backends expose the same methods:
+#   exists(key), put_file(key, source_path), delete(key), fetch(key),
+#   local_path(key) and download_url(key, filename).
+# put_file() takes ownership of source_path (it is moved or removed).
+
+
+class LocalStorage:
+    """Blobs as files under a directory on this machine (the default)."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def put_file(self, key, source_path):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source_path, path)
+        _fsync_dir(os.path.dirname(path))
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def fetch(self, key):
+        """Yields a local path to the blob's content."""
+        yield self.path(key)
+
+    def local_path(self, key):
+        return self.path(key)
+
+    def download_url(self, key, filename):
+        return None  # Served by Flask (or the X-Accel/X-Sendfile proxy)
+
+
+class S3Storage:
+    """
+    Blobs as objects in an S3-compatible bucket (AWS S3, MinIO, ...).
+    Uploads go through boto3's managed transfer, which switches to multipart
+    above S3_MULTIPART_THRESHOLD_MB; downloads are presigned URLs so the
+    bytes never pass through a web worker.
+    """
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None,
+                 presign_expires=300, multipart_threshold_mb=8, temp_dir=None):
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND='s3' requires the boto3 package.")
+        if not bucket:
+            raise RuntimeError("STORAGE_BACKEND='s3' requires S3_BUCKET.")
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.presign_expires = presign_expires
+        self.temp_dir = temp_dir
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+        chunk_size = multipart_threshold_mb * 1024 * 1024
+        self.transfer_config = TransferConfig(multipart_threshold=chunk_size, multipart_chunksize=chunk_size)
+
+    def object_key(self, key):
+        return f"{self.prefix}{key}"
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        return True
+
+    def put_file(self, key, source_path):
+        self.client.upload_file(source_path, self.bucket, self.object_key(key), Config=self.transfer_config)
+        os.remove(source_path)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+
+    @contextmanager
+    def fetch(self, key):
+        """Downloads the object to a temp file for the duration of the block."""
+        fd, path = tempfile.mkstemp(dir=self.temp_dir, prefix='.fetch-')
+        os.close(fd)
+        try:
+            self.client.download_file(self.bucket, self.object_key(key), path, Config=self.transfer_config)
+            yield path
+        finally:
+            os.remove(path)
+
+    def local_path(self, key):
+        return None
+
+    def download_url(self, key, filename):
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': self.bucket,
+                'Key': self.object_key(key),
+                'ResponseContentType': content_type,
+                'ResponseContentDisposition': f'inline; filename="{filename}"',
+            },
+            ExpiresIn=self.presign_expires
+        )
+
+
+def _fsync_dir(path):
+    dir_fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass  # Not every platform allows fsync on a directory
+    finally:
+        os.close(dir_fd)
+
+
+def create_storage(config, local_root, temp_dir=None):
+    backend = config.get('STORAGE_BACKEND') or 'local'
+    if backend == 'local':
+        return LocalStorage(local_root)
+    if backend == 's3':
+        return S3Storage(
+            bucket=config.get('S3_BUCKET'),
+            prefix=config.get('S3_PREFIX', ''),
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            region=config.get('S3_REGION'),
+            presign_expires=config.get('S3_PRESIGNED_URL_EXPIRES', 300),
+            multipart_threshold_mb=config.get('S3_MULTIPART_THRESHOLD_MB', 8),
+            temp_dir=temp_dir
+        )
+    raise RuntimeError(f"Unknown STORAGE_BACKEND '{backend}'.")
+
+
+def check_storage(storage, scratch_dir):
+    """
+    Exercises a backend end to end with a throwaway object and returns a
+    list of problems (empty if it behaves as the document store expects).
+    """
+    problems = []
+    key = f"conformance/{uuid.uuid4().hex}"
+    payload = os.urandom(64 * 1024)
+
+    fd, source_path = tempfile.mkstemp(dir=scratch_dir, prefix='.conformance-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(payload)
+
+    def expect(condition, message):
+        if not condition:
+            problems.append(message)
+
+    try:
+        expect(not storage.exists(key), "exists() is true for a key that was never written")
+        storage.put_file(key, source_path)
+        expect(not os.path.exists(source_path), "put_file() left the source file behind")
+        expect(storage.exists(key), "exists() is false right after put_file()")
+        with storage.fetch(key) as path:
+            with open(path, 'rb') as f:
+                expect(f.read() == payload, "fetch() returned different content")
+        url = storage.download_url(key, 'check.pdf')
+        expect(url is not None or storage.local_path(key) is not None,
+               "backend offers neither a local path nor a download URL")
+    except Exception as e:
+        problems.append(f"{type(e).__name__}: {e}")
+    finally:
+        try:
+            storage.delete(key)
+            storage.delete(key)  # deleting a missing key must not raise
+            expect(not storage.exists(key), "exists() is true after delete()")
+        except Exception as e:
+            problems.append(f"delete() failed: {type(e).__name__}: {e}")
+        if os.path.exists(source_path):
+            os.remove(source_path)
+    return problems
+
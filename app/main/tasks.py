@@ -0,0 +1,108 @@
+from flask import current_app
+from app.jobs import job_handler, enqueue_many, PermanentJobError
+from app.models import Invoice, VendorDocument
+from app.documents import FORM_DOCUMENTS
+from .blobstore import (
+    locate_file, open_stored_file, get_storage, thumbnail_key, blob_temp_dir
+)
+from functools import lru_cache
+import os
+import tempfile
+
+
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_MIME_TYPES = {'image/png', 'image/jpeg'}
+
+
+# libmagic and Pillow are imported when the first document is processed,
+# not when the web workers import this module to enqueue jobs.
+
+@lru_cache(maxsize=None)
+def _pillow_image():
+    """Pillow's Image module, or None if Pillow (optional) is not installed."""
+    try:
+        from PIL import Image
+    except ImportError:  # Pillow is optional; without it thumbnails are skipped
+        return None
+    return Image
+
+
+def _render_thumbnail(source_path, target_path):
+    with _pillow_image().open(source_path) as image:
+        image.thumbnail(THUMBNAIL_SIZE)
+        image.convert('RGB').save(target_path, 'JPEG', quality=80)
+
+
+def _store_thumbnail(source_path, sha256):
+    """Renders a thumbnail into the storage backend next to the blob."""
+    storage = get_storage()
+    key = thumbnail_key(sha256)
+    # Blobs are content-addressed, so an existing thumbnail is already correct.
+    if storage.exists(key):
+        return
+    fd, temp_path = tempfile.mkstemp(dir=blob_temp_dir(), prefix='.thumb-', suffix='.jpg')
+    os.close(fd)
+    try:
+        _render_thumbnail(source_path, temp_path)
+        storage.put_file(key, temp_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _reject_owners(filename, subfolder, user_id, mime_type):
+    """
+    Marks the uploading vendor's invoices or vendor forms that use a file
+    failing the content check as 'Rejected', so it never goes into review.
+    The file is kept for an admin to inspect. Returns what was rejected,
+    for the job's result.
+    """
+    rejected = []
+    if subfolder == 'invoices':
+        # (user_id, file_path) is indexed; file_path on its own is not
+        for invoice in Invoice.query.filter_by(user_id=user_id, file_path=filename):
+            if invoice.status != 'Rejected':
+                invoice.status = 'Rejected'
+                rejected.append({'invoice_id': invoice.id, 'invoice_number': invoice.invoice_number})
+    elif subfolder == 'vendor_docs':
+        for document in VendorDocument.query.filter_by(filename=filename, user_id=user_id):
+            model, _ = FORM_DOCUMENTS[document.form_type]
+            form = model.query.filter_by(user_id=document.user_id).first()
+            if form is not None and form.status != 'Rejected':
+                form.status = 'Rejected'
+                rejected.append({'form_type': document.form_type, 'document': document.doc_kind})
+    return {'mime_type': mime_type, 'rejected': rejected}
+
+
+@job_handler('process_document')
+def process_document(filename, subfolder, user_id):
+    """
+    Checks the full stored file with libmagic (the upload path only sniffs
+    the first 2KB) and renders a thumbnail for images.
+    """
+    _, sha256 = locate_file(filename, subfolder)
+    with open_stored_file(filename, subfolder) as file_path:
+        if not os.path.isfile(file_path):
+            raise PermanentJobError(f"Stored file {filename} is missing")
+
+        import magic
+        mime_type = magic.from_file(file_path, mime=True)
+        if mime_type not in current_app.config.get('ALLOWED_MIME_TYPES'):
+            current_app.logger.warning(f"Stored {subfolder} file {filename} has unexpected content type '{mime_type}'")
+            raise PermanentJobError(f"Unexpected content type '{mime_type}'",
+                                    on_failure=lambda: _reject_owners(filename, subfolder, user_id, mime_type))
+
+        thumbnail = mime_type in THUMBNAIL_MIME_TYPES and _pillow_image() is not None
+        if thumbnail and sha256:
+            _store_thumbnail(file_path, sha256)
+        elif thumbnail and not os.path.exists(f"{file_path}.thumb.jpg"):
+            # Legacy (pre-store) file: keep the thumbnail beside it
+            _render_thumbnail(file_path, f"{file_path}.thumb.jpg")
+
+    return {'mime_type': mime_type, 'thumbnail': thumbnail}
+
+
+def enqueue_document_checks(filenames, subfolder, user_id):
+    """Queues post-upload processing for each saved file; returns the job ids. Caller commits."""
+    return enqueue_many('process_document', [dict(filename=filename, subfolder=subfolder, user_id=user_id)
+                                             for filename in filenames if filename], user_id=user_id)
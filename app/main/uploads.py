@@ -0,0 +1,163 @@
+from flask import current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
+from werkzeug.utils import secure_filename
+from .blobstore import blob_temp_dir
+import hashlib
+import os
+import tempfile
+
+
+SNIFF_BYTES = 2048
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+class UploadRejected(Exception):
+    """An uploaded file failed validation; the message is shown to the user."""
+
+
+class StreamingFileWriter:
+    """
+    Write-only sink handed to Werkzeug's multipart parser as the file stream.
+
+    Each chunk is hashed and written straight to a temp file next to the
+    document store as it arrives, and the first 2KB are kept for libmagic,
+    so memory use stays the same whatever the size of the upload.
+    """
+
+    def __init__(self, target_dir, filename, max_size):
+        os.makedirs(target_dir, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=target_dir, prefix='.upload-', suffix='.part')
+        self._file = os.fdopen(fd, 'wb')
+        self._sha256 = hashlib.sha256()
+        self.target_dir = target_dir
+        self.filename = filename
+        self.max_size = max_size
+        self.head = b''
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise RequestEntityTooLarge()
+        if len(self.head) < SNIFF_BYTES:
+            self.head += data[:SNIFF_BYTES - len(self.head)]
+        self._sha256.update(data)
+        self._file.write(data)
+        return len(data)
+
+    def seek(self, *args):
+        # The parser rewinds the stream once the part is complete; there is
+        # nothing to rewind for a write-only sink.
+        return 0
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    def mime_type(self):
+        try:
+            import magic  # Deferred: loading libmagic's database is slow and only uploads need it
+            return magic.from_buffer(self.head, mime=True)
+        except Exception as e:
+            current_app.logger.warning(f"Could not determine MIME type for {self.filename}: {e}")
+            return None
+
+    def finish(self):
+        """Flushes and fsyncs the temp file so it can be moved into place."""
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def discard(self):
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+
+def parse_streaming_upload(environ, max_content_length=None, max_file_size=None):
+    """
+    Parses a multipart request body, streaming every file part to disk.
+    The limits default to MAX_CONTENT_LENGTH and MAX_FILE_SIZE_MB.
+
+    Returns (form, files, writers). The caller must store or discard()
+    each writer; on errors raised here the partial files are removed.
+    """
+    target_dir = blob_temp_dir()
+    max_size = max_file_size or current_app.config.get('MAX_FILE_SIZE_MB', 5) * 1024 * 1024
+    writers = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        writer = StreamingFileWriter(target_dir, filename or '', max_size)
+        writers.append(writer)
+        return writer
+
+    try:
+        _, form, files = parse_form_data(
+            environ,
+            stream_factory=stream_factory,
+            max_content_length=max_content_length or current_app.config.get('MAX_CONTENT_LENGTH'),
+            silent=False
+        )
+    except Exception:
+        for writer in writers:
+            writer.discard()
+        raise
+    return form, files, writers
+
+
+def validate_streamed_file(writer):
+    """Returns an error message if the streamed file is not acceptable, else None."""
+    filename = secure_filename(writer.filename)
+
+    allowed_extensions = current_app.config.get('ALLOWED_EXTENSIONS', {'pdf', 'png', 'jpg', 'jpeg', 'docx'})
+    if '.' not in filename or filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
+        return f"Invalid file type for {filename}. Allowed types: {', '.join(allowed_extensions)}"
+
+    allowed_mime_types = current_app.config.get('ALLOWED_MIME_TYPES')
+    mime_type = writer.mime_type()
+    if mime_type not in allowed_mime_types:
+        return f"Invalid file content for {filename}. File appears to be a '{mime_type}' but only {', '.join(allowed_mime_types)} are allowed."
+
+    return None
+
+
+def spool_upload(file, temp_dir):
+    """
+    Validates an uploaded FileStorage (extension, magic bytes, size) and
+    copies it into a StreamingFileWriter in `temp_dir`.
+    Returns the writer, or raises UploadRejected.
+    """
+    file.stream.seek(0)
+    return spool_stream(file.stream, file.filename, temp_dir)
+
+
+def spool_stream(stream, filename, temp_dir):
+    """spool_upload() for any readable binary stream, e.g. a ZIP archive member."""
+    filename = secure_filename(filename)
+    max_size = current_app.config.get('MAX_FILE_SIZE_MB', 5) * 1024 * 1024
+
+    allowed_extensions = current_app.config.get('ALLOWED_EXTENSIONS', {'pdf', 'png', 'jpg', 'jpeg', 'docx'})
+    if '.' not in filename or filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
+        raise UploadRejected(f"Invalid file type for {filename}. Allowed types: {', '.join(allowed_extensions)}")
+
+    writer = StreamingFileWriter(temp_dir, filename, max_size)
+    try:
+        for chunk in iter(lambda: stream.read(COPY_CHUNK_SIZE), b''):
+            writer.write(chunk)
+    except RequestEntityTooLarge:
+        writer.discard()
+        raise UploadRejected(f"File '{filename}' exceeds the maximum size limit of {max_size / (1024*1024)}MB.")
+    except Exception:
+        writer.discard()
+        raise
+
+    error = validate_streamed_file(writer)
+    if error:
+        writer.discard()
+        raise UploadRejected(error)
+    return writer
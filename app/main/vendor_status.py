@@ -0,0 +1,116 @@
+from flask import g, current_app, has_app_context
+from app.models import db, User, VendorMaterial, VendorWork
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, joinedload
+from collections import namedtuple
+import threading
+import time
+
+
+VendorStatus = namedtuple('VendorStatus', ['material_form_filled', 'work_form_filled', 'profile_status'])
+
+# user_id -> (expires_at, VendorStatus), shared by all requests in this worker
+_status_cache = {}
+_status_cache_lock = threading.Lock()
+
+
+def _status_from_forms(material_form, work_form):
+    profile_status = 'Incomplete'
+    if material_form: profile_status = material_form.status
+    elif work_form: profile_status = work_form.status
+    return VendorStatus(material_form is not None, work_form is not None, profile_status)
+
+
+def _cache_ttl():
+    return current_app.config.get('VENDOR_STATUS_CACHE_TTL', 300)
+
+
+def _remember(user_id, status):
+    with _status_cache_lock:
+        _status_cache[user_id] = (time.monotonic() + _cache_ttl(), status)
+
+
+def load_vendor(user_id):
+    """
+    Loads the User together with its vendor forms in one joined query,
+    caching the registration status on g and in the cross-request cache.
+    Returns None if the user does not exist.
+    """
+    user = db.session.execute(
+        select(User)
+        .options(joinedload(User.vendor_material_form), joinedload(User.vendor_work_form))
+        .where(User.id == user_id)
+    ).unique().scalar_one_or_none()
+
+    if user is None:
+        return None
+
+    status = _status_from_forms(user.vendor_material_form, user.vendor_work_form)
+    g.user = user
+    g.vendor_status = status
+    _remember(user.id, status)
+    return user
+
+
+def get_vendor_status(user_id):
+    """
+    Returns the VendorStatus for a user, checking the request-scoped copy on
+    g first, then the cross-request cache, and only then the database.
+    """
+    if 'vendor_status' in g and 'user' in g and g.user.id == user_id:
+        return g.vendor_status
+
+    with _status_cache_lock:
+        cached = _status_cache.get(user_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    material_form = VendorMaterial.query.filter_by(user_id=user_id).first()
+    work_form = VendorWork.query.filter_by(user_id=user_id).first() if material_form is None else None
+    status = _status_from_forms(material_form, work_form)
+    _remember(user_id, status)
+    return status
+
+
+def invalidate_vendor_status(user_id):
+    """Drops the cached status so the next request reads it fresh."""
+    with _status_cache_lock:
+        _status_cache.pop(user_id, None)
+
+
+# --- Cache invalidation ---
+# Any insert, delete or update of a vendor form (e.g. an admin changing its
+# status) evicts the owner's cached registration status in this worker. As
+# in app/page_cache.py, owners are collected at flush time and evicted only
+# once the transaction commits: evicting during the flush would let another
+# request reload the old status before the commit and cache it again, and a
+# rolled-back write has nothing to evict. Other workers pick the change up
+# when their entry's TTL runs out.
+
+_PENDING_KEY = 'vendor_status_dirty_users'
+_FORM_MODELS = (VendorMaterial, VendorWork)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_form_owners(session, flush_context):
+    user_ids = {obj.user_id for objects in (session.new, session.dirty, session.deleted)
+                for obj in objects if isinstance(obj, _FORM_MODELS)}
+    user_ids.discard(None)
+    if user_ids:
+        session.info.setdefault(_PENDING_KEY, set()).update(user_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_form_owners(session):
+    user_ids = session.info.pop(_PENDING_KEY, None)
+    if not user_ids:
+        return
+    for user_id in user_ids:
+        invalidate_vendor_status(user_id)
+    if has_app_context() and 'user' in g and g.user.id in user_ids:
+        g.pop('vendor_status', None)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_form_owners(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,192 @@
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import threading
+import time
+
+
+# --- Request metrics ---
+# Per-endpoint request latency, response size, status codes and SQL
+# statement counts, kept in memory by each worker process and rendered in
+# the Prometheus text format on /metrics. Every worker reports its own
+# numbers, so scrape each process (or aggregate them in Prometheus).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_labels(self.label_names, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = label_names
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for label_values, series in items:
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, label_values, {'le': bound})} {count}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, label_values, {'le': '+Inf'})} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, label_values)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, label_values)} {series[-1]}")
+        return lines
+
+
+REQUESTS = Counter('vendorportal_http_requests_total', 'HTTP requests by endpoint, method and status.',
+                   ('endpoint', 'method', 'status'))
+LATENCY = Histogram('vendorportal_http_request_duration_seconds', 'Request latency.',
+                    LATENCY_BUCKETS, ('endpoint',))
+RESPONSE_SIZE = Histogram('vendorportal_http_response_size_bytes', 'Response body size.',
+                          SIZE_BUCKETS, ('endpoint',))
+DB_QUERIES = Histogram('vendorportal_http_request_db_queries', 'SQL statements executed per request.',
+                       QUERY_BUCKETS, ('endpoint',))
+DB_TIME = Histogram('vendorportal_http_request_db_seconds', 'Time spent in SQL per request.',
+                    LATENCY_BUCKETS, ('endpoint',))
+QUERY_BUDGET_EXCEEDED = Counter('vendorportal_query_budget_exceeded_total',
+                                'Requests that ran more SQL statements than QUERY_BUDGET_PER_REQUEST.',
+                                ('endpoint',))
+PAGE_CACHE = Counter('vendorportal_page_cache_requests_total', 'Rendered page cache lookups by page and result.',
+                     ('page', 'result'))
+NOTIFICATIONS = Counter('vendorportal_notifications_total', 'Notifications written by the deliver_notifications jobs.',
+                        ('result',))
+SMS = Counter('vendorportal_sms_total', 'Outbound SMS by result (sent, failed, expired, retried, rejected).',
+              ('result',))
+SMS_DELIVERY = Histogram('vendorportal_sms_delivery_seconds', 'Time from queueing an SMS to Twilio accepting it.',
+                         LATENCY_BUCKETS + (30.0, 60.0, 300.0))
+
+METRICS = (REQUESTS, LATENCY, RESPONSE_SIZE, DB_QUERIES, DB_TIME, QUERY_BUDGET_EXCEEDED, PAGE_CACHE, NOTIFICATIONS,
+           SMS, SMS_DELIVERY)
+
+
+# --- SQL statement counting ---
+# Counts go on g, so they are per request; statements run outside a request
+# (background jobs, CLI commands) are not counted.
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'metrics_started' in g:
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if not starts or not has_request_context() or 'metrics_started' not in g:
+        return
+    g.metrics_db_time += time.perf_counter() - starts.pop()
+    g.metrics_query_count += 1
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute: pop its start
+    # time here, or it stays on the pooled connection and every later
+    # statement's time is measured against the wrong start.
+    conn = exception_context.connection
+    starts = conn.info.get('metrics_query_start') if conn is not None else None
+    if not starts:
+        return
+    started = starts.pop()
+    if has_request_context() and 'metrics_started' in g:
+        g.metrics_db_time += time.perf_counter() - started
+        g.metrics_query_count += 1
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_query_count = 0
+    g.metrics_db_time = 0.0
+
+
+def _record_request(response):
+    if 'metrics_started' not in g:
+        return response
+    endpoint = request.endpoint or 'unmatched'  # unmatched URLs share one label
+    elapsed = time.perf_counter() - g.metrics_started
+
+    REQUESTS.inc(endpoint, request.method, str(response.status_code))
+    LATENCY.observe(elapsed, endpoint)
+    if response.content_length is not None:
+        RESPONSE_SIZE.observe(response.content_length, endpoint)
+    DB_QUERIES.observe(g.metrics_query_count, endpoint)
+    DB_TIME.observe(g.metrics_db_time, endpoint)
+
+    budget = current_app.config.get('QUERY_BUDGET_PER_REQUEST', 25)
+    if budget and g.metrics_query_count > budget:
+        QUERY_BUDGET_EXCEEDED.inc(endpoint)
+        current_app.logger.warning(
+            f"{request.method} {request.path} ({endpoint}) ran {g.metrics_query_count} SQL statements "
+            f"(budget {budget}) in {g.metrics_db_time * 1000:.1f}ms - possible N+1 query"
+        )
+    return response
+
+
+def init_metrics(app):
+    """Registers the request hooks that feed the metrics."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    app.before_request(_start_request)
+    app.after_request(_record_request)
+
+
+def render_metrics(pool=None):
+    """All metrics (plus connection pool gauges, if given) in Prometheus text format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    if pool:
+        for key, value in sorted(pool.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                name = f"vendorportal_db_pool_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+    return '\n'.join(lines) + '\n'
@@ -2,6 +2,7 @@ from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import enum
+import json
 
 
 db = SQLAlchemy()
@@ -95,6 +96,133 @@ class Invoice(db.Model):
 
     payment_date = db.Column(db.DateTime, nullable=True)
 
+    # Every vendor-facing listing filters on user_id first and then sorts,
+    # so the composite indexes below let those pages read rows in order
+    # instead of scanning and sorting the whole table. The trailing id
+    # matches the (date, id) keys used by keyset pagination.
+    #
+    # Payment history sorts on payment_date DESC NULLS LAST. PostgreSQL puts
+    # NULLs first in a DESC index, so it needs NULLS LAST spelled out to use
+    # the index for that order; SQLite already sorts NULLs last in DESC order
+    # and doesn't accept NULLS LAST in an index, so it gets the plain form.
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'invoice_number', name='uq_invoices_user_invoice_number'),
+        db.Index('ix_invoices_user_submission', 'user_id', submission_date.desc(), id.desc()),
+        db.Index('ix_invoices_user_status_payment', 'user_id', 'status', payment_date.desc().nullslast(),
+                 id.desc()).ddl_if(dialect='postgresql'),
+        db.Index('ix_invoices_user_status_payment', 'user_id', 'status', payment_date.desc(),
+                 id.desc()).ddl_if(callable_=lambda ddl, target, bind, dialect, **kw: dialect.name != 'postgresql'),
+        db.Index('ix_invoices_user_file_path', 'user_id', 'file_path'),
+    )
+
+
+### VendorInvoiceStats Model
+class VendorInvoiceStats(db.Model):
+    """
+    Per-vendor invoice summary, kept in step with the invoices table by the
+    session hooks in app/stats.py so the dashboard never has to aggregate.
+    """
+    __tablename__ = 'vendor_invoice_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+    in_review_count = db.Column(db.Integer, nullable=False, default=0)
+    approved_count = db.Column(db.Integer, nullable=False, default=0)
+    paid_count = db.Column(db.Integer, nullable=False, default=0)
+    rejected_count = db.Column(db.Integer, nullable=False, default=0)
+    paid_total = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+### Document store Models
+class StoredBlob(db.Model):
+    """A unique uploaded file body, stored once under its SHA-256 digest."""
+    __tablename__ = 'stored_blobs'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class StoredFile(db.Model):
+    """
+    Maps a stored filename (the value kept in Invoice.file_path and the
+    vendor form *_copy_path columns) to the blob holding its content.
+    """
+    __tablename__ = 'stored_files'
+
+    filename = db.Column(db.String(255), primary_key=True)
+    subfolder = db.Column(db.String(50), nullable=False)
+    sha256 = db.Column(db.String(64), db.ForeignKey('stored_blobs.sha256'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+### Job Model
+class Job(db.Model):
+    """A unit of background work, persisted so it survives restarts (see app/jobs.py)."""
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}') # JSON arguments for the handler
+    result = db.Column(db.Text, nullable=True) # JSON return value of the handler
+    status = db.Column(db.String(20), nullable=False, default='queued') # queued / running / done / failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    last_error = db.Column(db.Text, nullable=True)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+
+### Notification Model
+class Notification(db.Model):
+    """
+    A message for a vendor about a change to one of their invoices, forms or
+    tickets. Rows are written in batches by app/notifications.py.
+    """
+    __tablename__ = 'notifications'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    message = db.Column(db.String(255), nullable=False)
+    category = db.Column(db.String(20), nullable=False, default='info') # success / error / info
+    link_endpoint = db.Column(db.String(64), nullable=True) # e.g. 'main.all_invoices'
+    is_read = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # The unread count and unread listing per vendor are index-only scans.
+    __table_args__ = (
+        db.Index('ix_notifications_user_read_created', 'user_id', 'is_read', 'created_at'),
+    )
+
+
+### VendorDocument Model
+class VendorDocument(db.Model):
+    """
+    One uploaded vendor form attachment, so ownership checks are a single
+    indexed lookup. Kept in sync with the *_copy_path columns by app/documents.py.
+    """
+    __tablename__ = 'vendor_documents'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    form_type = db.Column(db.String(20), nullable=False) # 'material' or 'work'
+    doc_kind = db.Column(db.String(50), nullable=False) # e.g. 'pan_card_copy', 'work_orders_copy'
+    filename = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_vendor_documents_filename_user', 'filename', 'user_id'),
+        db.Index('ix_vendor_documents_user_form', 'user_id', 'form_type'),
+    )
+
 
 ### VendorMaterial Model
 class VendorMaterial(db.Model):
@@ -243,3 +371,16 @@ class VendorWork(db.Model):
 
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=False)
     status = db.Column(db.String(20), nullable=False, default='Under Review')
+
+    @property
+    def work_orders_copy_paths(self):
+        """work_orders_copy_path holds one stored filename or a JSON list of them."""
+        value = (self.work_orders_copy_path or '').strip()
+        if not value:
+            return []
+        if value.startswith('['):
+            try:
+                return [name for name in json.loads(value) if name]
+            except ValueError:
+                pass
+        return [name.strip() for name in value.split(',') if name.strip()]
@@ -0,0 +1,200 @@
+from flask import current_app
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import event, insert, select, delete
+from sqlalchemy.orm import Session, attributes
+from .models import db, Notification, Invoice, VendorMaterial, VendorWork, SupportTicket
+from .metrics import NOTIFICATIONS
+from .events import event_hub
+from .jobs import job_handler, enqueue_many
+import threading
+import time
+
+
+# --- Vendor notifications ---
+# Status changes to a vendor's invoices, registration forms and support
+# tickets are turned into Notification rows. The rows are worked out at
+# flush time (while the old values are still known) and queued as
+# 'deliver_notifications' jobs of up to NOTIFICATION_BATCH_SIZE rows in the
+# same transaction, so a rolled-back transaction notifies no one and a
+# committed one is delivered even if the process dies right after. The job
+# worker writes each batch with one executemany INSERT. An admin approving
+# thousands of invoices in one commit therefore adds a few job rows to it,
+# not one write per invoice.
+
+INVOICE_ENDPOINTS = ('main.all_invoices', 'main.payment_history')
+_FORM_LABELS = {VendorMaterial: 'material supplier', VendorWork: 'work contractor'}
+_STATUS_CATEGORIES = {'Approved': 'success', 'Paid': 'success', 'Rejected': 'error'}
+
+
+def notification_row(user_id, message, category='info', link_endpoint=None):
+    """The parameters of one Notification INSERT."""
+    return dict(user_id=user_id, message=message[:255], category=category, link_endpoint=link_endpoint,
+                is_read=False, created_at=datetime.utcnow())
+
+
+def _changed(obj, key):
+    """(changed, new value) for an attribute of a dirty object."""
+    history = attributes.get_history(obj, key)
+    if not history.added:
+        return False, None
+    new = history.added[0]
+    if history.deleted and history.deleted[0] == new:
+        return False, new
+    return True, new
+
+
+def _invoice_notifications(invoice):
+    status_changed, status = _changed(invoice, 'status')
+    date_changed, payment_date = _changed(invoice, 'payment_date')
+    number = invoice.invoice_number
+
+    if status_changed and status == 'Paid':
+        paid_on = f" on {payment_date:%d %b %Y}" if payment_date else ''
+        yield notification_row(invoice.user_id, f"Invoice {number} has been paid{paid_on}.", 'success',
+                               'main.payment_history')
+    elif status_changed and status:
+        yield notification_row(invoice.user_id, f"Invoice {number} is now {status}.",
+                               _STATUS_CATEGORIES.get(status, 'info'), 'main.all_invoices')
+        if date_changed and payment_date:
+            yield notification_row(invoice.user_id, f"Payment date for invoice {number} set to {payment_date:%d %b %Y}.",
+                                   'info', 'main.payment_history')
+    elif date_changed and payment_date:
+        yield notification_row(invoice.user_id, f"Payment date for invoice {number} set to {payment_date:%d %b %Y}.",
+                               'info', 'main.payment_history')
+
+
+def _form_notifications(form):
+    changed, status = _changed(form, 'status')
+    if changed and status:
+        yield notification_row(form.user_id, f"Your {_FORM_LABELS[type(form)]} registration is now {status}.",
+                               _STATUS_CATEGORIES.get(status, 'info'), 'main.your_profile')
+
+
+def _ticket_notifications(ticket):
+    changed, status = _changed(ticket, 'status')
+    if changed and status is not None:
+        yield notification_row(ticket.user_id, f'Your support ticket {ticket.id} ("{ticket.subject}") is now {status.value}.',
+                               'info', 'main.help_support')
+
+
+_PRODUCERS = (
+    (Invoice, _invoice_notifications),
+    ((VendorMaterial, VendorWork), _form_notifications),
+    (SupportTicket, _ticket_notifications),
+)
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+# As in app/stats.py: load the old value before an expired attribute is
+# overwritten, so setting a status to its current value is not a change.
+for _attribute in (Invoice.status, Invoice.payment_date, VendorMaterial.status, VendorWork.status, SupportTicket.status):
+    event.listen(_attribute, 'set', _keep_previous_value, active_history=True, retval=True)
+
+
+@event.listens_for(Session, 'before_flush')
+def _queue_notifications(session, flush_context, instances):
+    rows = []
+    for obj in session.dirty:
+        for models, produce in _PRODUCERS:
+            if isinstance(obj, models):
+                if session.is_modified(obj):
+                    rows.extend(produce(obj))
+                break
+    if rows:
+        rows = [dict(row, created_at=row['created_at'].isoformat()) for row in rows]
+        batch_size = current_app.config.get('NOTIFICATION_BATCH_SIZE', 500)
+        enqueue_many('deliver_notifications', [dict(rows=rows[start:start + batch_size])
+                                               for start in range(0, len(rows), batch_size)], session=session)
+
+
+@job_handler('deliver_notifications')
+def deliver_notifications(rows):
+    """Writes one batch of queued notification rows and tells the vendors' open pages."""
+    rows = [dict(row, created_at=datetime.fromisoformat(row['created_at'])) for row in rows]
+    db.session.execute(insert(Notification), rows)
+    # Committed here rather than by the job runner, so the counts and live
+    # events below never announce rows that could still be rolled back.
+    db.session.commit()
+    NOTIFICATIONS.inc('delivered', amount=len(rows))
+    latest = {row['user_id']: row for row in rows}
+    counts = Counter(row['user_id'] for row in rows)
+    for user_id, count in counts.items():
+        unread_counter.add(user_id, count)
+    event_hub.publish_many([(user_id, 'notification', {
+        'new': count, 'message': latest[user_id]['message'], 'category': latest[user_id]['category'],
+    }) for user_id, count in counts.items()])
+    return {'delivered': len(rows)}
+
+
+class UnreadCounter:
+    """
+    Per-process cache of each vendor's unread notification count, so the
+    sidebar badge costs a COUNT query once per NOTIFICATION_COUNT_TTL rather
+    than on every page. Deliveries and mark-as-read in this process adjust
+    cached counts in place; the TTL bounds staleness from other workers.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._counts = {}    # user_id -> (expires_at, count)
+        self._versions = {}  # user_id -> number of adjustments, to spot a load racing one
+        self._lock = threading.Lock()
+
+    def get(self, user_id, load):
+        """The cached count, calling load() on a miss."""
+        with self._lock:
+            entry = self._counts.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            version = self._versions.get(user_id, 0)
+        count = load()
+        with self._lock:
+            # Skip caching if a delivery landed while loading: the count
+            # may or may not include it.
+            if self._versions.get(user_id, 0) == version:
+                self._counts[user_id] = (time.monotonic() + self.ttl, count)
+        return count
+
+    def add(self, user_id, amount):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            entry = self._counts.get(user_id)
+            if entry is not None:
+                self._counts[user_id] = (entry[0], max(0, entry[1] + amount))
+
+    def reset(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._counts[user_id] = (time.monotonic() + self.ttl, 0)
+
+
+unread_counter = UnreadCounter()
+
+
+def init_notifications(app):
+    """Applies NOTIFICATION_COUNT_TTL to the unread count cache."""
+    unread_counter.ttl = app.config.get('NOTIFICATION_COUNT_TTL', 60)
+
+
+def unread_count(user_id):
+    """The vendor's unread notification count, from the cached counter."""
+    return unread_counter.get(user_id, lambda: Notification.query.filter_by(
+        user_id=user_id, is_read=False).count())
+
+
+def prune_notifications(older_than_days, batch_size=5000):
+    """Deletes read notifications older than the cutoff, in batches. Returns how many were deleted."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    deleted = 0
+    while True:
+        ids = select(Notification.id).where(
+            Notification.is_read.is_(True), Notification.created_at < cutoff).limit(batch_size)
+        count = db.session.execute(delete(Notification).where(Notification.id.in_(ids.scalar_subquery()))).rowcount
+        db.session.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
@@ -0,0 +1,249 @@
+from flask import current_app, session, has_app_context
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .models import User, Invoice, VendorMaterial, VendorWork, SupportTicket
+from .metrics import PAGE_CACHE
+import threading
+import time
+import uuid
+
+try:
+    import redis
+except ImportError:  # redis is only needed for PAGE_CACHE_BACKEND='redis'
+    redis = None
+
+
+# --- Rendered page cache ---
+# Fully rendered vendor pages (dashboard, profile) are cached under
+#   page:<name>:<user_id>:<version>
+# where <version> is a per-vendor version bumped after every commit that
+# writes one of the vendor's invoices, forms or tickets (or the user row).
+# A bump makes the old entries unreachable; they age out through LRU
+# eviction or PAGE_CACHE_TTL. The TTL also bounds staleness from writes
+# these hooks cannot see, such as bulk UPDATE statements.
+#
+# Versions must be shared by every worker that serves the pages: the
+# in-process 'memory' backend only sees bumps from its own worker, so under
+# several gunicorn workers it serves pages up to PAGE_CACHE_TTL stale. It is
+# opt-in (PAGE_CACHE_BACKEND='memory', for a single worker or development);
+# by default the cache uses Redis when PAGE_CACHE_REDIS_URL is set and is
+# off otherwise.
+
+_VERSIONED_MODELS = (Invoice, VendorMaterial, VendorWork, SupportTicket)
+_PENDING_KEY = 'page_cache_dirty_users'
+
+
+class MemoryPageCache:
+    """Per-process LRU cache capped at max_bytes of page content."""
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (expires_at, html)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version(self, user_id):
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def bump(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, html):
+        cost = len(key) + len(html)
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, html)
+            self.size += cost
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, html = self._entries.pop(key)
+        self.size -= len(key) + len(html)
+
+
+class RedisPageCache:
+    """
+    Cache shared by all workers through Redis, so a commit in one worker
+    invalidates the page everywhere. `client` is a redis-py client or
+    anything with the same get/set (e.g. fakeredis). Size limits and
+    eviction are Redis's own: run it with maxmemory and allkeys-lru.
+    """
+
+    def __init__(self, client, ttl, prefix='vendorportal:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _version_key(self, user_id):
+        return f"{self.prefix}version:{user_id}"
+
+    def version(self, user_id):
+        # Versions are random tokens rather than a counter starting at 0, so
+        # a version key lost to eviction never brings an old page back.
+        key = self._version_key(user_id)
+        value = self.client.get(key)
+        if value is None:
+            self.client.set(key, uuid.uuid4().hex, nx=True)
+            value = self.client.get(key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def bump(self, user_ids):
+        for user_id in user_ids:
+            self.client.set(self._version_key(user_id), uuid.uuid4().hex)
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def set(self, key, html):
+        self.client.set(self.prefix + key, html.encode('utf-8'), ex=self.ttl)
+
+
+def page_cache_backend_name(config):
+    return config.get('PAGE_CACHE_BACKEND') or ('redis' if config.get('PAGE_CACHE_REDIS_URL') else 'none')
+
+
+def create_page_cache(config):
+    backend = page_cache_backend_name(config)
+    ttl = config.get('PAGE_CACHE_TTL', 300)
+    if backend == 'none':
+        return None
+    if backend == 'memory':
+        return MemoryPageCache(config.get('PAGE_CACHE_MAX_BYTES', 32 * 1024 * 1024), ttl)
+    if backend == 'redis':
+        if redis is None:
+            raise RuntimeError("PAGE_CACHE_BACKEND='redis' requires the redis package.")
+        if not config.get('PAGE_CACHE_REDIS_URL'):
+            raise RuntimeError("PAGE_CACHE_BACKEND='redis' requires PAGE_CACHE_REDIS_URL.")
+        return RedisPageCache(redis.Redis.from_url(config['PAGE_CACHE_REDIS_URL']), ttl)
+    raise RuntimeError(f"Unknown PAGE_CACHE_BACKEND '{backend}'.")
+
+
+def get_page_cache():
+    """The configured page cache for this app (None if disabled), created on first use."""
+    if 'page_cache' not in current_app.extensions:
+        current_app.extensions['page_cache'] = create_page_cache(current_app.config)
+    return current_app.extensions['page_cache']
+
+
+def cached_page(name, user_id, render):
+    """
+    Returns the cached HTML of page `name` for a vendor, calling render() on
+    a miss. Requests with pending flash messages bypass the cache, since
+    the page has to show (and consume) them.
+    """
+    cache = get_page_cache()
+    if cache is None or session.get('_flashes'):
+        return render()
+
+    try:
+        # Read the version before rendering: a commit landing mid-render
+        # bumps it, so the page is stored under an already-stale key.
+        key = f"page:{name}:{user_id}:{cache.version(user_id)}"
+        html = cache.get(key)
+    except Exception as e:
+        current_app.logger.warning(f"Page cache unavailable, rendering {name} uncached: {e}")
+        return render()
+
+    if html is not None:
+        PAGE_CACHE.inc(name, 'hit')
+        return html
+
+    PAGE_CACHE.inc(name, 'miss')
+    html = render()
+    try:
+        cache.set(key, html)
+    except Exception as e:
+        current_app.logger.warning(f"Could not store {name} in the page cache: {e}")
+    return html
+
+
+def check_page_cache(cache):
+    """
+    Exercises a cache backend with a throwaway vendor id and returns a list
+    of problems (empty if it behaves as cached_page() expects).
+    """
+    problems = []
+    user_id = f"check-{uuid.uuid4().hex}"
+
+    def expect(condition, message):
+        if not condition:
+            problems.append(message)
+
+    try:
+        version = cache.version(user_id)
+        expect(cache.version(user_id) == version, "version() changed without a bump()")
+        key = f"page:check:{user_id}:{version}"
+        expect(cache.get(key) is None, "get() returned content for a key that was never written")
+        cache.set(key, '<p>café</p>')
+        expect(cache.get(key) == '<p>café</p>', "get() returned different content than set()")
+        cache.bump([user_id])
+        expect(cache.version(user_id) != version, "bump() did not change the version")
+    except Exception as e:
+        problems.append(f"{type(e).__name__}: {e}")
+    return problems
+
+
+# --- Version bumps ---
+# Owners of written rows are collected at flush time and bumped only once
+# the transaction commits, so a rolled-back write never invalidates pages
+# and a page rendered before the commit cannot be cached as current.
+
+def _owner_ids(objects):
+    for obj in objects:
+        if isinstance(obj, _VERSIONED_MODELS):
+            yield obj.user_id
+        elif isinstance(obj, User):
+            yield obj.id
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_dirty_users(session, flush_context):
+    dirty = set(_owner_ids(session.new)) | set(_owner_ids(session.dirty)) | set(_owner_ids(session.deleted))
+    dirty.discard(None)
+    if dirty:
+        session.info.setdefault(_PENDING_KEY, set()).update(dirty)
+
+
+def invalidate_on_commit(session, user_ids):
+    """Bumps these vendors' pages when the session commits, for writes the flush hook can't see (bulk INSERTs)."""
+    session.info.setdefault(_PENDING_KEY, set()).update(user_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_dirty_users(session):
+    user_ids = session.info.pop(_PENDING_KEY, None)
+    if not user_ids or not has_app_context():
+        return
+    try:
+        cache = get_page_cache()
+        if cache is not None:
+            cache.bump(user_ids)
+    except Exception as e:
+        current_app.logger.warning(f"Could not invalidate cached pages for users {sorted(user_ids)}: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_dirty_users(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,171 @@
+from flask import g, request, current_app
+from collections import Counter
+from datetime import datetime
+from .internal.access import has_internal_access
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+
+# --- Slow request profiler ---
+# Opt-in: with PROFILING_ENABLED off no hooks are registered at all. When on,
+# a request is profiled if it carries the X-Profile header (admins and
+# INTERNAL_METRICS_TOKEN holders only) or falls in the PROFILE_SAMPLE_RATE
+# fraction of traffic. A sampler thread records the handler thread's stack
+# every PROFILE_INTERVAL_MS; the slowest PROFILE_KEEP profiles are kept as
+# JSON files in PROFILE_DIR, with stacks in collapsed ("a;b;c count")
+# format that flamegraph.pl and speedscope read directly.
+
+PROFILE_HEADER = 'X-Profile'
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval until stopped."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='request-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _start_profile():
+    config = current_app.config
+    sampled = random.random() < config.get('PROFILE_SAMPLE_RATE', 0.0)
+    if not sampled and not (request.headers.get(PROFILE_HEADER) == '1' and has_internal_access()):
+        return
+    sampler = StackSampler(threading.get_ident(), config.get('PROFILE_INTERVAL_MS', 5) / 1000)
+    g.profile_sampler = sampler
+    g.profile_started = time.perf_counter()
+    sampler.start()
+
+
+def _finish_profile(response):
+    sampler = g.pop('profile_sampler', None)
+    if sampler is None:
+        return response
+    sampler.stop()
+    duration_ms = (time.perf_counter() - g.pop('profile_started')) * 1000
+    if duration_ms >= current_app.config.get('PROFILE_MIN_DURATION_MS', 0):
+        try:
+            save_profile({
+                'endpoint': request.endpoint,
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'status': response.status_code,
+                'duration_ms': round(duration_ms, 2),
+                'captured_at': datetime.utcnow().isoformat(timespec='seconds'),
+                'interval_ms': sampler.interval * 1000,
+                'samples': sampler.samples,
+                'stacks': dict(sampler.stacks.most_common()),
+            })
+        except OSError as e:
+            current_app.logger.warning(f"Could not save request profile: {e}")
+    response.headers['X-Profile-Duration-Ms'] = f"{duration_ms:.1f}"
+    return response
+
+
+def _abandon_profile(exc):
+    """Stops a sampler left running when the request failed before after_request."""
+    sampler = g.pop('profile_sampler', None)
+    if sampler is not None:
+        sampler.stop()
+
+
+def profile_dir():
+    path = current_app.config.get('PROFILE_DIR') or os.path.join(current_app.instance_path, 'profiles')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _ring(path):
+    """Profile files, slowest first. Names start with the zero-padded duration."""
+    return sorted((name for name in os.listdir(path) if name.endswith('.json')), reverse=True)
+
+
+def save_profile(profile):
+    """
+    Adds a profile to the on-disk ring, which holds only the slowest
+    PROFILE_KEEP profiles. Returns the profile id, or None if it was faster
+    than everything already kept.
+    """
+    path = profile_dir()
+    keep = current_app.config.get('PROFILE_KEEP', 50)
+    profile_id = f"{int(profile['duration_ms'] * 1000):012d}-{uuid.uuid4().hex[:12]}"
+
+    existing = _ring(path)
+    if len(existing) >= keep and profile_id < existing[keep - 1]:
+        return None
+
+    temp_path = os.path.join(path, f".{profile_id}.tmp")
+    with open(temp_path, 'w') as f:
+        json.dump(profile, f)
+    os.replace(temp_path, os.path.join(path, f"{profile_id}.json"))
+
+    for name in _ring(path)[keep:]:
+        try:
+            os.remove(os.path.join(path, name))
+        except FileNotFoundError:
+            pass  # Another worker pruned it first
+    return profile_id
+
+
+def list_profiles():
+    """Summaries of the kept profiles, slowest first."""
+    path = profile_dir()
+    profiles = []
+    for name in _ring(path):
+        profile = load_profile(name[:-len('.json')])
+        if profile is not None:
+            profile.pop('stacks', None)
+            profiles.append(profile)
+    return profiles
+
+
+def load_profile(profile_id):
+    if not profile_id.replace('-', '').isalnum():
+        return None
+    try:
+        with open(os.path.join(profile_dir(), f"{profile_id}.json")) as f:
+            profile = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    profile['id'] = profile_id
+    return profile
+
+
+def collapsed_stacks(profile):
+    """The profile in collapsed-stack format, one 'frame;frame;frame count' per line."""
+    return ''.join(f"{stack} {count}\n" for stack, count in profile['stacks'].items())
+
+
+def init_profiling(app):
+    """Registers the profiling hooks, only if PROFILING_ENABLED is set."""
+    if not app.config.get('PROFILING_ENABLED'):
+        return
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.teardown_request(_abandon_profile)
@@ -0,0 +1,226 @@
+from .models import db, Invoice
+from sqlalchemy import DDL, event, select, or_, func, literal_column, text, table, column
+from collections import namedtuple
+import re
+
+
+# --- Invoice search ---
+# PostgreSQL: a pg_trgm GIN index over invoice_number, po_number and
+#   description serves the substring matches; hits are ranked by trigram
+#   similarity.
+# SQLite: an external-content FTS5 table (invoices_fts) with the trigram
+#   tokenizer is kept in sync by triggers, so a term matches anywhere inside
+#   a word ('123' finds 'INV-0123') just as ILIKE does; hits are ranked by
+#   bm25(). Trigrams need terms of 3+ characters: shorter ones are matched
+#   with ILIKE within the FTS hits, and a search made only of short terms
+#   uses ILIKE alone. Needs SQLite 3.34+.
+# Anything else (or a database created before the index existed) falls back
+# to ILIKE, ordered by submission date.
+
+SearchQuery = namedtuple('SearchQuery', ['terms', 'amount_filters'])
+
+_AMOUNT_BOUND = re.compile(r'^(?:amount:)?(?P<op><=|>=|<|>)(?P<value>\d+(?:\.\d+)?)$', re.IGNORECASE)
+_AMOUNT_RANGE = re.compile(r'^(?:amount:)?(?P<low>\d+(?:\.\d+)?)\.\.(?P<high>\d+(?:\.\d+)?)$', re.IGNORECASE)
+
+# FTS5 column weights for bm25(): invoice_number, po_number, description
+_FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+_SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS invoices_fts USING fts5("
+    "invoice_number, po_number, description, "
+    "content='invoices', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS invoices_fts_ai AFTER INSERT ON invoices BEGIN "
+    "INSERT INTO invoices_fts(rowid, invoice_number, po_number, description) "
+    "VALUES (new.id, new.invoice_number, new.po_number, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS invoices_fts_ad AFTER DELETE ON invoices BEGIN "
+    "INSERT INTO invoices_fts(invoices_fts, rowid, invoice_number, po_number, description) "
+    "VALUES ('delete', old.id, old.invoice_number, old.po_number, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS invoices_fts_au AFTER UPDATE OF invoice_number, po_number, description "
+    "ON invoices BEGIN "
+    "INSERT INTO invoices_fts(invoices_fts, rowid, invoice_number, po_number, description) "
+    "VALUES ('delete', old.id, old.invoice_number, old.po_number, old.description); "
+    "INSERT INTO invoices_fts(rowid, invoice_number, po_number, description) "
+    "VALUES (new.id, new.invoice_number, new.po_number, new.description); END",
+)
+
+# Databases indexed before the trigram tokenizer are re-indexed by install_search_index().
+_SQLITE_DROP_DDL = (
+    "DROP TRIGGER IF EXISTS invoices_fts_ai",
+    "DROP TRIGGER IF EXISTS invoices_fts_ad",
+    "DROP TRIGGER IF EXISTS invoices_fts_au",
+    "DROP TABLE IF EXISTS invoices_fts",
+)
+
+# Shortest term the trigram index can match
+_TRIGRAM_MIN_LENGTH = 3
+
+_POSTGRES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_invoices_search_trgm ON invoices USING gin "
+    "(invoice_number gin_trgm_ops, po_number gin_trgm_ops, description gin_trgm_ops)",
+)
+
+# Lightweight handle on the FTS5 table for building queries
+invoices_fts = table('invoices_fts', column('rowid'))
+
+# engine url -> whether a trigram invoices_fts exists
+_fts_available = {}
+
+
+def parse_search(q):
+    """
+    Splits the search box text into free-text terms and amount filters.
+    Amounts are written as '>5000', '<=1200.50' or '1000..5000'
+    (optionally prefixed with 'amount:').
+    """
+    terms, amount_filters = [], []
+    for token in (q or '').split():
+        bound = _AMOUNT_BOUND.match(token)
+        value_range = _AMOUNT_RANGE.match(token)
+        if bound:
+            value = float(bound.group('value'))
+            op = bound.group('op')
+            amount_filters.append({
+                '<': Invoice.invoice_amount < value,
+                '<=': Invoice.invoice_amount <= value,
+                '>': Invoice.invoice_amount > value,
+                '>=': Invoice.invoice_amount >= value,
+            }[op])
+        elif value_range:
+            low, high = sorted((float(value_range.group('low')), float(value_range.group('high'))))
+            amount_filters.append(Invoice.invoice_amount.between(low, high))
+        else:
+            terms.append(token)
+    return SearchQuery(terms, amount_filters)
+
+
+def _ilike_conditions(terms):
+    """Every term must appear somewhere in the invoice number, PO number or description."""
+    conditions = []
+    for term in terms:
+        pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        conditions.append(or_(
+            Invoice.invoice_number.ilike(pattern, escape='\\'),
+            Invoice.po_number.ilike(pattern, escape='\\'),
+            Invoice.description.ilike(pattern, escape='\\'),
+        ))
+    return conditions
+
+
+def _fts_match_expression(terms):
+    """
+    Each term becomes a quoted phrase, so punctuation can't break FTS5 syntax.
+    Against the trigram index a phrase is a substring match, like ILIKE.
+    """
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def _fts_table_sql(connection):
+    return connection.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'invoices_fts'")
+    ).scalar()
+
+
+def _sqlite_supports_trigram(ddl=None, target=None, bind=None, **kw):
+    """The trigram tokenizer arrived in SQLite 3.34."""
+    return bind.dialect.dbapi.sqlite_version_info >= (3, 34)
+
+
+def _has_fts_table():
+    engine = db.session.get_bind()
+    key = str(engine.url)
+    if key not in _fts_available:
+        # An invoices_fts from before the trigram tokenizer would miss matches
+        # inside words, so it is ignored until the index is reinstalled.
+        _fts_available[key] = 'trigram' in (_fts_table_sql(db.session) or '')
+    return _fts_available[key]
+
+
+def build_search_statement(user_id, search, dialect, fts_available):
+    """
+    The SELECT of invoice ids for a vendor matching `search` (a SearchQuery
+    with at least one term), best match first.
+    """
+    base = [Invoice.user_id == user_id, *search.amount_filters]
+
+    if dialect == 'postgresql':
+        phrase = ' '.join(search.terms)
+        rank = func.greatest(
+            func.similarity(Invoice.invoice_number, phrase),
+            func.similarity(func.coalesce(Invoice.po_number, ''), phrase),
+            func.word_similarity(phrase, Invoice.description),
+        )
+        return (
+            select(Invoice.id)
+            .where(*base, *_ilike_conditions(search.terms))
+            .order_by(rank.desc(), Invoice.id.desc())
+        )
+
+    indexed_terms = [term for term in search.terms if len(term) >= _TRIGRAM_MIN_LENGTH]
+    if dialect == 'sqlite' and fts_available and indexed_terms:
+        short_terms = [term for term in search.terms if len(term) < _TRIGRAM_MIN_LENGTH]
+        fts = literal_column('invoices_fts')
+        return (
+            select(Invoice.id)
+            .select_from(invoices_fts)
+            .join(Invoice, Invoice.id == invoices_fts.c.rowid)
+            .where(fts.op('MATCH')(_fts_match_expression(indexed_terms)), *base, *_ilike_conditions(short_terms))
+            .order_by(func.bm25(fts, *_FTS_WEIGHTS), Invoice.id.desc())
+        )
+
+    return (
+        select(Invoice.id)
+        .where(*base, *_ilike_conditions(search.terms))
+        .order_by(Invoice.submission_date.desc(), Invoice.id.desc())
+    )
+
+
+def search_statement(user_id, search):
+    """build_search_statement() for the current session's database."""
+    dialect = db.session.get_bind().dialect.name
+    fts_available = dialect == 'sqlite' and _has_fts_table()
+    return build_search_statement(user_id, search, dialect, fts_available)
+
+
+def ranked_invoice_ids(user_id, search, offset, limit):
+    """Ids of the vendor's matches for `search` ranked offset+1 to offset+limit, best first."""
+    stmt = search_statement(user_id, search).offset(offset).limit(limit)
+    return db.session.execute(stmt).scalars().all()
+
+
+def count_matches(user_id, search):
+    """How many of the vendor's invoices match `search`."""
+    matches = search_statement(user_id, search).order_by(None).subquery()
+    return db.session.execute(select(func.count()).select_from(matches)).scalar()
+
+
+def install_search_index(connection):
+    """
+    Creates the search structures for the connection's database if they are
+    missing and (on SQLite) re-indexes existing invoices, replacing an index
+    built with an older tokenizer. Safe to re-run. Returns the dialect name,
+    or None if this database can't have the index (SQLite before 3.34).
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        if not _sqlite_supports_trigram(bind=connection):
+            return None
+        if 'trigram' not in (_fts_table_sql(connection) or 'trigram'):
+            for statement in _SQLITE_DROP_DDL:
+                connection.execute(text(statement))
+        for statement in _SQLITE_DDL:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO invoices_fts(invoices_fts) VALUES ('rebuild')"))
+        _fts_available.clear()
+    elif dialect == 'postgresql':
+        for statement in _POSTGRES_DDL:
+            connection.execute(text(statement))
+    return dialect
+
+
+# New databases get the index together with the invoices table.
+for _statement in _SQLITE_DDL:
+    event.listen(Invoice.__table__, 'after_create',
+                 DDL(_statement).execute_if(dialect='sqlite', callable_=_sqlite_supports_trigram))
+for _statement in _POSTGRES_DDL:
+    event.listen(Invoice.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
@@ -0,0 +1,371 @@
+from flask import current_app
+from .metrics import SMS, SMS_DELIVERY
+import atexit
+import heapq
+import itertools
+import random
+import threading
+import time
+import traceback
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:  # requests is only needed to actually send SMS
+    requests = None
+
+
+# --- Outbound SMS ---
+# send_sms() only queues the message, so a request (an OTP login or signup)
+# never waits on Twilio. A few sender threads share one pooled HTTP session
+# and drain the queue:
+#   - SMS_WORKERS caps how many Twilio calls are in flight at once;
+#   - a token bucket keeps the send rate under SMS_RATE_PER_SECOND, with
+#     bursts of SMS_BURST;
+#   - network errors, 429s and 5xxs are retried with exponential backoff and
+#     jitter (honouring Retry-After), up to SMS_MAX_ATTEMPTS;
+#   - after SMS_CIRCUIT_FAILURES failures in a row the circuit opens and no
+#     calls are made for SMS_CIRCUIT_RESET_SECONDS; then a single probe
+#     decides whether it closes again. Messages wait in the queue meanwhile.
+# A message not sent within SMS_MAX_AGE_SECONDS is dropped as expired: an
+# OTP that arrives after it has expired is of no use. For the same reason
+# the queue is in memory rather than in the jobs table; messages still
+# queued when a worker process exits are lost and the user asks for a new
+# code. A timed-out call may have reached Twilio, so a retry can
+# occasionally deliver a text twice.
+# The queue, the token bucket and the circuit breaker all belong to one
+# process: nothing is shared between web workers. Each process sends up to
+# SMS_RATE_PER_SECOND on its own, so the rate has to be set to the sending
+# number's throughput divided by the number of processes (see app/config.py),
+# and each process trips its own breaker.
+
+
+class SmsError(Exception):
+    """Twilio did not accept a message. `retryable` says whether trying again can help."""
+
+    def __init__(self, message, status=None, code=None, retryable=False, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class SmsQueueFull(Exception):
+    """More than SMS_QUEUE_SIZE messages are waiting; the caller should ask the user to try again."""
+
+
+def _mask(number):
+    return f"***{number[-4:]}" if number else '(none)'
+
+
+class TwilioClient:
+    """Minimal client for Twilio's Messages API over a pooled, keep-alive HTTP session."""
+
+    def __init__(self, account_sid, auth_token, from_number, base_url='https://api.twilio.com',
+                 pool_size=4, timeout=(3.05, 10)):
+        if requests is None:
+            raise RuntimeError('Sending SMS requires the requests package.')
+        self.from_number = from_number
+        self.timeout = timeout
+        self.url = f"{base_url.rstrip('/')}/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self.session = requests.Session()
+        self.session.auth = (account_sid, auth_token)
+        # Retries are the dispatcher's job, with backoff and the circuit breaker.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def send(self, to, body):
+        """Returns the message SID. Raises SmsError."""
+        try:
+            response = self.session.post(self.url, data={'To': to, 'From': self.from_number, 'Body': body},
+                                         timeout=self.timeout)
+        except requests.RequestException as e:
+            raise SmsError(f"{type(e).__name__}: {e}", retryable=True)
+
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {}
+        if response.status_code in (200, 201):
+            return payload.get('sid')
+
+        retry_after = response.headers.get('Retry-After')
+        raise SmsError(
+            payload.get('message') or f"HTTP {response.status_code}",
+            status=response.status_code,
+            code=payload.get('code'),
+            retryable=response.status_code == 429 or response.status_code >= 500,
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+        )
+
+
+class TokenBucket:
+    """
+    Paces calls to `rate` per second on average, allowing bursts of
+    `capacity`. Shared by the threads of one process only. A rate of 0
+    or less means no limit.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token and returns how many seconds the caller must wait before
+        using it (0 if one was available). Tokens may be reserved ahead, so
+        concurrent callers queue up in order instead of polling.
+        """
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing provider: opens after `failure_threshold`
+    failures in a row, then lets one probe through every `reset_timeout`
+    seconds until a call succeeds.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """0 if a call may go ahead now, else the number of seconds to wait."""
+        with self._lock:
+            if self.state == 'closed':
+                return 0
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if self._probing:
+                return min(1.0, self.reset_timeout)
+            self.state = 'half-open'
+            self._probing = True
+            return 0
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half-open' or self._failures >= self.failure_threshold:
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class SmsMessage:
+    """A queued text. `status` goes from 'queued' to 'sent', 'failed' or 'expired'."""
+
+    def __init__(self, to, body):
+        self.to = to
+        self.body = body
+        self.status = 'queued'
+        self.sid = None
+        self.error = None
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Blocks until the message is sent or given up on (or `timeout` passes); returns the status."""
+        self._done.wait(timeout)
+        return self.status
+
+    def _finish(self, status, sid=None, error=None):
+        self.status = status
+        self.sid = sid
+        self.error = error
+        self.body = None  # don't keep OTP codes around
+        self._done.set()
+
+
+class SmsDispatcher:
+    """
+    Sends queued SMS from SMS_WORKERS background threads (see the notes at
+    the top of this module). The threads start with the first message.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.client = None
+        self.bucket = None
+        self.breaker = None
+        self._queue = []  # heap of (due, sequence, SmsMessage)
+        self._sequence = itertools.count()
+        self._workers = []
+        self._ready = threading.Condition()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['sms_dispatcher'] = self
+
+    @property
+    def pending(self):
+        return len(self._queue)
+
+    def ensure_started(self):
+        if self._workers:
+            return
+        with self._lock:
+            if self._workers:
+                return
+            config = self.app.config
+            workers = config.get('SMS_WORKERS', 4)
+            if self.client is None:
+                self.client = TwilioClient(
+                    config['TWILIO_ACCOUNT_SID'], config.get('TWILIO_AUTH_TOKEN'), config.get('TWILIO_PHONE_NUMBER'),
+                    base_url=config.get('TWILIO_API_URL', 'https://api.twilio.com'), pool_size=workers,
+                    timeout=(config.get('SMS_CONNECT_TIMEOUT', 3.05), config.get('SMS_READ_TIMEOUT', 10)))
+            # Per process (see the notes at the top of this module)
+            self.bucket = TokenBucket(config.get('SMS_RATE_PER_SECOND', 1.0), config.get('SMS_BURST', 5))
+            self.breaker = CircuitBreaker(config.get('SMS_CIRCUIT_FAILURES', 5), config.get('SMS_CIRCUIT_RESET_SECONDS', 30))
+            for n in range(workers):
+                worker = threading.Thread(target=self._run, name=f"sms-sender-{n}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            atexit.register(self.shutdown)
+            self.app.logger.info(f"SMS sender started: {workers} thread(s), at most {self.bucket.rate}/s "
+                                 f"(bursts of {self.bucket.capacity}) from this process")
+
+    def send(self, to, body):
+        """Queues a text and returns its SmsMessage at once. Raises SmsQueueFull."""
+        self.ensure_started()
+        message = SmsMessage(to, body)
+        with self._ready:
+            if len(self._queue) >= self.app.config.get('SMS_QUEUE_SIZE', 1000):
+                SMS.inc('rejected')
+                raise SmsQueueFull(f"{len(self._queue)} SMS already queued")
+            self._push(message, 0)
+        return message
+
+    def shutdown(self, timeout=5):
+        self._stop.set()
+        with self._ready:
+            self._ready.notify_all()
+        for worker in self._workers:
+            if worker is not threading.current_thread():
+                worker.join(timeout)
+        if self._queue:
+            self.app.logger.warning(f"{len(self._queue)} queued SMS were not sent before shutdown")
+
+    def _push(self, message, delay):
+        heapq.heappush(self._queue, (time.monotonic() + delay, next(self._sequence), message))
+        self._ready.notify()
+
+    def _schedule(self, message, delay):
+        with self._ready:
+            self._push(message, delay)
+
+    def _next_message(self):
+        with self._ready:
+            while not self._stop.is_set():
+                if not self._queue:
+                    self._ready.wait()
+                    continue
+                wait = self._queue[0][0] - time.monotonic()
+                if wait <= 0:
+                    return heapq.heappop(self._queue)[2]
+                self._ready.wait(wait)
+        return None
+
+    def _run(self):
+        while True:
+            message = self._next_message()
+            if message is None:
+                return
+            try:
+                self._attempt(message)
+            except Exception as e:
+                message._finish('failed', error=f"{type(e).__name__}: {e}")
+                SMS.inc('failed')
+                self.app.logger.error(f"SMS sender error: {e}\n{traceback.format_exc()}")
+
+    def _attempt(self, message):
+        config = self.app.config
+        if time.monotonic() - message.queued_at > config.get('SMS_MAX_AGE_SECONDS', 300):
+            message._finish('expired', error=message.error)
+            SMS.inc('expired')
+            self.app.logger.warning(f"SMS to {_mask(message.to)} expired after {message.attempts} attempt(s)")
+            return
+
+        wait = self.breaker.before_call()
+        if wait:
+            self._schedule(message, wait)
+            return
+        delay = self.bucket.reserve()
+        if delay:
+            time.sleep(delay)
+
+        message.attempts += 1
+        error = None
+        provider_up = False
+        try:
+            sid = self.client.send(message.to, message.body)
+            provider_up = True
+        except SmsError as e:
+            error = e
+            # A 429 or a 4xx means Twilio is up; only outages trip the breaker.
+            provider_up = not e.retryable or e.status == 429
+        finally:
+            # Whatever send() raised, the breaker hears about it; otherwise a
+            # half-open probe would stay outstanding and the circuit stuck.
+            if provider_up:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+        if error is not None:
+            message.error = str(error)
+            if error.retryable and message.attempts < config.get('SMS_MAX_ATTEMPTS', 5):
+                SMS.inc('retried')
+                self._schedule(message, max(self._backoff(message.attempts), error.retry_after or 0))
+                return
+            message._finish('failed', error=str(error))
+            SMS.inc('failed')
+            self.app.logger.warning(f"SMS to {_mask(message.to)} failed after {message.attempts} attempt(s): {error}")
+            return
+
+        message._finish('sent', sid=sid)
+        SMS.inc('sent')
+        SMS_DELIVERY.observe(time.monotonic() - message.queued_at)
+
+    def _backoff(self, attempts):
+        # Same shape as JobQueue._backoff: exponential, capped, with jitter.
+        base = self.app.config.get('SMS_RETRY_BASE_SECONDS', 1.0)
+        cap = self.app.config.get('SMS_RETRY_MAX_SECONDS', 30.0)
+        return min(cap, base * (2 ** (attempts - 1))) * random.uniform(0.5, 1.0)
+
+
+sms_dispatcher = SmsDispatcher()
+
+
+def send_sms(to, body):
+    """Queues a text message for delivery; see SmsDispatcher.send()."""
+    return current_app.extensions['sms_dispatcher'].send(to, body)
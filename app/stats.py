@@ -0,0 +1,183 @@
+from .models import db, Invoice, VendorInvoiceStats
+from sqlalchemy import event, select, update, insert, delete, func, case
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, attributes
+
+
+# Invoice status -> counter column on VendorInvoiceStats
+STATUS_COLUMNS = {
+    'In Review': 'in_review_count',
+    'Approved': 'approved_count',
+    'Paid': 'paid_count',
+    'Rejected': 'rejected_count',
+}
+STAT_COLUMNS = ('invoice_count', *STATUS_COLUMNS.values(), 'paid_total')
+
+_PENDING_KEY = 'vendor_invoice_stats_deltas'
+
+
+def aggregate_columns():
+    """
+    Labelled aggregate expressions over Invoice that produce the same values
+    as the VendorInvoiceStats columns. Used for rebuilds and as a fallback.
+    """
+    columns = [func.count(Invoice.id).label('invoice_count')]
+    for status, column in STATUS_COLUMNS.items():
+        columns.append(func.coalesce(func.sum(case((Invoice.status == status, 1), else_=0)), 0).label(column))
+    columns.append(func.coalesce(
+        func.sum(case((Invoice.status == 'Paid', Invoice.invoice_amount), else_=0)), 0
+    ).label('paid_total'))
+    return columns
+
+
+def _contribution(status, amount, sign):
+    """How much a single invoice adds to (or removes from) its vendor's stats."""
+    delta = {'invoice_count': sign}
+    column = STATUS_COLUMNS.get(status)
+    if column:
+        delta[column] = sign
+    if status == 'Paid':
+        delta['paid_total'] = sign * float(amount or 0.0)
+    return delta
+
+
+def _previous_value(obj, key):
+    history = attributes.get_history(obj, key)
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, key)
+
+
+def _owner_id(invoice):
+    if invoice.user_id is not None:
+        return invoice.user_id
+    return invoice.user.id if invoice.user is not None else None
+
+
+def _merge(deltas, user_id, delta):
+    if user_id is None:
+        return
+    totals = deltas.setdefault(user_id, {})
+    for column, value in delta.items():
+        totals[column] = totals.get(column, 0) + value
+
+
+_TRACKED_ATTRIBUTES = ('status', 'invoice_amount', 'user_id')
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+# active_history makes SQLAlchemy load the old value before an expired
+# attribute is overwritten, so the delta below can subtract it.
+for _key in _TRACKED_ATTRIBUTES:
+    event.listen(getattr(Invoice, _key), 'set', _keep_previous_value, active_history=True, retval=True)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_invoice_deltas(session, flush_context, instances):
+    """Works out per-vendor stat deltas while the old attribute values are still known."""
+    deltas = session.info.setdefault(_PENDING_KEY, {})
+    default_status = Invoice.__table__.c.status.default.arg
+
+    for obj in session.new:
+        if isinstance(obj, Invoice):
+            _merge(deltas, _owner_id(obj), _contribution(obj.status or default_status, obj.invoice_amount, 1))
+
+    for obj in session.deleted:
+        if isinstance(obj, Invoice):
+            _merge(deltas, _owner_id(obj), _contribution(obj.status, obj.invoice_amount, -1))
+
+    for obj in session.dirty:
+        if not isinstance(obj, Invoice) or not session.is_modified(obj):
+            continue
+        state = attributes.instance_state(obj)
+        if not any(state.attrs[key].history.has_changes() for key in _TRACKED_ATTRIBUTES):
+            continue
+        _merge(deltas, _previous_value(obj, 'user_id'), _contribution(
+            _previous_value(obj, 'status'), _previous_value(obj, 'invoice_amount'), -1))
+        _merge(deltas, _owner_id(obj), _contribution(obj.status, obj.invoice_amount, 1))
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_invoice_deltas(session, flush_context):
+    """Applies the collected deltas in the same transaction as the invoice writes."""
+    deltas = session.info.pop(_PENDING_KEY, None)
+    if deltas:
+        _apply_deltas(session.connection(), deltas)
+
+
+def _apply_deltas(connection, deltas):
+    table = VendorInvoiceStats.__table__
+    for user_id, delta in deltas.items():
+        delta = {column: value for column, value in delta.items() if value}
+        if not delta:
+            continue
+
+        values = {column: table.c[column] + value for column, value in delta.items()}
+        result = connection.execute(update(table).where(table.c.user_id == user_id).values(**values))
+        if result.rowcount:
+            continue
+
+        # No summary row yet: seed it from the invoices table, which already
+        # includes the rows flushed above. A concurrent request may win the
+        # insert, in which case its row is current and the delta is applied.
+        try:
+            with connection.begin_nested():
+                connection.execute(_insert_from_invoices(user_id))
+        except IntegrityError:
+            connection.execute(update(table).where(table.c.user_id == user_id).values(**values))
+
+
+def apply_bulk_inserts(session, rows):
+    """
+    Counts invoices written with a bulk INSERT (which the flush hooks above
+    never see) into the stats, in the caller's transaction. `rows` are the
+    inserted parameter dicts; missing statuses count as the column default.
+    """
+    default_status = Invoice.__table__.c.status.default.arg
+    deltas = {}
+    for row in rows:
+        _merge(deltas, row['user_id'], _contribution(row.get('status') or default_status, row['invoice_amount'], 1))
+    if deltas:
+        _apply_deltas(session.connection(), deltas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invoice_deltas(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _insert_from_invoices(user_id=None):
+    query = select(Invoice.user_id, *aggregate_columns()).group_by(Invoice.user_id)
+    if user_id is not None:
+        query = query.where(Invoice.user_id == user_id)
+    return insert(VendorInvoiceStats.__table__).from_select(['user_id', *STAT_COLUMNS], query)
+
+
+def find_stats_drift():
+    """
+    Compares the stored summary rows against a fresh aggregation.
+    Returns a list of (user_id, column, stored, actual) tuples.
+    """
+    actual = {row.user_id: row for row in db.session.execute(
+        select(Invoice.user_id, *aggregate_columns()).group_by(Invoice.user_id)
+    )}
+    stored = {row.user_id: row for row in db.session.execute(select(VendorInvoiceStats.__table__))}
+
+    drift = []
+    for user_id in sorted(actual.keys() | stored.keys()):
+        for column in STAT_COLUMNS:
+            stored_value = getattr(stored[user_id], column) if user_id in stored else 0
+            actual_value = getattr(actual[user_id], column) if user_id in actual else 0
+            if abs((stored_value or 0) - (actual_value or 0)) > 1e-6:
+                drift.append((user_id, column, stored_value, actual_value))
+    return drift
+
+
+def rebuild_stats():
+    """Recomputes every summary row from the invoices table."""
+    db.session.execute(delete(VendorInvoiceStats.__table__))
+    db.session.execute(_insert_from_invoices())
+    db.session.commit()
@@ -0,0 +1,45 @@
+from jinja2 import FileSystemBytecodeCache, TemplateSyntaxError
+import os
+
+
+# --- Template bytecode cache ---
+# Jinja normally parses and compiles every template to Python code the first
+# time each worker renders it, which for the large vendor forms and
+# base.html is a noticeable part of a fresh worker's first requests. With
+# the bytecode cache the compiled code is written to TEMPLATE_CACHE_DIR and
+# later workers just load it. Entries are keyed by template name and source
+# checksum, so an edited template is recompiled automatically.
+# `flask templates compile` fills the cache at deploy time.
+
+
+def template_cache_dir(app):
+    return app.config.get('TEMPLATE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja-cache')
+
+
+def init_template_cache(app):
+    """Installs the bytecode cache. Must run before app.jinja_env is first used."""
+    if not app.config.get('TEMPLATE_BYTECODE_CACHE', True):
+        return
+    directory = template_cache_dir(app)
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        app.logger.warning(f"Template bytecode cache disabled, cannot create {directory}: {e}")
+        return
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(directory)}
+
+
+def precompile_templates(app):
+    """
+    Compiles every template the app can load (which also stores it in the
+    bytecode cache, if enabled). Returns (compiled names, [(name, error)]).
+    """
+    compiled, errors = [], []
+    for name in app.jinja_env.list_templates():
+        try:
+            app.jinja_env.get_template(name)
+        except (TemplateSyntaxError, UnicodeDecodeError) as e:
+            errors.append((name, e))
+        else:
+            compiled.append(name)
+    return compiled, errors
@@ -0,0 +1,8 @@
+/** Tailwind build for 'flask assets build'; classes are purged against the templates. */
+module.exports = {
+  content: ['../app/templates/**/*.html'],
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+};
@@ -0,0 +1 @@
+"""Standalone performance benchmarks. Each module runs with `python -m benchmarks.<name>`."""
@@ -0,0 +1,143 @@
+"""
+Bulk invoice import benchmark: N invoices uploaded one POST /upload-invoices
+at a time, against one POST /upload-invoices/bulk with a ZIP archive and
+one with a manifest plus N file parts.
+
+    python -m benchmarks.bulk_import
+    python -m benchmarks.bulk_import --invoices 500 --runs 5
+    python -m benchmarks.bulk_import --database-uri postgresql://.../scratch
+
+Requests go through Flask's test client, so the numbers are server-side
+time only. Each run uses a fresh vendor; every invoice gets distinct file
+content so the blob store cannot deduplicate. The target database is
+created from scratch, so never point it at a real one.
+"""
+from io import BytesIO
+import argparse
+import os
+import secrets
+import shutil
+import statistics
+import tempfile
+import time
+import zipfile
+
+from benchmarks import portal
+
+
+def _pdf(n):
+    return portal.SAMPLE_PDF + f"% invoice {n}\n".encode()
+
+
+def _rows(prefix, count):
+    return [dict(invoice_number=f"{prefix}-{n:05d}", po_number=f"PO-{n:05d}",
+                 amount=f"{1000 + n}.50", description='bulk import benchmark', file=f"invoice-{n:05d}.pdf")
+            for n in range(count)]
+
+
+def _manifest_csv(rows):
+    lines = ['invoice_number,po_number,amount,description,file']
+    lines += [f"{r['invoice_number']},{r['po_number']},{r['amount']},{r['description']},{r['file']}" for r in rows]
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def _client(app, user_id):
+    """A test client logged in as the vendor, with the CSRF token the upload endpoints expect."""
+    from itsdangerous import URLSafeTimedSerializer
+    raw_token = secrets.token_hex(20)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['csrf_token'] = raw_token
+    token = URLSafeTimedSerializer(app.secret_key, salt='wtf-csrf-token').dumps(raw_token)
+    return client, token
+
+
+def sequential(app, user_id, count):
+    client, _ = _client(app, user_id)
+    rows = _rows(f"S{user_id}", count)
+    started = time.perf_counter()
+    for n, row in enumerate(rows):
+        response = client.post('/upload-invoices', content_type='multipart/form-data', data={
+            'invoice_number': row['invoice_number'], 'po_number': row['po_number'],
+            'invoice_amount': row['amount'], 'description': row['description'],
+            'invoice_file': (BytesIO(_pdf(n)), row['file']),
+        })
+        if response.status_code != 302:
+            raise RuntimeError(f"Upload {n} failed with HTTP {response.status_code}")
+    return time.perf_counter() - started
+
+
+def bulk_zip(app, user_id, count):
+    client, token = _client(app, user_id)
+    rows = _rows(f"Z{user_id}", count)
+    archive = BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('manifest.csv', _manifest_csv(rows))
+        for n, row in enumerate(rows):
+            zf.writestr(row['file'], _pdf(n))
+    archive.seek(0)
+
+    started = time.perf_counter()
+    response = client.post('/upload-invoices/bulk', content_type='multipart/form-data',
+                           headers={'X-CSRFToken': token}, data={'archive': (archive, 'invoices.zip')})
+    elapsed = time.perf_counter() - started
+    _check(response, count)
+    return elapsed
+
+
+def bulk_multipart(app, user_id, count):
+    client, token = _client(app, user_id)
+    rows = _rows(f"M{user_id}", count)
+    data = {'manifest': (BytesIO(_manifest_csv(rows)), 'manifest.csv'),
+            'files': [(BytesIO(_pdf(n)), row['file']) for n, row in enumerate(rows)]}
+
+    started = time.perf_counter()
+    response = client.post('/upload-invoices/bulk', content_type='multipart/form-data',
+                           headers={'X-CSRFToken': token}, data=data)
+    elapsed = time.perf_counter() - started
+    _check(response, count)
+    return elapsed
+
+
+def _check(response, count):
+    body = response.get_json(silent=True) or {}
+    if response.status_code != 200 or body.get('created') != count:
+        raise RuntimeError(f"Bulk import returned HTTP {response.status_code}: "
+                           f"{body.get('message') or body.get('results', [])[:3]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--invoices', type=int, default=200, help='invoices per import')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--database-uri')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='bulk-import-bench-')
+    database_uri = args.database_uri or f"sqlite:///{os.path.join(scratch, 'portal.db')}"
+    portal.configure_environment(database_uri, os.path.join(scratch, 'uploads'))
+    try:
+        app = portal.server_app()
+        app.config.update(BULK_IMPORT_MAX_ROWS=max(args.invoices, 500))
+        modes = (('sequential uploads', sequential), ('bulk (ZIP)', bulk_zip), ('bulk (multipart)', bulk_multipart))
+        # A fresh, registered vendor for every run of every mode
+        seeded = portal.seed(app, users=len(modes) * args.runs, invoices_per_user=1, registered_ratio=1.0, fresh_users=0)
+        vendors = iter(seeded['registered_users'])
+
+        results = {}
+        for label, run in modes:
+            results[label] = [run(app, next(vendors), args.invoices) for _ in range(args.runs)]
+
+        baseline = statistics.median(results['sequential uploads'])
+        print(f"{args.invoices} invoices, median of {args.runs} runs ({database_uri.split(':', 1)[0]}, test client)")
+        print(f"{'mode':<20} {'total ms':>10} {'ms/invoice':>11} {'speedup':>8}")
+        for label, timings in results.items():
+            median = statistics.median(timings)
+            print(f"{label:<20} {median * 1000:>10.1f} {median * 1000 / args.invoices:>11.2f} {baseline / median:>7.1f}x")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
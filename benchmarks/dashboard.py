@@ -0,0 +1,137 @@
+"""
+Dashboard benchmark: SQL round trips and latency of the dashboard data for
+a vendor with many invoices, comparing the queries the dashboard used to
+run with get_dashboard_summary() (app/main/dashboard.py).
+
+    python -m benchmarks.dashboard
+    python -m benchmarks.dashboard --invoices 100000 --vendors 4 --repeat 20
+    python -m benchmarks.dashboard --database-uri postgresql://.../scratch
+
+Scenarios, all for vendor 1:
+  old queries       the per-status GROUP BY, paid SUM, two recent-invoice
+                    queries and four vendor form lookups (two in the route,
+                    two in the inject_form_status context processor)
+  summary           get_dashboard_summary() reading vendor_invoice_stats
+  summary, no stats the same without a vendor_invoice_stats row, which
+                    falls back to aggregating the invoices
+  GET /dashboard    the whole page through the test client (page cache
+                    off), including the user load and template rendering
+Round trips are counted with a cursor-execute listener on the engine. The
+target database is created from scratch, so never point it at a real one.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks import portal
+
+
+def _old_dashboard_data(user_id):
+    """The dashboard's queries before get_dashboard_summary()."""
+    from app.models import db, Invoice, VendorMaterial, VendorWork
+    from sqlalchemy import func
+
+    counts = dict(db.session.query(Invoice.status, func.count(Invoice.status))
+                  .filter_by(user_id=user_id).group_by(Invoice.status).all())
+    total_business_value = db.session.query(func.sum(Invoice.invoice_amount))\
+        .filter(Invoice.user_id == user_id, Invoice.status == 'Paid').scalar() or 0.0
+    recent_payments = Invoice.query.filter(Invoice.user_id == user_id, Invoice.status == 'Paid',
+                                           Invoice.payment_date != None)\
+        .order_by(Invoice.payment_date.desc()).limit(2).all()
+    recent_invoices = Invoice.query.filter_by(user_id=user_id).order_by(Invoice.submission_date.desc()).limit(2).all()
+    material_form = VendorMaterial.query.filter_by(user_id=user_id).first()
+    work_form = VendorWork.query.filter_by(user_id=user_id).first()
+    # inject_form_status looked both forms up again for the base template
+    material_form_filled = VendorMaterial.query.filter_by(user_id=user_id).first() is not None
+    work_form_filled = VendorWork.query.filter_by(user_id=user_id).first() is not None
+    return (counts, total_business_value, recent_payments, recent_invoices, material_form, work_form,
+            material_form_filled, work_form_filled)
+
+
+def _new_dashboard_data(user_id):
+    from app.main.dashboard import get_dashboard_summary
+    return get_dashboard_summary(user_id)
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def _measure(counter, call, repeat):
+    """(round trips of one call, median ms, max ms) over `repeat` calls after a warm-up."""
+    from app.models import db
+
+    call()
+    db.session.expire_all()
+    timings, trips = [], set()
+    for _ in range(repeat):
+        before = counter.count
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+        trips.add(counter.count - before)
+        db.session.expire_all()
+    return max(trips), statistics.median(timings), max(timings)
+
+
+def _page(client):
+    def call():
+        response = client.get('/dashboard')
+        if response.status_code != 200:
+            raise RuntimeError(f"/dashboard returned HTTP {response.status_code}")
+    return call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--invoices', type=int, default=100000, help='invoices per vendor')
+    parser.add_argument('--vendors', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--database-uri')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='dashboard-bench-')
+    database_uri = args.database_uri or f"sqlite:///{os.path.join(scratch, 'portal.db')}"
+    portal.configure_environment(database_uri, os.path.join(scratch, 'uploads'))
+    try:
+        app = portal.server_app()
+        started = time.perf_counter()
+        portal.seed(app, users=args.vendors, invoices_per_user=args.invoices, registered_ratio=1.0, fresh_users=0)
+        print(f"Seeded {args.vendors} x {args.invoices} invoices in {time.perf_counter() - started:.1f}s "
+              f"({database_uri.split(':', 1)[0]})")
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = 1
+
+        with app.app_context():
+            from app.models import db, VendorInvoiceStats
+            counter = StatementCounter(db.engine)
+            results = [
+                ('old queries', _measure(counter, lambda: _old_dashboard_data(1), args.repeat)),
+                ('summary', _measure(counter, lambda: _new_dashboard_data(1), args.repeat)),
+            ]
+            db.session.query(VendorInvoiceStats).filter_by(user_id=1).delete()
+            results.append(('summary, no stats', _measure(counter, lambda: _new_dashboard_data(1), args.repeat)))
+            db.session.rollback()
+            results.append(('GET /dashboard', _measure(counter, _page(client), args.repeat)))
+
+        baseline = results[0][1][1]
+        print(f"{'scenario':<18} {'round trips':>11} {'median ms':>10} {'max ms':>8} {'speedup':>8}")
+        for label, (trips, median, slowest) in results:
+            print(f"{label:<18} {trips:>11} {median:>10.2f} {slowest:>8.2f} {baseline / median:>7.1f}x")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Invoice export benchmark: time and peak Python memory for streaming CSV and
+XLSX exports (GET /all-invoices/export) as the vendor's invoice count grows.
+
+    python -m benchmarks.export_invoices
+    python -m benchmarks.export_invoices --rows 10000 100000 1000000 --formats csv
+    python -m benchmarks.export_invoices --database-uri postgresql://.../scratch
+
+Peak memory is measured with tracemalloc while the response body is read
+chunk by chunk through the test client, so it covers the query, the
+row formatting and the writer, but not the database driver's C buffers.
+Flat peaks across row counts mean the export does not hold all rows in
+memory. tracemalloc slows the allocation-heavy XLSX writer a lot, so use
+the timings to compare row counts, not as absolute throughput. The target
+database is created from scratch, so never point it at a real one.
+"""
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import portal
+
+
+def _fill(app, user_id, total, batch_size=20000):
+    """Tops the vendor up to `total` invoices with bulk inserts."""
+    from app.models import db, Invoice
+    from sqlalchemy import insert, func, select
+
+    rng = random.Random(total)
+    start = datetime(2023, 1, 1)
+    with app.app_context():
+        existing = db.session.execute(select(func.count(Invoice.id)).where(Invoice.user_id == user_id)).scalar()
+        for offset in range(existing, total, batch_size):
+            rows = []
+            for n in range(offset, min(offset + batch_size, total)):
+                status = rng.choice(('In Review', 'Approved', 'Paid', 'Rejected'))
+                rows.append(dict(
+                    invoice_number=f"EXP-{n:07d}", po_number=f"PO-{rng.randint(10000, 99999)}",
+                    invoice_amount=round(rng.uniform(500, 500000), 2),
+                    description=' '.join(rng.sample(portal.WORDS, 4)), file_path=f"{n:032x}_invoice.pdf",
+                    submission_date=start + timedelta(minutes=n), status=status, user_id=user_id,
+                    payment_date=start + timedelta(minutes=n + 600) if status == 'Paid' else None,
+                ))
+            db.session.execute(insert(Invoice), rows)
+            db.session.commit()
+
+
+def _measure(client, path):
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(path, buffered=False)
+    size = 0
+    for chunk in response.response:
+        size += len(chunk)
+    response.close()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if response.status_code != 200:
+        raise RuntimeError(f"{path} returned HTTP {response.status_code}")
+    return elapsed, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--formats', nargs='+', default=['csv', 'xlsx'], choices=['csv', 'xlsx'])
+    parser.add_argument('--database-uri')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='export-bench-')
+    database_uri = args.database_uri or f"sqlite:///{os.path.join(scratch, 'portal.db')}"
+    portal.configure_environment(database_uri, os.path.join(scratch, 'uploads'))
+    try:
+        app = portal.server_app()
+        portal.seed(app, users=1, invoices_per_user=1, registered_ratio=1.0, fresh_users=0)
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = 1
+
+        print(f"{'rows':>9} {'format':>7} {'seconds':>9} {'rows/s':>10} {'MB out':>8} {'peak MB':>8}")
+        for rows in sorted(args.rows):
+            _fill(app, 1, rows)
+            for export_format in args.formats:
+                elapsed, peak, size = _measure(client, f"/all-invoices/export?format={export_format}")
+                print(f"{rows:>9} {export_format:>7} {elapsed:>9.2f} {rows / elapsed:>10.0f} "
+                      f"{size / 1e6:>8.1f} {peak / 1e6:>8.2f}")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
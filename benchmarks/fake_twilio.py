@@ -0,0 +1,172 @@
+"""
+Local stand-in for Twilio's Messages API, so app/sms.py can be exercised
+without a network or a Twilio account.
+
+    python -m benchmarks.fake_twilio --port 8099 --latency 0.2 --error-rate 0.1 --rate 10
+    TWILIO_API_URL=http://127.0.0.1:8099 flask sms send --to +15550001111
+
+Answers POST /2010-04-01/Accounts/<sid>/Messages.json the way Twilio does:
+201 with a message resource, 401 for wrong credentials, 400 (code 21211)
+for a To number that isn't E.164, 429 (code 20429) when more than --rate
+messages arrive in a second, and 500 for --error-rate of the requests or
+503 for all of them while the server is marked down. GET /stats returns
+the counters as JSON.
+"""
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+_MESSAGES_PATH = re.compile(r'^/2010-04-01/Accounts/(?P<sid>[^/]+)/Messages\.json$')
+_E164 = re.compile(r'^\+[1-9]\d{6,14}$')
+
+
+class FakeTwilio:
+    def __init__(self, account_sid=None, auth_token=None, latency=0.0, error_rate=0.0, rate=0.0, seed=None):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate = rate
+        self.down = False
+        self.messages = []  # (monotonic time, to) of accepted messages
+        self.stats = dict(requests=0, accepted=0, invalid=0, unauthorized=0, rate_limited=0, errors=0,
+                          connections=0, in_flight=0, max_in_flight=0)
+        self._random = random.Random(seed)
+        self._window = deque()
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self, port=0):
+        """Serves in a background thread; returns the base URL."""
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), _handler(self))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='fake-twilio', daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+            if key == 'in_flight':
+                self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+
+    def _over_rate(self):
+        if self.rate <= 0:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._window and self._window[0] <= now - 1.0:
+                self._window.popleft()
+            if len(self._window) >= self.rate:
+                return True
+            self._window.append(now)
+            return False
+
+    def handle_message(self, sid, authorization, form):
+        """Returns (status, JSON body, extra headers) for a Messages API request."""
+        if self.auth_token is not None:
+            expected = 'Basic ' + base64.b64encode(f"{self.account_sid}:{self.auth_token}".encode()).decode()
+            if authorization != expected or sid != self.account_sid:
+                self._count('unauthorized')
+                return 401, {'code': 20003, 'message': 'Authenticate', 'status': 401}, {}
+        if self.down:
+            self._count('errors')
+            return 503, {'code': 20503, 'message': 'Service unavailable', 'status': 503}, {}
+        if self._over_rate():
+            self._count('rate_limited')
+            return 429, {'code': 20429, 'message': 'Too Many Requests', 'status': 429}, {'Retry-After': '1'}
+        if self.error_rate and self._random.random() < self.error_rate:
+            self._count('errors')
+            return 500, {'code': 20500, 'message': 'Internal Server Error', 'status': 500}, {}
+        to = form.get('To', [''])[0]
+        if not _E164.match(to):
+            self._count('invalid')
+            return 400, {'code': 21211, 'message': f"The 'To' number {to} is not a valid phone number.",
+                         'status': 400}, {}
+        with self._lock:
+            self.stats['accepted'] += 1
+            self.messages.append((time.monotonic(), to))
+        return 201, {'sid': 'SM' + uuid.uuid4().hex, 'status': 'queued', 'to': to,
+                     'from': form.get('From', [''])[0], 'body': form.get('Body', [''])[0]}, {}
+
+
+def _handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, so connection pooling shows in the stats
+
+        def setup(self):
+            super().setup()
+            fake._count('connections')
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                with fake._lock:
+                    stats = dict(fake.stats)
+                self._reply(200, stats)
+            else:
+                self._reply(404, {'code': 20404, 'message': 'Not found', 'status': 404})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            form = parse_qs(self.rfile.read(length).decode())
+            match = _MESSAGES_PATH.match(self.path)
+            if not match:
+                self._reply(404, {'code': 20404, 'message': 'Not found', 'status': 404})
+                return
+            fake._count('requests')
+            fake._count('in_flight')
+            try:
+                if fake.latency:
+                    time.sleep(fake.latency)
+                status, payload, headers = fake.handle_message(match['sid'], self.headers.get('Authorization'), form)
+            finally:
+                fake._count('in_flight', -1)
+            self._reply(status, payload, headers)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 500')
+    parser.add_argument('--rate', type=float, default=0.0, help='messages per second before 429s (0: no limit)')
+    args = parser.parse_args()
+
+    fake = FakeTwilio(latency=args.latency, error_rate=args.error_rate, rate=args.rate)
+    print(f"Fake Twilio listening on {fake.start(args.port)} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
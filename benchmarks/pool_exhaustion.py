@@ -0,0 +1,115 @@
+"""
+Reproduces connection pool exhaustion and shows the effect of tuning.
+
+Each simulated request checks out a connection, runs a query and keeps the
+connection for --hold-ms (as a Flask-SQLAlchemy session does until the
+request ends). The same load runs twice: once with SQLAlchemy's default pool
+(5 connections + 10 overflow) and once with the --tuned settings.
+
+    python -m benchmarks.pool_exhaustion --workers 50 --hold-ms 100
+    python -m benchmarks.pool_exhaustion --database-uri postgresql://.../scratch \\
+        --tuned pool_size=40,max_overflow=20 --pool-timeout 1
+"""
+from app.db_pool import InstrumentedQueuePool, pool_snapshot
+from sqlalchemy import create_engine, exc, text
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+
+def _parse_options(spec):
+    options = {}
+    for item in filter(None, (spec or '').split(',')):
+        key, value = item.split('=', 1)
+        options[key.strip()] = float(value) if '.' in value else int(value)
+    return options
+
+
+def _run(uri, pool_options, workers, requests_per_worker, hold_seconds):
+    engine = create_engine(uri, poolclass=InstrumentedQueuePool, **pool_options)
+    latencies, errors = [], []
+
+    def simulated_request():
+        started = time.perf_counter()
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+                time.sleep(hold_seconds)
+        except exc.TimeoutError as e:
+            errors.append(e)
+            return
+        latencies.append(time.perf_counter() - started)
+
+    def worker():
+        for _ in range(requests_per_worker):
+            simulated_request()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in range(workers):
+            executor.submit(worker)
+    elapsed = time.perf_counter() - started
+
+    snapshot = pool_snapshot(engine)
+    engine.dispose()
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+    return {
+        'completed': len(latencies),
+        'timed_out': len(errors),
+        'throughput_rps': len(latencies) / elapsed,
+        'latency_ms': {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99),
+                       'mean': statistics.mean(latencies) * 1000 if latencies else 0.0},
+        'pool': snapshot,
+    }
+
+
+def _report(label, result):
+    pool = result['pool']
+    waits = pool['checkout_wait_seconds']
+    print(f"\n{label}: pool_size={pool['size']} max_overflow={pool['max_overflow']} timeout={pool['timeout_seconds']}s")
+    print(f"  completed {result['completed']}, timed out {result['timed_out']}, "
+          f"{result['throughput_rps']:.0f} req/s, peak connections in use {pool['peak_in_use']}")
+    print(f"  request latency ms  p50 {result['latency_ms']['p50']:.0f}  p95 {result['latency_ms']['p95']:.0f}  "
+          f"p99 {result['latency_ms']['p99']:.0f}")
+    print(f"  checkout wait ms    p50 {waits['p50'] * 1000:.0f}  p95 {waits['p95'] * 1000:.0f}  "
+          f"p99 {waits['p99'] * 1000:.0f}  max {pool['checkout_wait_seconds_max'] * 1000:.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=50, help='concurrent simulated requests')
+    parser.add_argument('--requests', type=int, default=10, help='requests per worker')
+    parser.add_argument('--hold-ms', type=float, default=100)
+    parser.add_argument('--pool-timeout', type=float, default=None,
+                        help='pool_timeout for both runs (SQLAlchemy default: 30s)')
+    parser.add_argument('--tuned', default=None,
+                        help="pool options for the second run, e.g. 'pool_size=50,max_overflow=10' "
+                             "(default: pool_size=--workers, max_overflow=10)")
+    parser.add_argument('--database-uri')
+    args = parser.parse_args()
+
+    path = None
+    uri = args.database_uri
+    if not uri:
+        fd, path = tempfile.mkstemp(suffix='.db', prefix='pool-bench-')
+        os.close(fd)
+        uri = f"sqlite:///{path}"
+
+    common = {'pool_timeout': args.pool_timeout} if args.pool_timeout is not None else {}
+    tuned = _parse_options(args.tuned) or {'pool_size': args.workers, 'max_overflow': 10}
+
+    try:
+        print(f"{args.workers} workers x {args.requests} requests, each holding a connection {args.hold_ms:.0f} ms")
+        _report('Default pool', _run(uri, common, args.workers, args.requests, args.hold_ms / 1000))
+        _report('Tuned pool', _run(uri, {**common, **tuned}, args.workers, args.requests, args.hold_ms / 1000))
+    finally:
+        if path:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,510 @@
+"""
+End-to-end benchmark for the vendor portal.
+
+Seeds a scratch database with vendors, invoices, vendor forms and stored
+documents, then measures throughput and p50/p95/p99 latency for the main
+vendor routes, either through Flask's test client (in-process, no network)
+or over HTTP against a multi-worker WSGI server (gunicorn if installed,
+otherwise Werkzeug's threaded server).
+
+    python -m benchmarks.portal
+    python -m benchmarks.portal --users 200 --invoices-per-user 500 --server --workers 4 --concurrency 16
+    python -m benchmarks.portal --database-uri postgresql://.../scratch --save-baseline
+
+Results are written to --output as JSON and compared with --baseline;
+the run fails (exit code 1) if any scenario's p95 latency rose, or its
+throughput fell, by more than --threshold.
+
+Twilio settings are stubbed and background jobs are disabled. The target
+database is created from scratch, so never point it at a real one.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from io import BytesIO
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+SAMPLE_PDF = (b"%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+              b"2 0 obj << /Type /Pages /Kids [] /Count 0 >> endobj\n"
+              b"trailer << /Root 1 0 R >>\n%%EOF\n")
+
+WORDS = ('cement steel rebar labour transport scaffolding excavation plumbing wiring paint '
+         'tiles glass timber concrete formwork waterproofing diesel welding drainage roofing').split()
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+# --- Environment ---
+
+def configure_environment(database_uri, upload_dir):
+    """Stub settings the app refuses to start without. Must run before `import app`."""
+    os.environ['DATABASE_URI'] = database_uri
+    os.environ['BENCH_UPLOAD_DIR'] = upload_dir
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret-key')
+    os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark000000000000000000000000')
+    os.environ.setdefault('TWILIO_AUTH_TOKEN', 'benchmark-token')
+    os.environ.setdefault('TWILIO_PHONE_NUMBER', '+10000000000')
+    os.environ.setdefault('ASSET_MANIFEST_REQUIRED', 'false')  # benchmarks don't need built CSS
+
+
+def server_app():
+    """App factory for the benchmark server workers (gunicorn 'benchmarks.portal:server_app()')."""
+    from app import create_app
+    app = create_app()
+    app.config.update(
+        UPLOAD_FOLDER=os.environ['BENCH_UPLOAD_DIR'],
+        JOBS_ENABLED=False,
+        WTF_CSRF_ENABLED=False,
+        SESSION_COOKIE_SECURE=False,
+        PROFILING_ENABLED=False,
+    )
+    return app
+
+
+# --- Seeding ---
+
+def _work_form_fields(user_id):
+    return dict(
+        contractor_name=f"Contractor {user_id}", firm_type='Proprietorship', scope_of_work='Civil works',
+        nature_of_service='Construction', establishment_date=date(2015, 1, 1).isoformat(),
+        pan_number='ABCDE1234F', pf_esic_registered='No',
+        office_address_1='1 Main Road', office_city='Pune', office_state='Maharashtra', office_pincode='411001',
+        office_contact_person='Contact', office_mobile='9000000000', office_email=f"office{user_id}@example.com",
+        account_holder_name='Holder', bank_name='Bank', branch_name='Branch', account_number='123456789012',
+        ifsc_code='ABCD0123456', skilled_labour_count='10', unskilled_labour_count='20', supervisor_count='2',
+        safety_officer='yes', gst_on_labour='no', work_category=['Civil_Work'], years_experience='5',
+        major_clients='Client A', reference_contact='Ref, Co, 9000000000', project_experience='Both',
+        declaration_agreed='y', signature_name='Vendor', signature_date=date.today().isoformat(),
+    )
+
+
+def _material_form_fields(user_id):
+    return dict(
+        vendor_name=f"Supplier {user_id}", firm_type='Proprietorship', nature_of_business='Trading',
+        material_supplied='Cement', establishment_date=date(2015, 1, 1).isoformat(),
+        pan_number='ABCDE1234F', gst_number='27ABCDE1234F1Z5',
+        office_address_1='1 Main Road', office_city='Pune', office_state='Maharashtra', office_pincode='411001',
+        office_contact_person='Contact', office_mobile='9000000000', office_email=f"office{user_id}@example.com",
+        account_holder_name='Holder', bank_name='Bank', branch_name='Branch', account_number='123456789012',
+        ifsc_code='ABCD0123456', primary_contact_name='Primary', primary_contact_designation='Owner',
+        primary_contact_mobile='9000000000', primary_contact_email=f"primary{user_id}@example.com",
+        work_category=['Cement'], declaration_agreed='y', signature_name='Vendor',
+        signature_date=date.today().isoformat(),
+    )
+
+
+def _stored_copies(sha256, subfolder, count):
+    """`count` stored filenames sharing one blob, as the blob store would create them."""
+    from app.models import db, StoredBlob, StoredFile
+    from sqlalchemy import update
+    import uuid
+    filenames = [f"{uuid.uuid4().hex}_document.pdf" for _ in range(count)]
+    db.session.bulk_insert_mappings(StoredFile, [
+        dict(filename=name, subfolder=subfolder, sha256=sha256) for name in filenames
+    ])
+    db.session.execute(update(StoredBlob).where(StoredBlob.sha256 == sha256)
+                       .values(ref_count=StoredBlob.ref_count + count))
+    return filenames
+
+
+def seed(app, users, invoices_per_user, registered_ratio, fresh_users):
+    """
+    Creates the schema and sample data. Returns a dict describing what was
+    seeded (user ids, sample filenames, search terms) for the scenarios.
+    """
+    from app.models import db, User, Invoice, VendorWork, StoredFile
+    from app.main.uploads import StreamingFileWriter
+    from app.main.blobstore import store_upload, blob_temp_dir
+    from app.stats import rebuild_stats
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(7)
+    with app.app_context():
+        db.create_all()
+        password_hash = generate_password_hash('benchmark')
+        total_users = users + fresh_users
+        db.session.bulk_insert_mappings(User, [
+            dict(id=user_id, company_name=f"Vendor {user_id}", name=f"Vendor {user_id}",
+                 email=f"vendor{user_id}@example.com", mobile='9000000000',
+                 pan_number=f"BENCH{user_id:05d}", password_hash=password_hash)
+            for user_id in range(1, total_users + 1)
+        ])
+        db.session.commit()
+
+        writer = StreamingFileWriter(blob_temp_dir(), 'document.pdf', len(SAMPLE_PDF))
+        writer.write(SAMPLE_PDF)
+        first_file = store_upload(writer, 'invoices')
+        sha256 = db.session.get(StoredFile, first_file).sha256
+
+        registered = list(range(1, int(users * registered_ratio) + 1))
+        doc_files = _stored_copies(sha256, 'vendor_docs', len(registered))
+        for user_id, doc_file in zip(registered, doc_files):
+            fields = _work_form_fields(user_id)
+            fields.update(establishment_date=date(2015, 1, 1), signature_date=date.today(),
+                          work_category=json.dumps(fields['work_category']), declaration_agreed=True,
+                          skilled_labour_count=10, unskilled_labour_count=20, supervisor_count=2,
+                          years_experience=5)
+            db.session.add(VendorWork(user_id=user_id, pan_card_copy_path=doc_file, status='Approved', **fields))
+        db.session.commit()
+
+        start = datetime.utcnow() - timedelta(days=365)
+        invoice_files = _stored_copies(sha256, 'invoices', min(users, 1000))
+        sample_invoices = {}
+        for user_id in range(1, users + 1):
+            rows = []
+            for n in range(invoices_per_user):
+                status = rng.choice(('In Review', 'Approved', 'Paid', 'Rejected'))
+                rows.append(dict(
+                    invoice_number=f"INV-{user_id}-{n:05d}", po_number=f"PO-{rng.randint(10000, 99999)}",
+                    invoice_amount=round(rng.uniform(500, 500000), 2),
+                    description=' '.join(rng.sample(WORDS, 4)),
+                    file_path=invoice_files[user_id % len(invoice_files)],
+                    submission_date=start + timedelta(minutes=n * 17), status=status, user_id=user_id,
+                    payment_date=start + timedelta(minutes=n * 17 + 600) if status == 'Paid' else None,
+                ))
+            db.session.bulk_insert_mappings(Invoice, rows)
+            sample_invoices[user_id] = rows[-1]['file_path']
+            db.session.commit()
+        rebuild_stats()
+
+        return {
+            'registered_users': registered,
+            'fresh_users': list(range(users + 1, total_users + 1)),
+            'invoice_files': sample_invoices,
+            'vendor_docs': dict(zip(registered, doc_files)),
+        }
+
+
+# --- Scenarios ---
+# Each scenario builds one request for a given vendor: (method, path, form
+# fields or None, files or None, expected status codes).
+
+_upload_counter = itertools.count()
+
+
+def _scenarios(seeded):
+    registered = seeded['registered_users']
+    fresh = iter(seeded['fresh_users'])
+    fresh_lock = threading.Lock()
+
+    def next_fresh_user():
+        with fresh_lock:
+            return next(fresh, None)
+
+    def upload(user_id):
+        n = next(_upload_counter)
+        return ('POST', '/upload-invoices',
+                dict(invoice_number=f"B{os.getpid() % 1000}-{n}", po_number=f"PO-{n}",
+                     invoice_amount='1234.50', description='benchmark upload'),
+                {'invoice_file': ('invoice.pdf', SAMPLE_PDF)}, (302,))
+
+    def work_form(user_id):
+        return ('POST', '/vendor-form/work', _work_form_fields(user_id),
+                {name: (f"{name}.pdf", SAMPLE_PDF) for name in
+                 ('pan_card_copy', 'proprietor_id_copy', 'cancelled_cheque_copy', 'address_proof_copy')},
+                (302,))
+
+    def material_form(user_id):
+        return ('POST', '/vendor-form/material', _material_form_fields(user_id),
+                {name: (f"{name}.pdf", SAMPLE_PDF) for name in
+                 ('pan_card_copy', 'gst_certificate_copy', 'cancelled_cheque_copy', 'address_proof_copy')},
+                (302,))
+
+    # name -> (pick a user id, build the request)
+    return {
+        'dashboard': (lambda: random.choice(registered), lambda u: ('GET', '/dashboard', None, None, (200,))),
+        'all_invoices': (lambda: random.choice(registered), lambda u: ('GET', '/all-invoices', None, None, (200,))),
+        'all_invoices_search': (lambda: random.choice(registered),
+                                lambda u: ('GET', f"/all-invoices?q={random.choice(WORDS)}", None, None, (200,))),
+        'upload_invoice': (lambda: random.choice(registered), upload),
+        'vendor_form_work': (next_fresh_user, work_form),
+        'vendor_form_material': (next_fresh_user, material_form),
+        'download_invoice': (lambda: random.choice(registered),
+                             lambda u: ('GET', f"/download/invoice/{seeded['invoice_files'][u]}", None, None, (200,))),
+        'download_vendor_doc': (lambda: random.choice(registered),
+                                lambda u: ('GET', f"/download/vendor_doc/{seeded['vendor_docs'][u]}", None, None, (200,))),
+    }
+
+
+def _summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else None
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99),
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else None,
+    }
+
+
+class TestClientDriver:
+    """Runs requests in-process through Flask's test client, one vendor session per client."""
+
+    def __init__(self, app):
+        self.app = app
+        self._clients = {}
+
+    def _client(self, user_id):
+        client = self._clients.get(user_id)
+        if client is None:
+            client = self._clients[user_id] = self.app.test_client()
+            with client.session_transaction() as session:
+                session['user_id'] = user_id
+        return client
+
+    def request(self, user_id, method, path, fields, files):
+        data = dict(fields or {})
+        for name, (filename, content) in (files or {}).items():
+            data[name] = (BytesIO(content), filename)
+        response = self._client(user_id).open(path, method=method, data=data or None,
+                                              content_type='multipart/form-data' if files else None)
+        response.close()
+        return response.status_code
+
+
+class HttpDriver:
+    """Runs requests over HTTP with keep-alive connections, one per thread."""
+
+    def __init__(self, app, host, port):
+        self.host, self.port = host, port
+        self._cookies = {}
+        self._local = threading.local()
+        self._cookie_app = app
+
+    def _cookie(self, user_id):
+        cookie = self._cookies.get(user_id)
+        if cookie is None:
+            client = self._cookie_app.test_client()
+            with client.session_transaction() as session:
+                session['user_id'] = user_id
+            name = self._cookie_app.config.get('SESSION_COOKIE_NAME', 'session')
+            cookie = self._cookies[user_id] = f"{name}={client.get_cookie(name).value}"
+        return cookie
+
+    def request(self, user_id, method, path, fields, files):
+        from werkzeug.datastructures import FileStorage
+        from werkzeug.test import encode_multipart
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+
+        headers = {'Cookie': self._cookie(user_id)}
+        body = None
+        if fields or files:
+            values = {**(fields or {}),
+                      **{name: FileStorage(BytesIO(content), filename=filename)
+                         for name, (filename, content) in (files or {}).items()}}
+            boundary, body = encode_multipart(values)
+            headers['Content-Type'] = f"multipart/form-data; boundary={boundary}"
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self._local.connection = None
+            raise
+        return response.status
+
+
+def run_scenario(driver, pick_user, build, requests, concurrency):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one():
+        nonlocal errors
+        user_id = pick_user()
+        if user_id is None:
+            return  # Ran out of fresh vendors for the form scenarios
+        method, path, fields, files, expected = build(user_id)
+        started = time.perf_counter()
+        try:
+            status = driver.request(user_id, method, path, fields, files)
+        except Exception:
+            status = None
+        elapsed = time.perf_counter() - started
+        with lock:
+            if status in expected:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        for _ in range(requests):
+            one()
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _ in range(requests):
+                executor.submit(one)
+    return _summarize(latencies, errors, time.perf_counter() - started)
+
+
+# --- Servers ---
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Benchmark server did not start on port {port}")
+
+
+def start_server(app, workers):
+    """Starts gunicorn with `workers` processes if available, else a threaded Werkzeug server."""
+    port = _free_port()
+    if shutil.which('gunicorn'):
+        process = subprocess.Popen(
+            ['gunicorn', '--workers', str(workers), '--threads', '4', '--bind', f"127.0.0.1:{port}",
+             '--log-level', 'warning', 'benchmarks.portal:server_app()'],
+            env=os.environ.copy()
+        )
+        _wait_for_port(port)
+        return port, f"gunicorn x{workers}", process.terminate
+
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', port, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _wait_for_port(port)
+    return port, 'werkzeug threaded (gunicorn not installed)', server.shutdown
+
+
+# --- Baseline comparison ---
+
+def compare(results, baseline, threshold):
+    """Returns human-readable regressions of `results` against `baseline`."""
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        if current['errors'] > previous.get('errors', 0):
+            regressions.append(f"{name}: {current['errors']} failed requests (baseline {previous.get('errors', 0)})")
+        if current['p95_ms'] is None or previous.get('p95_ms') is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.1f}ms -> {current['p95_ms']:.1f}ms")
+        if previous.get('throughput_rps') and current['throughput_rps'] < previous['throughput_rps'] * (1 - threshold):
+            regressions.append(f"{name}: throughput {previous['throughput_rps']:.1f} -> "
+                               f"{current['throughput_rps']:.1f} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--invoices-per-user', type=int, default=200)
+    parser.add_argument('--registered-ratio', type=float, default=1.0,
+                        help='fraction of seeded vendors with an approved work form')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads (HTTP mode)')
+    parser.add_argument('--server', action='store_true', help='drive a WSGI server over HTTP instead of the test client')
+    parser.add_argument('--workers', type=int, default=4, help='server worker processes (gunicorn)')
+    parser.add_argument('--scenario', action='append', help='run only these scenarios (repeatable)')
+    parser.add_argument('--database-uri')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.20, help='allowed relative regression (0.20 = 20%%)')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='portal-bench-')
+    database_uri = args.database_uri or f"sqlite:///{os.path.join(scratch, 'portal.db')}"
+    configure_environment(database_uri, os.path.join(scratch, 'uploads'))
+    stop_server = None
+
+    try:
+        app = server_app()
+        started = time.perf_counter()
+        fresh_needed = args.requests * 2
+        seeded = seed(app, args.users, args.invoices_per_user, args.registered_ratio, fresh_needed)
+        print(f"Seeded {args.users} vendors x {args.invoices_per_user} invoices in {time.perf_counter() - started:.1f}s")
+
+        if args.server:
+            port, server_name, stop_server = start_server(app, args.workers)
+            driver, mode = HttpDriver(app, '127.0.0.1', port), f"http ({server_name})"
+            concurrency = args.concurrency
+        else:
+            driver, mode, concurrency = TestClientDriver(app), 'test client', 1
+
+        scenarios = _scenarios(seeded)
+        selected = args.scenario or list(scenarios)
+        results = {
+            'meta': {
+                'mode': mode, 'users': args.users, 'invoices_per_user': args.invoices_per_user,
+                'requests': args.requests, 'concurrency': concurrency,
+                'database': database_uri.split(':', 1)[0], 'python': platform.python_version(),
+                'machine': platform.machine(), 'recorded_at': datetime.utcnow().isoformat(timespec='seconds'),
+            },
+            'scenarios': {},
+        }
+
+        print(f"\n{'scenario':<24} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}   [{mode}]")
+        for name in selected:
+            pick_user, build = scenarios[name]
+            summary = run_scenario(driver, pick_user, build, args.requests, concurrency)
+            key = f"{name}@{'http' if args.server else 'client'}"
+            results['scenarios'][key] = summary
+            fmt = lambda value: f"{value:8.1f}" if value is not None else f"{'-':>8}"
+            print(f"{name:<24} {fmt(summary['throughput_rps'])} {fmt(summary['p50_ms'])} "
+                  f"{fmt(summary['p95_ms'])} {fmt(summary['p99_ms'])} {summary['errors']:>7}")
+    finally:
+        if stop_server:
+            stop_server()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\nRegressions beyond {args.threshold:.0%} against {args.baseline}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Vendor form attachment benchmark: seven attachments saved one save_file()
+call at a time (as the registration forms used to) against one
+save_files() batch, then a batch whose storage fails part way through,
+which must leave nothing behind.
+
+    python -m benchmarks.save_files
+    python -m benchmarks.save_files --files 7 --size-mb 5 --runs 5
+    python -m benchmarks.save_files --database-uri postgresql://.../scratch
+
+The helpers are called directly inside a request context, so the numbers
+are server-side time only, excluding the multipart parsing. Every file gets
+distinct content so the blob store cannot deduplicate. The target database
+is created from scratch, so never point it at a real one.
+"""
+from io import BytesIO
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks import portal
+
+
+def _attachments(count, size):
+    from werkzeug.datastructures import FileStorage
+    padding = size - len(portal.SAMPLE_PDF)
+    return {f"attachment_{n}": FileStorage(BytesIO(portal.SAMPLE_PDF + os.urandom(padding)),
+                                           filename=f"attachment-{n}.pdf")
+            for n in range(count)}
+
+
+def one_at_a_time(app, count, size):
+    from app.main.routes import save_file
+    from app.models import db
+    files = _attachments(count, size)
+    with app.test_request_context('/vendor-form/work', method='POST'):
+        started = time.perf_counter()
+        saved = [save_file(file, 'vendor_docs') for file in files.values()]
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+    if not all(saved):
+        raise RuntimeError('save_file() failed')
+    return elapsed
+
+
+def batch(app, count, size):
+    from app.main.routes import save_files
+    from app.models import db
+    files = _attachments(count, size)
+    with app.test_request_context('/vendor-form/work', method='POST'):
+        started = time.perf_counter()
+        saved, errors = save_files(files, 'vendor_docs')
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+    if errors or not all(saved.values()):
+        raise RuntimeError(f"save_files() failed: {errors}")
+    return elapsed
+
+
+class _FailingPut:
+    """Wraps a storage backend so that the put_file() call number `fail_at` raises."""
+
+    def __init__(self, storage, fail_at):
+        self._storage = storage
+        self._fail_at = fail_at
+        self.calls = 0
+
+    def put_file(self, key, source_path):
+        self.calls += 1
+        if self.calls == self._fail_at:
+            raise OSError('injected storage failure')
+        return self._storage.put_file(key, source_path)
+
+    def __getattr__(self, name):
+        return getattr(self._storage, name)
+
+
+def failed_batch(app, count, size):
+    """Time to fail, and what the failure left behind (should be nothing)."""
+    from app.main.routes import save_files
+    from app.main.blobstore import blob_root, blob_temp_dir, get_storage
+    from app.jobs import job_queue
+    from app.models import db, Job, StoredBlob, StoredFile
+
+    files = _attachments(count, size)
+    with app.app_context():
+        rows_before = (StoredBlob.query.count(), StoredFile.query.count())
+    with app.test_request_context('/vendor-form/work', method='POST'):
+        storage = get_storage()
+        app.extensions['blob_storage'] = _FailingPut(storage, fail_at=count)
+        try:
+            started = time.perf_counter()
+            saved, errors = save_files(files, 'vendor_docs')
+            elapsed = time.perf_counter() - started
+        finally:
+            app.extensions['blob_storage'] = storage
+    if not errors or any(saved.values()):
+        raise RuntimeError('save_files() did not report the injected failure')
+
+    with app.app_context():
+        # The rollback queued the deletion of the written content; the job
+        # queue is off here, so run those jobs inline.
+        for job_id in db.session.execute(db.select(Job.id).where(Job.kind == 'delete_blobs',
+                                                                  Job.status == 'queued')).scalars().all():
+            job_queue._run_in_context(job_id)
+        rows_after = (StoredBlob.query.count(), StoredFile.query.count())
+        temp_files = os.listdir(blob_temp_dir())
+        blob_files = sum(len(names) for root, _, names in os.walk(blob_root()) if root != blob_temp_dir())
+    leftovers = []
+    if rows_after != rows_before:
+        leftovers.append(f"{rows_after[0] - rows_before[0]} blob and {rows_after[1] - rows_before[1]} file row(s)")
+    if temp_files:
+        leftovers.append(f"{len(temp_files)} temp file(s)")
+    return elapsed, leftovers, blob_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=7, help='attachments per form')
+    parser.add_argument('--size-mb', type=float, default=5)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=4, help='UPLOAD_WORKERS')
+    parser.add_argument('--database-uri')
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    scratch = tempfile.mkdtemp(prefix='save-files-bench-')
+    database_uri = args.database_uri or f"sqlite:///{os.path.join(scratch, 'portal.db')}"
+    portal.configure_environment(database_uri, os.path.join(scratch, 'uploads'))
+    try:
+        app = portal.server_app()
+        app.config.update(MAX_FILE_SIZE_MB=args.size_mb + 1, UPLOAD_WORKERS=args.workers)
+        portal.seed(app, users=1, invoices_per_user=1, registered_ratio=1.0, fresh_users=0)
+
+        results = {
+            'one at a time': [one_at_a_time(app, args.files, size) for _ in range(args.runs)],
+            'save_files': [batch(app, args.files, size) for _ in range(args.runs)],
+        }
+        baseline = statistics.median(results['one at a time'])
+        print(f"{args.files} x {args.size_mb:g}MB attachments, median of {args.runs} runs "
+              f"({database_uri.split(':', 1)[0]}, {args.workers} upload workers)")
+        print(f"{'mode':<16} {'total ms':>10} {'ms/file':>9} {'speedup':>8}")
+        for label, timings in results.items():
+            median = statistics.median(timings)
+            print(f"{label:<16} {median * 1000:>10.1f} {median * 1000 / args.files:>9.1f} {baseline / median:>7.1f}x")
+
+        with app.app_context():
+            from app.main.blobstore import blob_root, blob_temp_dir
+            stored_before = sum(len(names) for root, _, names in os.walk(blob_root()) if root != blob_temp_dir())
+        elapsed, leftovers, stored_after = failed_batch(app, args.files, size)
+        if stored_after != stored_before:
+            leftovers.append(f"{stored_after - stored_before} blob file(s)")
+        failed = bool(leftovers)
+        print(f"{'failed batch':<16} {elapsed * 1000:>10.1f}   storage failed on file {args.files}: "
+              + (f"left behind {', '.join(leftovers)}" if leftovers else 'nothing left behind'))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Compares the indexed invoice search (app/search.py) with the old ILIKE
+search on invoice_number / po_number.
+
+    python -m benchmarks.search_invoices --rows 1000000
+    python -m benchmarks.search_invoices --database-uri postgresql://.../scratch
+
+Without --database-uri a throwaway SQLite file is used. The target database
+is filled with synthetic data, so never point it at a real one.
+"""
+from app.models import db, User, Invoice
+from app.search import SearchQuery, build_search_statement, install_search_index
+from sqlalchemy import create_engine, select, insert, or_, text
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+WORDS = (
+    'cement steel rebar labour transport scaffolding excavation plumbing wiring paint '
+    'tiles glass timber concrete formwork shuttering waterproofing diesel crane welding '
+    'survey drainage roofing plaster bricks sand aggregate fittings inspection mobilisation'
+).split()
+
+
+
+def _queries(connection, user_id):
+    """(label, search text) pairs mixing selective identifiers, common words and a miss."""
+    sample = connection.execute(
+        select(Invoice.invoice_number, Invoice.po_number)
+        .where(Invoice.user_id == user_id).order_by(Invoice.id).offset(40).limit(1)
+    ).one()
+    return (
+        ('exact invoice number', sample.invoice_number),
+        ('invoice number prefix', sample.invoice_number[:-2]),
+        ('invoice number digits', sample.invoice_number[-4:]),
+        ('inside a word', 'ment'),
+        ('PO number', sample.po_number),
+        ('description word', 'waterproofing'),
+        ('two description words', 'steel transport'),
+        ('no match', 'zzzzqqq'),
+    )
+
+
+def _seed(engine, rows, users, batch_size=10000):
+    db.metadata.create_all(engine, tables=[User.__table__, Invoice.__table__])
+    start = datetime(2024, 1, 1)
+    rng = random.Random(42)
+
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            dict(id=user_id, company_name=f"Vendor {user_id}", name=f"Vendor {user_id}",
+                 email=f"vendor{user_id}@example.com", mobile='9000000000',
+                 pan_number=f"ABCDE{user_id:04d}F")
+            for user_id in range(1, users + 1)
+        ])
+
+    for offset in range(0, rows, batch_size):
+        batch = []
+        for n in range(offset, min(offset + batch_size, rows)):
+            batch.append(dict(
+                invoice_number=f"INV-{2024 + n % 2}-{n:06d}",
+                po_number=f"PO-{rng.randint(10000, 99999)}",
+                invoice_amount=round(rng.uniform(500, 500000), 2),
+                description=' '.join(rng.sample(WORDS, 6)),
+                file_path=f"{n:032x}_invoice.pdf",
+                submission_date=start + timedelta(minutes=n),
+                status=rng.choice(('In Review', 'Approved', 'Paid', 'Rejected')),
+                user_id=n % users + 1,
+            ))
+        with engine.begin() as connection:
+            connection.execute(insert(Invoice), batch)
+
+
+def _legacy_statement(user_id, term, per_page):
+    """The all_invoices search before the index: ILIKE on two columns, newest first."""
+    pattern = f"%{term}%"
+    return (
+        select(Invoice.id)
+        .where(Invoice.user_id == user_id,
+               or_(Invoice.invoice_number.ilike(pattern), Invoice.po_number.ilike(pattern)))
+        .order_by(Invoice.submission_date.desc(), Invoice.id.desc())
+        .limit(per_page)
+    )
+
+
+def _time(connection, stmt, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        hits = connection.execute(stmt).scalars().all()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), max(timings), len(hits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=10, help='vendors the rows are spread over')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--limit', type=int, default=11, help='ranked ids fetched per page (ITEMS_PER_PAGE + 1)')
+    parser.add_argument('--database-uri')
+    args = parser.parse_args()
+
+    path = None
+    uri = args.database_uri
+    if not uri:
+        fd, path = tempfile.mkstemp(suffix='.db', prefix='search-bench-')
+        os.close(fd)
+        uri = f"sqlite:///{path}"
+    engine = create_engine(uri)
+
+    try:
+        started = time.perf_counter()
+        _seed(engine, args.rows, args.users)
+        with engine.begin() as connection:
+            install_search_index(connection)
+            if engine.dialect.name == 'postgresql':
+                connection.execute(text('ANALYZE invoices'))
+        print(f"Seeded {args.rows} invoices for {args.users} vendors in {time.perf_counter() - started:.1f}s "
+              f"({engine.dialect.name})")
+
+        print(f"{'query':<24} {'ILIKE median/max ms':>20} {'hits':>6} {'indexed median/max ms':>22} {'hits':>6}")
+        with engine.connect() as connection:
+            for label, term in _queries(connection, 1):
+                legacy = _time(connection, _legacy_statement(1, term, 10), args.repeat)
+                stmt = build_search_statement(1, SearchQuery(term.split(), []), engine.dialect.name, True)
+                indexed = _time(connection, stmt.limit(args.limit), args.repeat)
+                print(f"{label:<24} {legacy[0]:>9.2f}/{legacy[1]:<10.2f} {legacy[2]:>6} "
+                      f"{indexed[0]:>10.2f}/{indexed[1]:<11.2f} {indexed[2]:>6}")
+        print("ILIKE returns only the first page of invoice/PO matches; the indexed search also "
+              "covers descriptions and returns the first page (--limit) of ranked ids.")
+    finally:
+        engine.dispose()
+        if path:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
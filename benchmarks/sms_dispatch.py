@@ -0,0 +1,154 @@
+"""
+SMS dispatch benchmark: throughput and failure handling of app/sms.py
+against the local fake Twilio server (benchmarks/fake_twilio.py), with no
+network access or Twilio account needed.
+
+    python -m benchmarks.sms_dispatch
+    python -m benchmarks.sms_dispatch --messages 500 --latency 0.3 --workers 8
+
+Scenarios:
+  inline       one blocking Twilio call per message, as a request handler
+               calling Twilio directly would make; time per call is what
+               each OTP request used to wait
+  queued       the same messages through send_sms(): time to queue (what a
+               request now waits), throughput and HTTP connections opened
+  rate limit   the fake answers 429 above --provider-rate per second; the
+               dispatcher's token bucket is set to the same rate
+  flaky        --error-rate of the calls fail with a 500 and are retried
+  outage       the fake is down for --outage seconds; the circuit breaker
+               should stop calling it until it recovers
+Every message must end up sent; the run exits with 1 otherwise.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks import portal
+from benchmarks.fake_twilio import FakeTwilio
+
+ACCOUNT_SID = 'ACbenchmark000000000000000000000000'
+AUTH_TOKEN = 'benchmark-token'
+
+
+def _dispatcher(base_url, **config):
+    from flask import Flask
+    from app.sms import SmsDispatcher
+
+    app = Flask('sms-benchmark')
+    app.config.update(
+        TWILIO_ACCOUNT_SID=ACCOUNT_SID, TWILIO_AUTH_TOKEN=AUTH_TOKEN, TWILIO_PHONE_NUMBER='+15550000000',
+        TWILIO_API_URL=base_url, SMS_RETRY_BASE_SECONDS=0.05, SMS_RETRY_MAX_SECONDS=1.0,
+        SMS_QUEUE_SIZE=100000, SMS_MAX_ATTEMPTS=10, **config)
+    return SmsDispatcher(app)
+
+
+def _numbers(count):
+    return [f"+1555{n:07d}" for n in range(count)]
+
+
+def _drain(dispatcher, count):
+    started = time.perf_counter()
+    messages = [dispatcher.send(number, 'Your verification code is 123456') for number in _numbers(count)]
+    queued = time.perf_counter() - started
+    statuses = [message.wait(120) for message in messages]
+    elapsed = time.perf_counter() - started
+    dispatcher.shutdown()
+    return queued, elapsed, sum(1 for status in statuses if status == 'sent'), sum(m.attempts for m in messages)
+
+
+def _report(label, count, queued, elapsed, sent, attempts, fake, note=''):
+    print(f"{label:<11} {sent:>5}/{count:<5} {elapsed:>7.2f} {sent / elapsed:>8.1f} {queued / count * 1e6:>10.1f} "
+          f"{attempts:>8} {fake.stats['connections']:>6} {fake.stats['max_in_flight']:>9}  {note}")
+    return sent == count
+
+
+def inline(args):
+    from app.sms import TwilioClient
+
+    fake = FakeTwilio(ACCOUNT_SID, AUTH_TOKEN, latency=args.latency)
+    client = TwilioClient(ACCOUNT_SID, AUTH_TOKEN, '+15550000000', base_url=fake.start())
+    count = min(args.messages, 50)
+    started = time.perf_counter()
+    for number in _numbers(count):
+        client.send(number, 'Your verification code is 123456')
+    elapsed = time.perf_counter() - started
+    fake.stop()
+    return _report('inline', count, elapsed, elapsed, count, count, fake, '(queue us = time per blocking call)')
+
+
+def queued(args):
+    fake = FakeTwilio(ACCOUNT_SID, AUTH_TOKEN, latency=args.latency)
+    dispatcher = _dispatcher(fake.start(), SMS_WORKERS=args.workers, SMS_RATE_PER_SECOND=0)
+    result = _drain(dispatcher, args.messages)
+    fake.stop()
+    return _report('queued', args.messages, *result, fake)
+
+
+def rate_limit(args):
+    fake = FakeTwilio(ACCOUNT_SID, AUTH_TOKEN, latency=args.latency, rate=args.provider_rate)
+    dispatcher = _dispatcher(fake.start(), SMS_WORKERS=args.workers, SMS_RATE_PER_SECOND=args.provider_rate,
+                             SMS_BURST=1)
+    count = int(args.provider_rate * 5)
+    result = _drain(dispatcher, count)
+    fake.stop()
+    return _report('rate limit', count, *result, fake, f"{fake.stats['rate_limited']} x 429")
+
+
+def flaky(args):
+    fake = FakeTwilio(ACCOUNT_SID, AUTH_TOKEN, latency=args.latency, error_rate=args.error_rate, seed=1)
+    dispatcher = _dispatcher(fake.start(), SMS_WORKERS=args.workers, SMS_RATE_PER_SECOND=0,
+                             SMS_CIRCUIT_FAILURES=50)
+    result = _drain(dispatcher, args.messages)
+    fake.stop()
+    return _report('flaky', args.messages, *result, fake, f"{fake.stats['errors']} x 500")
+
+
+def outage(args):
+    fake = FakeTwilio(ACCOUNT_SID, AUTH_TOKEN, latency=args.latency)
+    dispatcher = _dispatcher(fake.start(), SMS_WORKERS=args.workers, SMS_RATE_PER_SECOND=0,
+                             SMS_CIRCUIT_FAILURES=5, SMS_CIRCUIT_RESET_SECONDS=1.0)
+    fake.down = True
+    started = time.perf_counter()
+    messages = [dispatcher.send(number, 'Your verification code is 123456') for number in _numbers(args.messages)]
+    queued_time = time.perf_counter() - started
+    time.sleep(args.outage)
+    calls_while_down = fake.stats['requests']
+    breaker_state = dispatcher.breaker.state
+    fake.down = False
+    statuses = [message.wait(120) for message in messages]
+    elapsed = time.perf_counter() - started
+    dispatcher.shutdown()
+    fake.stop()
+    sent = sum(1 for status in statuses if status == 'sent')
+    return _report('outage', args.messages, queued_time, elapsed, sent, sum(m.attempts for m in messages), fake,
+                   f"{calls_while_down} call(s) in {args.outage:.0f}s down, breaker {breaker_state}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.2, help='fake Twilio response time in seconds')
+    parser.add_argument('--provider-rate', type=float, default=20, help='messages per second before the fake sends 429s')
+    parser.add_argument('--error-rate', type=float, default=0.3)
+    parser.add_argument('--outage', type=float, default=5.0, help='seconds the fake is down in the outage scenario')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='sms-bench-')
+    # app/config.py refuses to load without these, even though no database is used here
+    portal.configure_environment(f"sqlite:///{os.path.join(scratch, 'portal.db')}", os.path.join(scratch, 'uploads'))
+    try:
+        print(f"fake Twilio latency {args.latency * 1000:.0f} ms, {args.workers} sender(s)")
+        print(f"{'scenario':<11} {'sent':>11} {'seconds':>7} {'msgs/s':>8} {'queue us':>10} "
+              f"{'attempts':>8} {'conns':>6} {'in flight':>9}")
+        results = [scenario(args) for scenario in (inline, queued, rate_limit, flaky, outage)]
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    if not all(results):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
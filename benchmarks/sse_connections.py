@@ -0,0 +1,187 @@
+"""
+Live events load test: holds N idle GET /events streams open against one
+gevent gunicorn worker and reports the worker's resident memory as streams
+are added, i.e. what an idle connection costs.
+
+    python -m benchmarks.sse_connections
+    python -m benchmarks.sse_connections --connections 10000 --steps 10 --idle 60
+
+Needs gunicorn and gevent. Streams are spread over --vendors vendors. While
+they sit idle the worker sends a heartbeat every --heartbeat seconds; every
+stream must receive them, and the memory reading after the idle period
+shows whether per-connection memory stays bounded over time. The client
+raises its open file limit to the hard limit (the server inherits it), which
+must be above --connections plus some headroom. The target database is
+created from scratch, so never point it at a real one.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+
+from benchmarks import portal
+
+
+def _rss_kb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    raise RuntimeError(f"No VmRSS for process {pid}")
+
+
+def _worker_pid(master_pid, timeout=30):
+    """The gunicorn worker forked by `master_pid`."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+            except OSError:
+                continue
+            if int(fields[1]) == master_pid:
+                return int(entry)
+        time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start a worker')
+
+
+def _start_server(connections, heartbeat):
+    if not shutil.which('gunicorn'):
+        raise SystemExit('This benchmark needs gunicorn and gevent installed.')
+    port = portal._free_port()
+    # One worker, so the in-process event backend reaches every stream.
+    env = dict(os.environ, EVENTS_BACKEND='memory', EVENTS_SINGLE_WORKER='true',
+               EVENTS_HEARTBEAT_SECONDS=str(heartbeat), EVENTS_MAX_CONNECTIONS=str(connections + 100))
+    process = subprocess.Popen(
+        ['gunicorn', '-k', 'gevent', '--workers', '1', '--worker-connections', str(connections + 100),
+         '--backlog', '4096', '--bind', f"127.0.0.1:{port}", '--log-level', 'warning',
+         'benchmarks.portal:server_app()'],
+        env=env
+    )
+    portal._wait_for_port(port)
+    return port, process
+
+
+class Stream:
+    """One idle /events connection that counts the heartbeats it receives."""
+
+    def __init__(self):
+        self.heartbeats = 0
+        self.writer = None
+        self.task = None
+
+    async def open(self, port, cookie):
+        reader, self.writer = await asyncio.open_connection('127.0.0.1', port)
+        self.writer.write((f"GET /events HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n"
+                           f"Cookie: {cookie}\r\n\r\n").encode())
+        await self.writer.drain()
+        status_line = (await reader.readuntil(b'\r\n\r\n')).split(b'\r\n', 1)[0].decode()
+        if not status_line.startswith('HTTP/1.1 200'):
+            raise RuntimeError(f"/events answered {status_line}")
+        self.task = asyncio.ensure_future(self._read(reader))
+
+    async def _read(self, reader):
+        while True:
+            chunk = await reader.read(4096)
+            if not chunk:
+                return
+            self.heartbeats += chunk.count(b'keep-alive')
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def _open(streams, port, cookies, parallel=200):
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def one(n, stream):
+        async with semaphore:
+            await stream.open(port, cookies[n % len(cookies)])
+
+    await asyncio.gather(*(one(n, stream) for n, stream in enumerate(streams)))
+
+
+async def run(port, worker_pid, cookies, args):
+    warmup = [Stream() for _ in range(50)]
+    await _open(warmup, port, cookies)
+    await asyncio.sleep(1)
+    baseline = _rss_kb(worker_pid)
+    print(f"worker RSS with {len(warmup)} warm-up streams: {baseline / 1024:.1f} MB")
+    print(f"{'streams':>8} {'RSS MB':>8} {'KB/stream':>10} {'open s':>7}")
+
+    streams = []
+    step = max(1, args.connections // args.steps)
+    while len(streams) < args.connections:
+        batch = [Stream() for _ in range(min(step, args.connections - len(streams)))]
+        started = time.perf_counter()
+        await _open(batch, port, cookies)
+        streams += batch
+        await asyncio.sleep(1)
+        rss = _rss_kb(worker_pid)
+        print(f"{len(streams):>8} {rss / 1024:>8.1f} {(rss - baseline) / len(streams):>10.1f} "
+              f"{time.perf_counter() - started:>7.2f}")
+
+    for stream in streams:
+        stream.heartbeats = 0
+    await asyncio.sleep(args.idle)
+    rss = _rss_kb(worker_pid)
+    quiet = sum(1 for stream in streams if stream.heartbeats == 0)
+    print(f"after {args.idle}s idle: {rss / 1024:.1f} MB, {(rss - baseline) / len(streams):.1f} KB/stream, "
+          f"{quiet} stream(s) without a heartbeat")
+
+    for stream in streams + warmup:
+        stream.close()
+    await asyncio.sleep(2)
+    print(f"after closing all streams: {_rss_kb(worker_pid) / 1024:.1f} MB")
+    return quiet
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=5000)
+    parser.add_argument('--steps', type=int, default=5)
+    parser.add_argument('--vendors', type=int, default=100)
+    parser.add_argument('--idle', type=float, default=30, help='seconds to hold all streams open')
+    parser.add_argument('--heartbeat', type=float, default=5)
+    parser.add_argument('--database-uri')
+    args = parser.parse_args()
+
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    if hard != resource.RLIM_INFINITY and hard < args.connections + 500:
+        raise SystemExit(f"The open file limit ({hard}) is too low for {args.connections} connections.")
+
+    scratch = tempfile.mkdtemp(prefix='sse-bench-')
+    database_uri = args.database_uri or f"sqlite:///{os.path.join(scratch, 'portal.db')}"
+    portal.configure_environment(database_uri, os.path.join(scratch, 'uploads'))
+    process = None
+    try:
+        app = portal.server_app()
+        seeded = portal.seed(app, users=args.vendors, invoices_per_user=1, registered_ratio=1.0, fresh_users=0)
+        serializer = app.session_interface.get_signing_serializer(app)
+        cookies = [f"{app.config['SESSION_COOKIE_NAME']}={serializer.dumps({'user_id': user_id})}"
+                   for user_id in seeded['registered_users']]
+
+        port, process = _start_server(args.connections, args.heartbeat)
+        quiet = asyncio.run(run(port, _worker_pid(process.pid), cookies, args))
+        if quiet:
+            raise SystemExit(1)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
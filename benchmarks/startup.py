@@ -0,0 +1,136 @@
+"""
+Worker startup benchmark: time from `import app` to the first served requests.
+
+Each sample is a fresh Python process that imports the app, calls
+create_app() and then serves the first request for a few template-heavy
+pages through the test client, as a new (or recycled) web worker would.
+Samples are taken with an empty template bytecode cache and again after
+`flask templates compile` has filled it.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --importtime
+
+--importtime also prints the slowest modules from `python -X importtime`
+for one cold start.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import portal
+
+
+PAGES = (('dashboard', '/dashboard'), ('upload_invoices', '/upload-invoices'),
+         ('your_profile', '/your-profile'), ('vendor_form_work', '/vendor-form/work'),
+         ('vendor_form_material', '/vendor-form/material'))
+
+
+def child(user_id, fresh_user_id):
+    """Runs in the fresh process. Prints one JSON line of timings (ms)."""
+    started = time.perf_counter()
+    timings = {}
+    from app import create_app
+    timings['import_ms'] = (time.perf_counter() - started) * 1000
+
+    mark = time.perf_counter()
+    app = create_app()
+    app.config.update(UPLOAD_FOLDER=os.environ['BENCH_UPLOAD_DIR'], JOBS_ENABLED=False,
+                      SESSION_COOKIE_SECURE=False, PAGE_CACHE_BACKEND='none')
+    timings['create_app_ms'] = (time.perf_counter() - mark) * 1000
+
+    for name, path in PAGES:
+        client = app.test_client()
+        with client.session_transaction() as session:
+            # The vendor forms only render for a vendor with no form yet
+            session['user_id'] = fresh_user_id if name.startswith('vendor_form') else user_id
+        mark = time.perf_counter()
+        status = client.get(path).status_code
+        timings[f"first_{name}_ms"] = (time.perf_counter() - mark) * 1000
+        if status != 200:
+            timings[f"first_{name}_status"] = status
+
+    timings['total_ms'] = (time.perf_counter() - started) * 1000
+    print(json.dumps(timings))
+
+
+def sample(env, args):
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.startup', '--child', str(args.user_id), str(args.fresh_user_id)],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    keys = [key for key in samples[0] if key.endswith('_ms')]
+    return {key: statistics.median(s[key] for s in samples) for key in keys}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per mode')
+    parser.add_argument('--importtime', action='store_true', help='show the slowest imports of one cold start')
+    parser.add_argument('--child', nargs=2, type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    scratch = tempfile.mkdtemp(prefix='portal-startup-')
+    try:
+        portal.configure_environment(f"sqlite:///{os.path.join(scratch, 'portal.db')}", os.path.join(scratch, 'uploads'))
+        cache_dir = os.path.join(scratch, 'jinja-cache')
+        os.environ['TEMPLATE_CACHE_DIR'] = cache_dir
+
+        app = portal.server_app()
+        seeded = portal.seed(app, users=5, invoices_per_user=50, registered_ratio=1.0, fresh_users=1)
+        args.user_id, args.fresh_user_id = seeded['registered_users'][0], seeded['fresh_users'][0]
+        env = os.environ.copy()
+
+        results = {}
+        cold = []
+        for _ in range(args.runs):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            cold.append(sample(env, args))
+        results['cold bytecode cache'] = summarize(cold)
+
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'benchmarks.portal:server_app()',
+                        'templates', 'compile'], env=env, check=True, stdout=subprocess.DEVNULL)
+        results['precompiled'] = summarize([sample(env, args) for _ in range(args.runs)])
+
+        results['no bytecode cache'] = summarize(
+            [sample({**env, 'TEMPLATE_BYTECODE_CACHE': 'false'}, args) for _ in range(args.runs)])
+
+        keys = list(next(iter(results.values())))
+        print(f"{'median of ' + str(args.runs) + ' runs (ms)':<28}" + ''.join(f"{mode:>22}" for mode in results))
+        for key in keys:
+            print(f"{key[:-3]:<28}" + ''.join(f"{results[mode][key]:>22.1f}" for mode in results))
+
+        if args.importtime:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            stderr = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-m', 'benchmarks.startup', '--child',
+                 str(args.user_id), str(args.fresh_user_id)],
+                env=env, check=True, capture_output=True, text=True
+            ).stderr
+            rows = []
+            for line in stderr.splitlines():
+                parts = line.split('|')
+                if len(parts) == 3 and parts[1].strip().isdigit():
+                    rows.append((int(parts[1]), parts[2].rstrip()))
+            print("\nSlowest imports (cumulative ms):")
+            for cumulative_us, module in sorted(rows, reverse=True)[:20]:
+                print(f"  {cumulative_us / 1000:8.1f}  {module}")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
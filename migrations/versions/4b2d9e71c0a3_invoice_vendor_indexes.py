@@ -0,0 +1,146 @@
+"""Per-vendor invoice indexes and unique invoice numbers per vendor
+
+Revision ID: 4b2d9e71c0a3
+Revises:
+Create Date: 2026-10-16 21:05:00
+
+Adds the composite indexes the vendor listings read from and the
+(user_id, invoice_number) unique constraint. Existing duplicate invoice
+numbers would make the constraint fail, so they are renamed first: in each
+group the earliest invoice keeps its number and the others get a '-DUP<id>'
+suffix. Every renamed invoice is logged for review. Databases created with
+db.create_all() already have all of this, so existing indexes and
+constraints are skipped, except that a PostgreSQL payment index built
+without NULLS LAST is rebuilt: payment history pages sort on
+payment_date DESC NULLS LAST, which a plain DESC index can't supply there.
+"""
+from alembic import op
+import sqlalchemy as sa
+import logging
+
+
+# revision identifiers, used by Alembic.
+revision = '4b2d9e71c0a3'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+log = logging.getLogger('alembic.runtime.migration')
+
+UNIQUE_NAME = 'uq_invoices_user_invoice_number'
+INVOICE_NUMBER_LENGTH = 50
+
+PAYMENT_INDEX = 'ix_invoices_user_status_payment'
+
+
+def _indexes(dialect):
+    # SQLite already sorts NULLs last in DESC order and rejects NULLS LAST in
+    # an index; PostgreSQL needs it spelled out (see Invoice.__table_args__).
+    payment_date = 'payment_date DESC NULLS LAST' if dialect == 'postgresql' else 'payment_date DESC'
+    return (
+        ('ix_invoices_user_submission', ['user_id', sa.text('submission_date DESC'), sa.text('id DESC')]),
+        (PAYMENT_INDEX, ['user_id', 'status', sa.text(payment_date), sa.text('id DESC')]),
+        ('ix_invoices_user_file_path', ['user_id', 'file_path']),
+    )
+
+
+def _payment_index_sorts_nulls_last(inspector):
+    for index in inspector.get_indexes('invoices'):
+        if index['name'] == PAYMENT_INDEX:
+            return 'nulls_last' in index.get('column_sorting', {}).get('payment_date', ())
+    return False
+
+
+invoices = sa.table(
+    'invoices',
+    sa.column('id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('invoice_number', sa.String),
+    sa.column('submission_date', sa.DateTime),
+)
+
+
+def _renamed(number, invoice_id, taken):
+    """A free '<number>-DUP<id>' for the vendor, trimmed to fit the column."""
+    suffix = f"-DUP{invoice_id}"
+    candidate = number[:INVOICE_NUMBER_LENGTH - len(suffix)] + suffix
+    n = 1
+    while candidate in taken:
+        suffix = f"-DUP{invoice_id}-{n}"
+        candidate = number[:INVOICE_NUMBER_LENGTH - len(suffix)] + suffix
+        n += 1
+    return candidate
+
+
+def _rename_duplicates(connection):
+    duplicates = connection.execute(
+        sa.select(invoices.c.user_id, invoices.c.invoice_number)
+        .group_by(invoices.c.user_id, invoices.c.invoice_number)
+        .having(sa.func.count() > 1)
+    ).all()
+    for user_id, number in duplicates:
+        taken = set(connection.execute(
+            sa.select(invoices.c.invoice_number).where(invoices.c.user_id == user_id)
+        ).scalars())
+        ids = connection.execute(
+            sa.select(invoices.c.id)
+            .where(invoices.c.user_id == user_id, invoices.c.invoice_number == number)
+            .order_by(invoices.c.submission_date, invoices.c.id)
+        ).scalars().all()
+        for invoice_id in ids[1:]:
+            new_number = _renamed(number, invoice_id, taken)
+            taken.add(new_number)
+            connection.execute(
+                sa.update(invoices).where(invoices.c.id == invoice_id).values(invoice_number=new_number)
+            )
+            log.warning(f"Invoice {invoice_id} of vendor {user_id} duplicated invoice number "
+                        f"{number!r}; renamed to {new_number!r}")
+    return len(duplicates)
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    indexes = {index['name'] for index in inspector.get_indexes('invoices')}
+    uniques = {constraint['name'] for constraint in inspector.get_unique_constraints('invoices')}
+
+    if UNIQUE_NAME not in indexes | uniques:
+        groups = _rename_duplicates(connection)
+        if groups:
+            log.warning(f"Renamed duplicate invoice numbers in {groups} group(s) before adding {UNIQUE_NAME}")
+        if connection.dialect.name == 'sqlite':
+            # SQLite can't add a constraint to an existing table; a unique
+            # index enforces the same thing without rebuilding the table
+            # (which would drop the search index triggers).
+            op.create_index(UNIQUE_NAME, 'invoices', ['user_id', 'invoice_number'], unique=True)
+        else:
+            op.create_unique_constraint(UNIQUE_NAME, 'invoices', ['user_id', 'invoice_number'])
+
+    if (connection.dialect.name == 'postgresql' and PAYMENT_INDEX in indexes
+            and not _payment_index_sorts_nulls_last(inspector)):
+        log.warning(f"Rebuilding {PAYMENT_INDEX} with payment_date DESC NULLS LAST")
+        op.drop_index(PAYMENT_INDEX, table_name='invoices')
+        indexes.discard(PAYMENT_INDEX)
+
+    for name, columns in _indexes(connection.dialect.name):
+        if name not in indexes:
+            op.create_index(name, 'invoices', columns)
+
+
+def downgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    indexes = {index['name'] for index in inspector.get_indexes('invoices')}
+    uniques = {constraint['name'] for constraint in inspector.get_unique_constraints('invoices')}
+
+    for name, _ in reversed(_indexes(connection.dialect.name)):
+        if name in indexes:
+            op.drop_index(name, table_name='invoices')
+    if UNIQUE_NAME in uniques:
+        if connection.dialect.name == 'sqlite':
+            log.warning(f"{UNIQUE_NAME} is part of the invoices table created by db.create_all(); left in place")
+        else:
+            op.drop_constraint(UNIQUE_NAME, 'invoices', type_='unique')
+    elif UNIQUE_NAME in indexes:
+        op.drop_index(UNIQUE_NAME, table_name='invoices')
+    # Renamed duplicate invoice numbers are left as they are.
@@ -3,7 +3,7 @@ from flask_migrate import Migrate
 
 app = create_app()
 
-# migrate = Migrate(app, db)
+migrate = Migrate(app, db)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+Shared fixtures. app/config.py refuses to load without a few settings, so
+stand-in values are set before anything imports the app package.
+
+    pip install pytest fakeredis moto boto3
+    python -m pytest tests
+"""
+import os
+
+import pytest
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key')
+os.environ.setdefault('DATABASE_URI', 'sqlite://')
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACtest00000000000000000000000000000')
+os.environ.setdefault('ASSET_MANIFEST_REQUIRED', 'false')
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app on a fresh SQLite database file, with the schema created."""
+    from app import create_app
+    from app.config import Config
+    from app.models import db
+
+    # The engine is created inside create_app(), so the URI must be set first.
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'portal.db'}")
+    app = create_app()
+    app.config.update(
+        TESTING=True,
+        UPLOAD_FOLDER=str(tmp_path / 'uploads'),
+        JOBS_ENABLED=False,
+        WTF_CSRF_ENABLED=False,
+    )
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def captured_sql(app):
+    """(statement, parameters) for every query the app sends while the test runs."""
+    from app.models import db
+    from sqlalchemy import event
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def vendor(app):
+    """A registered vendor with one invoice."""
+    from app.models import db, User, Invoice
+
+    user = User(company_name='Acme Builders', name='Asha', email='asha@example.com', mobile='9000000000',
+                pan_number='ABCDE1234F')
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(Invoice(invoice_number='INV-1', invoice_amount=1000.0, description='Cement',
+                           file_path='invoice.pdf', user_id=user.id))
+    db.session.commit()
+    return user
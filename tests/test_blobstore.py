@@ -0,0 +1,76 @@
+"""
+Deleting blob content nothing refers to any more: the commit that drops the
+last reference, or the rollback of an upload, only queues a 'delete_blobs'
+job; the content goes when the job runs, unless the blob is in use again.
+"""
+
+
+def _writer(content):
+    from app.main.blobstore import blob_temp_dir
+    from app.main.uploads import StreamingFileWriter
+
+    writer = StreamingFileWriter(blob_temp_dir(), 'document.pdf', len(content))
+    writer.write(content)
+    return writer
+
+
+def _run_delete_jobs():
+    from app.jobs import job_queue
+    from app.models import db, Job
+
+    job_ids = db.session.execute(db.select(Job.id).where(Job.kind == 'delete_blobs')).scalars().all()
+    for job_id in job_ids:
+        job_queue._run_in_context(job_id)
+    return [db.session.get(Job, job_id) for job_id in job_ids]
+
+
+def _stored(sha256):
+    from app.main.blobstore import blob_key, get_storage
+
+    return get_storage().exists(blob_key(sha256))
+
+
+def test_rollback_queues_deletion_of_written_content(app):
+    from app.main.blobstore import store_upload
+    from app.models import db, StoredFile
+
+    filename = store_upload(_writer(b'%PDF-1.4 rolled back'), 'invoices')
+    sha256 = db.session.get(StoredFile, filename).sha256
+    db.session.rollback()
+    assert _stored(sha256)
+
+    [job] = _run_delete_jobs()
+    assert job.status == 'done' and not _stored(sha256)
+
+
+def test_release_queues_deletion_in_the_same_commit(app):
+    from app.main.blobstore import store_upload, release_file
+    from app.models import db, Job, StoredFile
+
+    filename = store_upload(_writer(b'%PDF-1.4 released'), 'invoices')
+    sha256 = db.session.get(StoredFile, filename).sha256
+    db.session.commit()
+    release_file(filename, 'invoices')
+    assert not Job.query.count()
+    db.session.commit()
+    assert _stored(sha256)
+
+    [job] = _run_delete_jobs()
+    assert job.status == 'done' and not _stored(sha256)
+
+
+def test_content_stored_again_before_the_job_runs_is_kept(app):
+    from app.main.blobstore import store_upload, release_file
+    from app.models import db, StoredFile
+
+    content = b'%PDF-1.4 stored again'
+    filename = store_upload(_writer(content), 'invoices')
+    sha256 = db.session.get(StoredFile, filename).sha256
+    db.session.commit()
+    release_file(filename, 'invoices')
+    db.session.commit()
+    store_upload(_writer(content), 'invoices')
+    db.session.commit()
+
+    [job] = _run_delete_jobs()
+    assert job.status == 'done' and _stored(sha256)
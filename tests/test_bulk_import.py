@@ -0,0 +1,75 @@
+"""
+Bulk invoice import: manifest limits, and invoice numbers taken by another
+request between planning the import and inserting it.
+"""
+import io
+import json
+import zipfile
+
+import pytest
+
+PDF = b'%PDF-1.4\n1 0 obj\n<< /Type /Catalog >>\nendobj\ntrailer\n<<>>\n%%EOF\n'
+
+
+def _archive(tmp_path, manifest, files=()):
+    path = tmp_path / 'import.zip'
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('manifest.csv', manifest)
+        for name in files:
+            archive.writestr(name, PDF + name.encode())
+    return str(path)
+
+
+def test_manifest_over_the_size_cap_is_rejected_unread(app, tmp_path):
+    from app.main.bulk_import import ArchiveSource, ManifestError
+
+    app.config['BULK_IMPORT_MAX_MANIFEST_BYTES'] = 1024
+    source = ArchiveSource(_archive(tmp_path, 'invoice_number,po_number,amount,description,file\n' + 'x' * 100000))
+    with pytest.raises(ManifestError, match='at most 1KB'):
+        source.read_manifest()
+    source.close()
+
+
+@pytest.mark.parametrize('name, manifest', [
+    ('manifest.csv', b'invoice_number,po_number,amount,description,file\n' + b'N,P,1,d,f.pdf\n' * 1000),
+    ('manifest.json', b'[' + b','.join([b'{"invoice_number": "N"}'] * 1000) + b']'),
+])
+def test_manifest_reading_stops_past_max_rows(app, name, manifest):
+    from app.main.bulk_import import read_manifest, plan_import, ManifestError
+
+    app.config['BULK_IMPORT_MAX_ROWS'] = 5
+    rows = read_manifest(io.BytesIO(manifest), name, len(manifest))
+    assert len(rows) == 6
+    with pytest.raises(ManifestError, match='at most 5 invoices'):
+        plan_import(1, rows)
+
+
+def test_invoice_number_taken_after_planning_is_reported_as_duplicate(app, vendor, tmp_path, monkeypatch):
+    from app.main import bulk_import
+    from app.models import db, Invoice, Job, StoredFile
+    from app.stats import find_stats_drift
+
+    plan_import = bulk_import.plan_import
+
+    def plan_then_race(user_id, rows):
+        planned = plan_import(user_id, rows)
+        # Another request commits N2 after the duplicate check
+        db.session.add(Invoice(invoice_number='N2', invoice_amount=1.0, description='x', file_path='other.pdf',
+                               user_id=user_id))
+        db.session.commit()
+        return planned
+
+    monkeypatch.setattr(bulk_import, 'plan_import', plan_then_race)
+    source = bulk_import.ArchiveSource(_archive(
+        tmp_path, 'invoice_number,po_number,amount,description,file\nN1,PO1,10,a,a.pdf\nN2,PO2,20,b,b.pdf\n',
+        files=('a.pdf', 'b.pdf')))
+    report = bulk_import.import_invoices(vendor.id, source.read_manifest(), source)
+    source.close()
+
+    assert [(entry['invoice_number'], entry['status']) for entry in report] == [('N1', 'created'), ('N2', 'duplicate')]
+    n1 = Invoice.query.filter_by(user_id=vendor.id, invoice_number='N1').one()
+    assert StoredFile.query.count() == 1
+    assert db.session.get(StoredFile, n1.file_path) is not None
+    assert json.loads(db.session.get(Job, report[0]['job_id']).payload)['filename'] == n1.file_path
+    assert Invoice.query.filter_by(user_id=vendor.id, invoice_number='N2').one().file_path == 'other.pdf'
+    assert not find_stats_drift()
@@ -0,0 +1,85 @@
+"""
+The background content check (process_document) on a file whose content
+is not an allowed type: the job fails and the invoice using the file is
+rejected in the same commit. Needs python-magic and libmagic.
+"""
+import os
+
+import pytest
+
+pytest.importorskip('magic')
+
+
+def _run_check(app, vendor, content):
+    from app.jobs import job_queue
+    from app.main.tasks import enqueue_document_checks
+    from app.models import db, Job
+
+    folder = os.path.join(app.config['UPLOAD_FOLDER'], 'invoices')
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, 'invoice.pdf'), 'wb') as f:
+        f.write(content)
+    enqueue_document_checks(['invoice.pdf'], 'invoices', vendor.id)
+    db.session.commit()
+    job_id = db.session.execute(db.select(Job.id)).scalar_one()
+    job_queue._run_in_context(job_id)
+    db.session.expire_all()
+    return db.session.get(Job, job_id)
+
+
+def test_disallowed_content_rejects_the_invoice(app, vendor):
+    from app.models import db, Invoice, User
+
+    other = User(company_name='Brick Co', name='Ravi', email='ravi@example.com', mobile='9000000001',
+                 pan_number='ABCDE1234G')
+    other.set_password('secret')
+    db.session.add(other)
+    db.session.flush()
+    db.session.add(Invoice(invoice_number='INV-1', invoice_amount=10.0, description='Sand',
+                           file_path='invoice.pdf', user_id=other.id))
+    db.session.commit()
+
+    job = _run_check(app, vendor, b'MZ\x90\x00' + os.urandom(4096))
+    invoice = Invoice.query.filter_by(user_id=vendor.id, file_path='invoice.pdf').one()
+    assert job.status == 'failed'
+    assert 'Unexpected content type' in job.last_error
+    assert invoice.status == 'Rejected'
+    # Only the uploading vendor's records are rejected
+    assert Invoice.query.filter_by(user_id=other.id).one().status == 'In Review'
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = vendor.id
+    polled = client.get(f"/jobs/{job.id}").get_json()
+    assert polled['status'] == 'failed'
+    assert polled['result']['rejected'] == [{'invoice_id': invoice.id, 'invoice_number': 'INV-1'}]
+
+
+def test_allowed_content_leaves_the_invoice_in_review(app, vendor):
+    from app.models import Invoice
+
+    job = _run_check(app, vendor, b'%PDF-1.4\n1 0 obj\n<< /Type /Catalog >>\nendobj\ntrailer\n<<>>\n%%EOF\n')
+    assert job.status == 'done'
+    assert Invoice.query.filter_by(user_id=vendor.id, file_path='invoice.pdf').one().status == 'In Review'
+
+
+def test_upload_hands_the_check_job_to_the_page(app, vendor):
+    from io import BytesIO
+    from urllib.parse import urlsplit, parse_qs
+    from app.models import db, Job, VendorMaterial
+
+    db.session.add(VendorMaterial(user_id=vendor.id, vendor_name='Acme Builders', firm_type='proprietorship'))
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = vendor.id
+
+    response = client.post('/upload-invoices', data={
+        'invoice_number': 'INV-2', 'po_number': 'PO-2', 'invoice_amount': '250', 'description': 'Steel',
+        'invoice_file': (BytesIO(b'%PDF-1.4\n1 0 obj\n<< /Type /Catalog >>\nendobj\ntrailer\n<<>>\n%%EOF\n'),
+                         'invoice.pdf'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 302
+    [job_id] = parse_qs(urlsplit(response.location).query)['jobs']
+    job = db.session.get(Job, int(job_id))
+    assert job.kind == 'process_document' and job.user_id == vendor.id
+    assert client.get(f"/jobs/{job_id}").get_json()['status'] == 'queued'
@@ -0,0 +1,81 @@
+"""
+The invoice index migration on a database that predates it: duplicate
+(user_id, invoice_number) pairs are renamed, then the unique index and the
+listing indexes are added. Needs Flask-Migrate.
+"""
+import os
+
+import pytest
+
+pytest.importorskip('flask_migrate')
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations')
+
+
+@pytest.fixture
+def legacy_db(app):
+    """The invoices table as it was before the indexes, with two duplicated invoice numbers."""
+    from flask_migrate import Migrate
+    from app.models import db, User
+    from sqlalchemy import text
+
+    db.drop_all()
+    User.__table__.create(db.engine)
+    with db.engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE invoices (id INTEGER PRIMARY KEY, invoice_number VARCHAR(50) NOT NULL, "
+            "po_number VARCHAR(50), invoice_amount FLOAT NOT NULL, description TEXT NOT NULL, "
+            "file_path VARCHAR(255) NOT NULL, submission_date DATETIME NOT NULL, status VARCHAR(20), "
+            "user_id INTEGER NOT NULL REFERENCES users(id), payment_date DATETIME)"))
+        connection.execute(text("INSERT INTO users (id, company_name, name, email, mobile, pan_number) "
+                                "VALUES (1, 'Acme', 'Asha', 'a@example.com', '9000000000', 'ABCDE1234F'), "
+                                "(2, 'Brick', 'Ravi', 'r@example.com', '9000000001', 'ABCDE1234G')"))
+        for invoice_id, user_id, number, day in ((1, 1, 'INV-1', 2), (2, 1, 'INV-1', 1), (3, 1, 'INV-1', 3),
+                                                 (4, 1, 'INV-1-DUP3', 4), (5, 2, 'INV-1', 1), (6, 1, 'X' * 50, 1),
+                                                 (7, 1, 'X' * 50, 2)):
+            connection.execute(text(
+                "INSERT INTO invoices (id, invoice_number, invoice_amount, description, file_path, "
+                "submission_date, status, user_id) VALUES (:id, :number, 1, 'd', 'f.pdf', :date, 'In Review', :user)"),
+                dict(id=invoice_id, number=number, date=f"2024-01-0{day} 00:00:00", user=user_id))
+    Migrate(app, db, directory=MIGRATIONS)
+    yield db
+    db.drop_all()
+    with db.engine.begin() as connection:
+        connection.execute(text('DROP TABLE IF EXISTS alembic_version'))
+
+
+def test_upgrade_renames_duplicates_and_adds_indexes(legacy_db):
+    from flask_migrate import upgrade, downgrade
+    from sqlalchemy import inspect, text
+    from sqlalchemy.exc import IntegrityError
+
+    upgrade(directory=MIGRATIONS)
+    with legacy_db.engine.connect() as connection:
+        numbers = dict(connection.execute(text('SELECT id, invoice_number FROM invoices')).all())
+        # The earliest invoice of each group keeps its number
+        assert numbers[2] == 'INV-1' and numbers[5] == 'INV-1' and numbers[6] == 'X' * 50
+        assert numbers[1] == 'INV-1-DUP1'
+        assert numbers[3] == 'INV-1-DUP3-1'  # INV-1-DUP3 was already taken
+        assert numbers[4] == 'INV-1-DUP3'
+        assert numbers[7] == 'X' * 45 + '-DUP7'
+        indexes = {index['name'] for index in inspect(connection).get_indexes('invoices')}
+        assert {'uq_invoices_user_invoice_number', 'ix_invoices_user_submission',
+                'ix_invoices_user_status_payment', 'ix_invoices_user_file_path'} <= indexes
+        with pytest.raises(IntegrityError):
+            connection.execute(text("UPDATE invoices SET invoice_number = 'INV-1' WHERE id = 4"))
+
+    downgrade(directory=MIGRATIONS, revision='base')
+    with legacy_db.engine.connect() as connection:
+        assert not [index for index in inspect(connection).get_indexes('invoices')]
+
+
+def test_upgrade_skips_what_create_all_made(app):
+    from flask_migrate import Migrate, upgrade
+    from app.models import db
+    from sqlalchemy import text
+
+    Migrate(app, db, directory=MIGRATIONS)
+    upgrade(directory=MIGRATIONS)
+    with db.engine.begin() as connection:
+        assert connection.execute(text('SELECT version_num FROM alembic_version')).scalar() == '4b2d9e71c0a3'
+        connection.execute(text('DROP TABLE alembic_version'))
@@ -0,0 +1,83 @@
+"""
+Notification delivery through the jobs table, and the mark-as-read
+endpoint's input checks.
+"""
+import json
+
+import pytest
+
+
+def _queued(kind='deliver_notifications'):
+    from app.models import Job
+    return Job.query.filter_by(kind=kind).all()
+
+
+def test_status_change_queues_delivery_in_the_same_commit(app, vendor):
+    from app.jobs import job_queue
+    from app.models import db, Invoice, Notification
+    from app.notifications import unread_count
+
+    invoice = Invoice.query.filter_by(user_id=vendor.id).one()
+    invoice.status = 'Approved'
+    db.session.flush()
+    db.session.rollback()
+    assert not _queued()
+
+    invoice = Invoice.query.filter_by(user_id=vendor.id).one()
+    invoice.status = 'Approved'
+    db.session.commit()
+    jobs = _queued()
+    assert len(jobs) == 1 and Notification.query.count() == 0
+    assert json.loads(jobs[0].payload)['rows'][0]['message'] == 'Invoice INV-1 is now Approved.'
+
+    job_queue._run_in_context(jobs[0].id)
+    db.session.expire_all()
+    assert db.session.get(type(jobs[0]), jobs[0].id).status == 'done'
+    notification = Notification.query.one()
+    assert (notification.user_id, notification.category, notification.is_read) == (vendor.id, 'success', False)
+    assert unread_count(vendor.id) == 1
+
+
+def test_large_commits_are_split_into_batches(app, vendor):
+    from app.models import db, Invoice
+
+    app.config['NOTIFICATION_BATCH_SIZE'] = 2
+    db.session.add_all(Invoice(invoice_number=f"B-{n}", invoice_amount=1.0, description='x', file_path='x.pdf',
+                               user_id=vendor.id) for n in range(4))
+    db.session.commit()
+    for invoice in Invoice.query.filter_by(user_id=vendor.id):
+        invoice.status = 'Rejected'
+    db.session.commit()
+    assert sorted(len(json.loads(job.payload)['rows']) for job in _queued()) == [1, 2, 2]
+
+
+@pytest.fixture
+def client(app, vendor):
+    from app.models import db, Notification
+
+    db.session.add_all(Notification(user_id=vendor.id, message=f"n{n}") for n in range(3))
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = vendor.id
+    return client
+
+
+@pytest.mark.parametrize('body', [
+    {'ids': ['1']}, {'ids': [True]}, {'ids': 1}, {'ids': '1,2'}, {'ids': [1.5]}, {'ids': {'1': 1}}, [1, 2], 'all',
+])
+def test_mark_read_rejects_anything_but_a_list_of_ints(client, body):
+    from app.models import Notification
+
+    response = client.post('/notifications/read', json=body)
+    assert response.status_code == 400
+    assert Notification.query.filter_by(is_read=True).count() == 0
+
+
+def test_mark_read_by_ids_and_all(client):
+    from app.models import Notification
+
+    first = Notification.query.order_by(Notification.id).first()
+    assert client.post('/notifications/read', json={'ids': [first.id]}).get_json()['updated'] == 1
+    assert client.post('/notifications/read', json={'ids': []}).get_json()['updated'] == 0
+    assert client.post('/notifications/read', json={}).get_json() == {'ok': True, 'updated': 2, 'unread': 0}
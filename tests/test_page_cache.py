@@ -0,0 +1,94 @@
+"""
+The shared (Redis) page cache backend, against fakeredis standing in for
+a Redis server. Two RedisPageCache instances on one fake server play two
+gunicorn workers.
+"""
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+
+from app.page_cache import RedisPageCache, check_page_cache, create_page_cache, get_page_cache  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def _worker(server, ttl=300):
+    return RedisPageCache(fakeredis.FakeStrictRedis(server=server), ttl)
+
+
+def test_backend_passes_the_conformance_checks(server):
+    assert check_page_cache(_worker(server)) == []
+
+
+def test_bump_in_one_worker_invalidates_every_worker(server):
+    first, second = _worker(server), _worker(server)
+    version = second.version(42)
+    assert first.version(42) == version
+    second.set(f"page:dashboard:42:{version}", '<p>old</p>')
+
+    first.bump([42])
+
+    assert second.version(42) != version
+    assert second.get(f"page:dashboard:42:{second.version(42)}") is None
+
+
+def test_bump_leaves_other_vendors_alone(server):
+    cache = _worker(server)
+    other = cache.version(7)
+    cache.bump([42])
+    assert cache.version(7) == other
+
+
+def test_evicted_version_never_brings_back_an_old_page(server):
+    cache = _worker(server)
+    version = cache.version(42)
+    cache.set(f"page:dashboard:42:{version}", '<p>old</p>')
+    cache.client.delete(cache._version_key(42))  # as allkeys-lru would
+
+    assert cache.version(42) != version
+
+
+def test_entries_expire_after_the_ttl(server):
+    cache = _worker(server, ttl=120)
+    cache.set('page:profile:42:v', '<p>café</p>')
+    assert cache.get('page:profile:42:v') == '<p>café</p>'
+    assert 0 < cache.client.ttl(cache.prefix + 'page:profile:42:v') <= 120
+
+
+def test_default_backend_is_off_without_a_redis_url():
+    assert create_page_cache({}) is None
+    assert isinstance(create_page_cache({'PAGE_CACHE_REDIS_URL': 'redis://localhost:6379/1'}), RedisPageCache)
+
+
+def test_commit_bumps_the_owners_version(app, vendor, server):
+    from app.models import db, Invoice
+
+    cache = app.extensions['page_cache'] = _worker(server)
+    other_worker = _worker(server)
+    version = other_worker.version(vendor.id)
+
+    invoice = Invoice.query.filter_by(user_id=vendor.id).one()
+    invoice.status = 'Approved'
+    db.session.flush()
+    assert other_worker.version(vendor.id) == version, "bumped before the commit"
+    db.session.commit()
+
+    assert get_page_cache() is cache
+    assert other_worker.version(vendor.id) != version
+
+
+def test_rollback_does_not_bump(app, vendor, server):
+    from app.models import db, Invoice
+
+    app.extensions['page_cache'] = _worker(server)
+    other_worker = _worker(server)
+    version = other_worker.version(vendor.id)
+
+    Invoice.query.filter_by(user_id=vendor.id).one().status = 'Rejected'
+    db.session.flush()
+    db.session.rollback()
+
+    assert other_worker.version(vendor.id) == version
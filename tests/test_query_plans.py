@@ -0,0 +1,120 @@
+"""
+EXPLAIN regression checks: the vendor listings must be served by their
+composite indexes (app/models.py Invoice.__table_args__), reading rows in
+order instead of scanning and sorting. The statements are the ones the
+routes and helpers actually send, captured while they run, so a change to
+a route's query is checked too. Runs on SQLite; see
+tests/test_query_plans_postgres.py for PostgreSQL.
+"""
+from datetime import datetime, timedelta
+from io import BytesIO
+
+import pytest
+
+
+@pytest.fixture
+def client(app, vendor):
+    """
+    A logged-in client for a vendor among several others with a few hundred
+    invoices between them, analyzed so the planner costs the real row counts.
+    """
+    from app.models import db, Invoice, User, VendorMaterial
+    from sqlalchemy import text
+
+    others = [User(company_name=f"Vendor {n}", name='Ravi', email=f"vendor{n}@example.com",
+                   mobile=f"900000000{n}", pan_number=f"ABCDE123{n}G") for n in range(4)]
+    for other in others:
+        other.set_password('secret')
+    db.session.add_all(others)
+    db.session.add(VendorMaterial(user_id=vendor.id, vendor_name='Acme Builders', firm_type='proprietorship'))
+    db.session.flush()
+    start = datetime(2024, 1, 1)
+    for owner in [vendor, *others]:
+        db.session.add_all(Invoice(invoice_number=f"P-{n}", invoice_amount=100.0, description='Steel',
+                                   file_path=f"{owner.id}-{n}.pdf", user_id=owner.id,
+                                   status='Paid' if n % 3 else 'In Review',
+                                   payment_date=start + timedelta(days=n) if n % 3 and n % 50 else None)
+                           for n in range(100))
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = vendor.id
+    return client
+
+
+def _plans(statements, marker):
+    """EXPLAIN QUERY PLAN of each captured SELECT containing `marker`."""
+    from app.models import db
+
+    connection = db.session.connection()
+    return [' | '.join(row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+            for statement, parameters in statements
+            if statement.lstrip().startswith('SELECT') and marker in statement]
+
+
+def _reads_in_order(plan, index):
+    return index in plan and 'TEMP B-TREE' not in plan
+
+
+def test_all_invoices_pages_read_the_submission_index_in_order(client, captured_sql):
+    from app.main.pagination import encode_cursor
+
+    cursors = (None, encode_cursor('next', datetime(2030, 1, 1), 10**6), encode_cursor('prev', datetime(2000, 1, 1), 0))
+    for cursor in cursors:
+        assert client.get('/all-invoices', query_string={'cursor': cursor} if cursor else {}).status_code == 200
+    plans = _plans(captured_sql, 'ORDER BY invoices.submission_date')
+    assert len(plans) == len(cursors)
+    for plan in plans:
+        assert _reads_in_order(plan, 'ix_invoices_user_submission'), plan
+
+
+def test_payment_history_pages_read_the_payment_index_in_order(client, captured_sql):
+    from app.main.pagination import encode_cursor
+
+    cursors = (None, encode_cursor('next', datetime(2030, 1, 1), 10**6), encode_cursor('next', None, 10**6),
+               encode_cursor('prev', datetime(2000, 1, 1), 0))
+    for cursor in cursors:
+        assert client.get('/payment-history', query_string={'cursor': cursor} if cursor else {}).status_code == 200
+    plans = _plans(captured_sql, 'ORDER BY invoices.payment_date')
+    assert len(plans) == len(cursors)
+    for plan in plans:
+        assert _reads_in_order(plan, 'ix_invoices_user_status_payment'), plan
+
+
+def test_dashboard_reads_the_listing_indexes_in_order(client, vendor, captured_sql):
+    from app.main.dashboard import get_dashboard_summary
+
+    get_dashboard_summary(vendor.id)
+    [plan] = _plans(captured_sql, 'UNION ALL')
+    assert 'ix_invoices_user_status_payment' in plan and 'ix_invoices_user_submission' in plan
+    assert 'TEMP B-TREE' not in plan, plan
+
+
+def test_dashboard_without_stats_row_aggregates_through_an_index(client, vendor, captured_sql):
+    from app.main.dashboard import get_dashboard_summary
+    from app.models import db, VendorInvoiceStats
+
+    db.session.delete(db.session.get(VendorInvoiceStats, vendor.id))
+    db.session.commit()
+    get_dashboard_summary(vendor.id)
+    [plan] = [plan for plan in _plans(captured_sql, 'FROM invoices') if 'UNION' not in plan]
+    assert 'USING' in plan and 'INDEX' in plan and 'SCAN invoices' not in plan, plan
+
+
+def test_upload_duplicate_check_uses_the_unique_index(client, captured_sql):
+    response = client.post('/upload-invoices', data={
+        'invoice_number': 'INV-1', 'po_number': 'PO-1', 'invoice_amount': '10', 'description': 'Cement',
+        'invoice_file': (BytesIO(b'%PDF-1.4\n%%EOF\n'), 'invoice.pdf'),
+    }, content_type='multipart/form-data')
+    assert b'already uploaded an invoice' in response.data
+    [plan] = _plans(captured_sql, 'invoices.invoice_number = ')
+    # SQLite names the index behind the table's UNIQUE constraint itself
+    assert 'sqlite_autoindex_invoices' in plan and '(user_id=? AND invoice_number=?)' in plan, plan
+
+
+def test_invoice_download_ownership_check_uses_the_file_path_index(client, captured_sql):
+    client.get('/download/invoice/invoice.pdf')
+    [plan] = _plans(captured_sql, 'invoices.file_path = ')
+    assert 'ix_invoices_user_file_path' in plan, plan
@@ -0,0 +1,116 @@
+"""
+EXPLAIN checks on PostgreSQL, which only reads an index in ORDER BY order
+when the NULLS FIRST/LAST placement matches too; SQLite doesn't make that
+distinction, so tests/test_query_plans.py can't catch a mismatch. Set
+TEST_POSTGRES_URI to an empty scratch database to run them.
+"""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+POSTGRES_URI = os.environ.get('TEST_POSTGRES_URI')
+
+pytestmark = pytest.mark.skipif(not POSTGRES_URI, reason='TEST_POSTGRES_URI is not set')
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The conftest app, on PostgreSQL."""
+    from app import create_app
+    from app.config import Config
+    from app.models import db
+
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', POSTGRES_URI)
+    app = create_app()
+    app.config.update(TESTING=True, UPLOAD_FOLDER=str(tmp_path / 'uploads'), JOBS_ENABLED=False)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def paid_invoices(app, vendor):
+    from app.models import db, Invoice
+    from sqlalchemy import text
+
+    start = datetime(2024, 1, 1)
+    db.session.add_all(Invoice(invoice_number=f"P-{n}", invoice_amount=100.0, description='Paid', file_path=f"p{n}.pdf",
+                               user_id=vendor.id, status='Paid',
+                               payment_date=start + timedelta(days=n) if n % 50 else None)
+                       for n in range(500))
+    db.session.commit()
+    db.session.execute(text('ANALYZE invoices'))
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = vendor.id
+    return client
+
+
+def _plans(statements, marker):
+    """
+    EXPLAIN output for each captured SELECT containing `marker`. Sequential
+    and bitmap scans are priced out, so the planner has to choose between
+    reading an index in order and sorting what it read.
+    """
+    from app.models import db
+
+    connection = db.session.connection()
+    connection.exec_driver_sql('SET enable_seqscan = off')
+    connection.exec_driver_sql('SET enable_bitmapscan = off')
+    return ['\n'.join(row[0] for row in connection.exec_driver_sql(f"EXPLAIN {statement}", parameters))
+            for statement, parameters in statements
+            if statement.lstrip().startswith('SELECT') and marker in statement]
+
+
+def test_payment_history_pages_read_the_index_in_order(paid_invoices, captured_sql):
+    from app.main.pagination import encode_cursor
+
+    for cursor in (None, encode_cursor('next', datetime(2024, 6, 1), 10**6),
+                   encode_cursor('next', None, 10**6), encode_cursor('prev', datetime(2024, 6, 1), 10**6)):
+        assert paid_invoices.get('/payment-history', query_string={'cursor': cursor} if cursor else {}).status_code == 200
+    plans = [plan for plan in _plans(captured_sql, 'FROM invoices') if 'Limit' in plan]
+    assert len(plans) == 4
+    for plan in plans:
+        # A Sort node means the whole set of paid invoices is sorted per page
+        assert 'ix_invoices_user_status_payment' in plan and 'Sort' not in plan, plan
+
+
+def test_payment_history_export_reads_the_index_in_order(paid_invoices, captured_sql):
+    response = paid_invoices.get('/payment-history/export')
+    assert response.status_code == 200
+    response.get_data()  # the rows are queried while the response streams
+    [plan] = _plans(captured_sql, 'invoices.status = ')
+    assert 'ix_invoices_user_status_payment' in plan and 'Sort' not in plan, plan
+
+
+def test_dashboard_recent_payments_read_the_index_in_order(paid_invoices, vendor, captured_sql):
+    from app.main.dashboard import get_dashboard_summary
+
+    get_dashboard_summary(vendor.id)
+    [plan] = _plans(captured_sql, 'UNION ALL')
+    assert 'ix_invoices_user_status_payment' in plan and 'ix_invoices_user_submission' in plan
+    assert 'Sort' not in plan, plan
+
+
+def test_migration_rebuilds_a_payment_index_without_nulls_last(app):
+    pytest.importorskip('flask_migrate')
+    from flask_migrate import Migrate, upgrade
+    from app.models import db
+    from sqlalchemy import inspect, text
+
+    migrations = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations')
+    with db.engine.begin() as connection:
+        connection.execute(text('DROP INDEX ix_invoices_user_status_payment'))
+        connection.execute(text('CREATE INDEX ix_invoices_user_status_payment '
+                                'ON invoices (user_id, status, payment_date DESC, id DESC)'))
+    Migrate(app, db, directory=migrations)
+    upgrade(directory=migrations)
+    with db.engine.begin() as connection:
+        [index] = [index for index in inspect(connection).get_indexes('invoices')
+                   if index['name'] == 'ix_invoices_user_status_payment']
+        assert index['column_sorting']['payment_date'] == ('desc', 'nulls_last')
+        connection.execute(text('DROP TABLE alembic_version'))
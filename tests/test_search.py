@@ -0,0 +1,56 @@
+"""
+Invoice search on SQLite: the FTS5 trigram index must find what ILIKE
+finds, including matches inside a word, and ranked results are paged
+rather than cut off.
+"""
+import pytest
+
+
+@pytest.fixture
+def invoices(app, vendor):
+    from app.models import db, Invoice
+
+    rows = [('INV-0123', 'PO-7788', 'Cement and sand'),
+            ('INV-0456', 'PO-1234', 'Reinforcement steel'),
+            ('A1', None, 'Site payment'),
+            ('INV-0789', 'PO-0001', 'Labour')]
+    for number, po, description in rows:
+        db.session.add(Invoice(invoice_number=number, po_number=po, description=description, invoice_amount=10.0,
+                               file_path=f"{number}.pdf", user_id=vendor.id))
+    db.session.commit()
+    return vendor
+
+
+def _ids(user_id, q, fts_available):
+    from app.models import db
+    from app.search import parse_search, build_search_statement
+
+    return set(db.session.execute(build_search_statement(user_id, parse_search(q), 'sqlite', fts_available)).scalars())
+
+
+@pytest.mark.parametrize('q', ['123', '7788', 'ment', 'inv-04', 'CEMENT', 'a1', 'in ment', 'zzz'])
+def test_trigram_index_matches_ilike(invoices, q):
+    from app.search import search_statement, parse_search
+
+    assert 'invoices_fts' in str(search_statement(invoices.id, parse_search('ment')))
+    assert _ids(invoices.id, q, True) == _ids(invoices.id, q, False)
+
+
+def test_ranked_search_pages_past_old_cap(app, vendor):
+    from app.models import db, Invoice
+    from app.main.pagination import RankedPage
+    from app.search import parse_search, ranked_invoice_ids, count_matches
+
+    db.session.add_all(Invoice(invoice_number=f"INV-{n:04d}", description='Cement', invoice_amount=1.0,
+                               file_path=f"{n}.pdf", user_id=vendor.id) for n in range(520))
+    db.session.commit()
+    search = parse_search('cement')
+    load = lambda ids: Invoice.query.filter(Invoice.id.in_(ids)).all()
+
+    seen, offset, page = [], 0, None
+    while page is None or page.has_next:
+        page = RankedPage(lambda o, n: ranked_invoice_ids(vendor.id, search, o, n), load, offset, 100,
+                          count_fn=lambda: count_matches(vendor.id, search))
+        seen += [invoice.id for invoice in page.items]
+        offset += 100
+    assert len(seen) == len(set(seen)) == page.total == 521
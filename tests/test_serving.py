@@ -0,0 +1,54 @@
+"""
+X-Accel-Redirect URIs for stored documents: the blob folder is served
+through UPLOAD_FOLDER's location when it lies inside it, and through its
+own location (X_ACCEL_REDIRECT_BLOB_PREFIX) when it doesn't.
+"""
+import pytest
+
+
+def _stored_file(app):
+    from app.main.blobstore import blob_temp_dir, store_upload
+    from app.main.uploads import StreamingFileWriter
+    from app.models import db, StoredFile
+
+    content = b'%PDF-1.4 served'
+    writer = StreamingFileWriter(blob_temp_dir(), 'invoice.pdf', len(content))
+    writer.write(content)
+    filename = store_upload(writer, 'invoices')
+    db.session.commit()
+    return filename, db.session.get(StoredFile, filename).sha256
+
+
+def _serve(app, filename):
+    from app.main.serving import serve_stored_file
+
+    with app.test_request_context():
+        return serve_stored_file(filename, 'invoices')
+
+
+@pytest.fixture
+def accel(app):
+    app.config.update(SENDFILE_MODE='x-accel-redirect', X_ACCEL_REDIRECT_PREFIX='/protected-uploads')
+    return app
+
+
+def test_default_blob_folder_is_served_through_the_upload_location(accel):
+    filename, sha256 = _stored_file(accel)
+    response = _serve(accel, filename)
+    assert response.headers['X-Accel-Redirect'] == f"/protected-uploads/blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def test_blob_folder_outside_uploads_uses_its_own_location(accel, tmp_path):
+    accel.config.update(BLOB_FOLDER=str(tmp_path / 'blob-store'), X_ACCEL_REDIRECT_BLOB_PREFIX='/protected-blobs/')
+    filename, sha256 = _stored_file(accel)
+    response = _serve(accel, filename)
+    assert response.headers['X-Accel-Redirect'] == f"/protected-blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def test_unmapped_blob_folder_is_sent_by_flask(accel, tmp_path):
+    accel.config.update(BLOB_FOLDER=str(tmp_path / 'blob-store'))
+    filename, _ = _stored_file(accel)
+    response = _serve(accel, filename)
+    response.direct_passthrough = False
+    assert 'X-Accel-Redirect' not in response.headers
+    assert response.status_code == 200 and response.get_data() == b'%PDF-1.4 served'
@@ -0,0 +1,91 @@
+"""
+The SMS sender's token bucket and circuit breaker, on a fake clock.
+"""
+import types
+
+import pytest
+
+from app import sms
+from app.sms import CircuitBreaker, SmsDispatcher, SmsMessage, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces app.sms's time module; advance with clock.now += seconds."""
+    clock = types.SimpleNamespace(now=1000.0)
+    clock.monotonic = lambda: clock.now
+    clock.sleep = lambda seconds: None
+    monkeypatch.setattr(sms, 'time', clock)
+    return clock
+
+
+def test_bucket_allows_a_burst_then_reserves_ahead(clock):
+    bucket = TokenBucket(rate=2, capacity=2)
+    assert [bucket.reserve() for _ in range(4)] == [0, 0, 0.5, 1.0]
+    clock.now += 1.0
+    # The two tokens earned went to the callers already waiting for them
+    assert bucket.reserve() == 0.5
+
+
+def test_bucket_refills_up_to_capacity_only(clock):
+    bucket = TokenBucket(rate=1, capacity=3)
+    clock.now += 60
+    assert [bucket.reserve() for _ in range(4)] == [0, 0, 0, 1.0]
+
+
+def test_bucket_without_a_rate_never_waits(clock):
+    bucket = TokenBucket(rate=0, capacity=1)
+    assert [bucket.reserve() for _ in range(10)] == [0] * 10
+
+
+def test_breaker_lets_a_single_probe_through_after_the_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.before_call() == 0
+    breaker.record_failure()
+    assert breaker.state == 'open' and breaker.before_call() == 30
+
+    clock.now += 30
+    assert breaker.before_call() == 0 and breaker.state == 'half-open'
+    assert breaker.before_call() == 1.0  # the probe is still out
+
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.before_call() == 0
+
+
+def test_breaker_reopens_when_the_probe_fails(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.before_call() == 0
+    breaker.record_failure()
+    assert breaker.state == 'open' and breaker.before_call() == 30
+    clock.now += 30
+    assert breaker.before_call() == 0  # a new probe, not stuck on the old one
+
+
+class FailingClient:
+    def send(self, to, body):
+        raise RuntimeError('connection pool exploded')
+
+
+@pytest.mark.parametrize('client, status', [
+    (FailingClient(), 'open'),
+    (types.SimpleNamespace(send=lambda to, body: 'SM123'), 'closed'),
+])
+def test_a_probe_always_settles_the_breaker(app, clock, client, status):
+    dispatcher = SmsDispatcher()
+    dispatcher.app = app
+    dispatcher.client = client
+    dispatcher.bucket = TokenBucket(rate=0, capacity=1)
+    dispatcher.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    dispatcher.breaker.record_failure()
+    clock.now += 30  # _attempt() sends the half-open probe
+
+    try:
+        dispatcher._attempt(SmsMessage('+919000000000', 'Your code is 123456'))
+    except RuntimeError:
+        pass  # _run() fails the message; the breaker must have heard about it already
+    assert dispatcher.breaker.state == status
+    clock.now += 30
+    assert dispatcher.breaker.before_call() == 0
@@ -0,0 +1,141 @@
+"""
+The blob storage backends behind the document store: every test runs
+against LocalStorage and against S3Storage on moto's in-process S3.
+"""
+from urllib.parse import parse_qs, urlparse
+import os
+import time
+
+import pytest
+
+from app.main.storage import LocalStorage, S3Storage, check_storage, create_storage
+
+BUCKET = 'vendorportal-test'
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    moto = pytest.importorskip('moto')
+    for name, value in (('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'),
+                        ('AWS_DEFAULT_REGION', 'us-east-1')):
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        yield
+
+
+def _s3(tmp_path, **options):
+    storage = S3Storage(BUCKET, prefix='blobs', region='us-east-1', temp_dir=str(tmp_path), **options)
+    storage.client.create_bucket(Bucket=BUCKET)
+    return storage
+
+
+@pytest.fixture(params=['local', 's3'])
+def storage(request, tmp_path):
+    if request.param == 'local':
+        return LocalStorage(str(tmp_path / 'blobs'))
+    request.getfixturevalue('aws')
+    return _s3(tmp_path)
+
+
+def _source(tmp_path, content, name='upload.tmp'):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_backend_passes_the_conformance_checks(storage, tmp_path):
+    assert check_storage(storage, str(tmp_path)) == []
+
+
+def test_put_file_takes_ownership_of_the_source(storage, tmp_path):
+    source = _source(tmp_path, b'%PDF-1.7 invoice')
+    assert not storage.exists('ab/abcdef')
+
+    storage.put_file('ab/abcdef', source)
+
+    assert not os.path.exists(source)
+    assert storage.exists('ab/abcdef')
+
+
+def test_fetch_returns_the_stored_content(storage, tmp_path):
+    storage.put_file('ab/abcdef', _source(tmp_path, b'%PDF-1.7 invoice'))
+    with storage.fetch('ab/abcdef') as path:
+        with open(path, 'rb') as f:
+            assert f.read() == b'%PDF-1.7 invoice'
+
+
+def test_put_file_replaces_an_existing_key(storage, tmp_path):
+    storage.put_file('ab/abcdef', _source(tmp_path, b'first'))
+    storage.put_file('ab/abcdef', _source(tmp_path, b'second'))
+    with storage.fetch('ab/abcdef') as path:
+        with open(path, 'rb') as f:
+            assert f.read() == b'second'
+
+
+def test_delete_removes_the_key_and_tolerates_missing_ones(storage, tmp_path):
+    storage.put_file('ab/abcdef', _source(tmp_path, b'content'))
+    storage.delete('ab/abcdef')
+    assert not storage.exists('ab/abcdef')
+    storage.delete('ab/abcdef')
+    storage.delete('never/written')
+
+
+def test_download_goes_through_flask_or_a_presigned_url(storage, tmp_path):
+    storage.put_file('ab/abcdef', _source(tmp_path, b'content'))
+    url = storage.download_url('ab/abcdef', 'invoice.pdf')
+    if isinstance(storage, LocalStorage):
+        assert url is None
+        assert storage.local_path('ab/abcdef') == str(tmp_path / 'blobs' / 'ab' / 'abcdef')
+    else:
+        assert storage.local_path('ab/abcdef') is None
+        assert url is not None
+
+
+def test_presigned_url_names_the_object_and_expires(aws, tmp_path):
+    storage = _s3(tmp_path, presign_expires=120)
+    storage.put_file('ab/abcdef', _source(tmp_path, b'content'))
+
+    url = urlparse(storage.download_url('ab/abcdef', 'invoice.pdf'))
+    query = parse_qs(url.query)
+
+    assert url.path.endswith(f"{BUCKET}/blobs/ab/abcdef") or url.path == '/blobs/ab/abcdef'
+    if 'X-Amz-Expires' in query:  # SigV4
+        assert query['X-Amz-Expires'] == ['120']
+    else:  # SigV2, boto3's default for presigning in us-east-1: an absolute time
+        assert 110 <= int(query['Expires'][0]) - time.time() <= 120
+    assert query['response-content-type'] == ['application/pdf']
+    assert query['response-content-disposition'] == ['inline; filename="invoice.pdf"']
+
+
+def test_s3_keys_carry_the_prefix(aws, tmp_path):
+    storage = _s3(tmp_path)
+    storage.put_file('ab/abcdef', _source(tmp_path, b'content'))
+    keys = [item['Key'] for item in storage.client.list_objects_v2(Bucket=BUCKET)['Contents']]
+    assert keys == ['blobs/ab/abcdef']
+
+
+def test_s3_fetch_removes_its_temp_copy(aws, tmp_path):
+    storage = _s3(tmp_path)
+    storage.put_file('ab/abcdef', _source(tmp_path, b'content'))
+    with storage.fetch('ab/abcdef') as path:
+        assert os.path.exists(path)
+    assert not os.path.exists(path)
+
+
+def test_s3_multipart_upload_round_trips(aws, tmp_path):
+    storage = _s3(tmp_path, multipart_threshold_mb=5)
+    content = os.urandom(11 * 1024 * 1024)  # three parts
+    storage.put_file('ab/large', _source(tmp_path, content))
+    with storage.fetch('ab/large') as path:
+        with open(path, 'rb') as f:
+            assert f.read() == content
+
+
+def test_create_storage_picks_the_configured_backend(aws, tmp_path):
+    assert isinstance(create_storage({}, str(tmp_path)), LocalStorage)
+    s3 = create_storage({'STORAGE_BACKEND': 's3', 'S3_BUCKET': BUCKET, 'S3_REGION': 'us-east-1'}, str(tmp_path))
+    assert isinstance(s3, S3Storage)
+    with pytest.raises(RuntimeError, match='S3_BUCKET'):
+        create_storage({'STORAGE_BACKEND': 's3'}, str(tmp_path))
+    with pytest.raises(RuntimeError, match='Unknown STORAGE_BACKEND'):
+        create_storage({'STORAGE_BACKEND': 'ftp'}, str(tmp_path))